@@ -2,6 +2,7 @@
 Salla Analytics Dashboard
 """
 
+import asyncio
 import streamlit as st
 import pandas as pd
 import plotly.express as px
@@ -10,7 +11,7 @@ import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
-from semantic_layer_mocked import queries
+from semantic_layer_mocked import queries, async_queries, cache, sketches, snapshot
 
 # ============================================================================
 # PAGE CONFIG
@@ -77,37 +78,124 @@ st.markdown(f"""
 # LOAD DATA
 # ============================================================================
 
+# Slider defaults
+DEFAULT_TOP_N_CATEGORIES = 12
+DEFAULT_TOP_N_LOCATION = 5
+DEFAULT_TOP_N_STORES = 15
+
+@st.cache_resource(ttl=300)
+def load_initial_data():
+    # The precomputed snapshot (scripts/build_snapshot.py) is memory-mapped, so the cold
+    # start does not depend on the size of the warehouse; without a snapshot for the
+    # current build, all queries run concurrently (with full rankings, which also fill
+    # the semantic-layer cache the top-N loaders slice)
+    datasets = snapshot.load_snapshot()
+    if datasets is not None:
+        return datasets
+    return asyncio.run(async_queries.gather_all(
+        top_n_categories=None,
+        top_n_location=None,
+        top_n_stores=None,
+        with_sketches=True
+    ))
+
+@st.cache_data(ttl=300)
+def load_filtered_data(filters):
+    # Most filtered datasets miss the rollups and would each scan the fact table;
+    # the bundle reads it once for all of them, with full rankings to slice
+    return queries.get_dashboard_bundle(
+        top_n_categories=None,
+        top_n_location=None,
+        top_n_stores=None,
+        with_sketches=True,
+        filters=filters
+    )
+
+def load_datasets(filters=None):
+    return load_filtered_data(filters) if filters else load_initial_data()
+
+# Loaders take the sidebar filters (None = unfiltered) and return the datasets of the
+# snapshot or first-paint queries (unfiltered) or of the bundle (filtered). Top-N
+# loaders call the ranking queries, which the semantic-layer cache answers by slicing
+# the largest ranking it holds
+
+@st.cache_data(ttl=300)
+def load_top_products(filters=None):
+    return load_datasets(filters)['top_products_by_region']
+
+@st.cache_data(ttl=300)
+def load_popular_categories(top_n=10, filters=None):
+    return queries.get_popular_categories(top_n, with_sketches=True, filters=filters)
+
 @st.cache_data(ttl=300)
-def load_top_products():
-    return queries.get_top_products_by_region()
+def load_time_series(filters=None):
+    return load_datasets(filters)['time_series_sales']
 
 @st.cache_data(ttl=300)
-def load_popular_categories(top_n=10):
-    return queries.get_popular_categories(top_n)
+def load_avg_sale_by_category(filters=None):
+    return load_datasets(filters)['avg_sale_by_category']
 
 @st.cache_data(ttl=300)
-def load_time_series():
-    return queries.get_time_series_sales()
+def load_top_categories_by_location(top_n=10, filters=None):
+    return queries.get_top_categories_by_location(top_n, filters=filters)
 
 @st.cache_data(ttl=300)
-def load_avg_sale_by_category():
-    return queries.get_avg_sale_by_category()
+def load_top_stores(top_n=10, filters=None):
+    return queries.get_top_stores_by_daily_sales(top_n, filters=filters)
 
 @st.cache_data(ttl=300)
-def load_top_categories_by_location(top_n=10):
-    return queries.get_top_categories_by_location(top_n)
+def load_monthly_growth(filters=None):
+    return load_datasets(filters)['monthly_growth_by_store']
+
+def load_top_n(loader, top_n, slider_key, filters=None):
+    """
+    Call a top-N loader and count, for this session, how many slider changes were served
+    from a cache (no semantic-layer cache miss) instead of running a query.
+    """
+    stats = st.session_state.setdefault('slider_stats', {'changes': 0, 'from_cache': 0})
+    previous = st.session_state.get(f'previous_{slider_key}')
+    misses_before = cache.get_counters()['misses']
+    
+    df = loader(top_n, filters)
+    
+    if previous is not None and previous != top_n:
+        stats['changes'] += 1
+        stats['from_cache'] += cache.get_counters()['misses'] == misses_before
+    st.session_state[f'previous_{slider_key}'] = top_n
+    return df
 
 @st.cache_data(ttl=300)
-def load_top_stores(top_n=10):
-    return queries.get_top_stores_by_daily_sales(top_n)
+def load_store_growth(seller_ids, filters=None):
+    return queries.get_monthly_growth_by_store(seller_ids=list(seller_ids), filters=filters)
 
 @st.cache_data(ttl=300)
-def load_monthly_growth():
-    return queries.get_monthly_growth_by_store()
+def load_cohort_analysis(filters=None):
+    return load_datasets(filters)['cohort_analysis']
+
+def estimated_orders_metric(label, orders_sketches):
+    """
+    st.metric with the distinct orders of several rows (products, categories), estimated
+    from their merged HyperLogLog sketches. Summing the rows' order counts would count an
+    order once per product or category it contains.
+    """
+    num_orders = sketches.estimate(sketches.merge(orders_sketches))
+    st.metric(
+        label,
+        f"{num_orders:,.0f} ± {sketches.error_bound(num_orders):,.0f}",
+        help=f"Distinct orders estimated from merged HyperLogLog sketches; ± one standard error ({sketches.RELATIVE_ERROR:.1%})"
+    )
 
 @st.cache_data(ttl=300)
-def load_cohort_analysis():
-    return queries.get_cohort_analysis()
+def load_filter_options():
+    """
+    States, categories and the order date range offered by the sidebar filters.
+    """
+    states = sorted(load_initial_data()['top_categories_by_location']['customer_state'].unique())
+    categories = sorted(load_initial_data()['avg_sale_by_category']['product_category_name'].dropna().unique())
+    months = load_initial_data()['time_series_sales']['year_month']
+    first_day = pd.Period(months.min(), freq='M').start_time.date()
+    last_day = pd.Period(months.max(), freq='M').end_time.date()
+    return states, categories, first_day, last_day
 
 # ============================================================================
 # HEADER
@@ -115,6 +203,29 @@ def load_cohort_analysis():
 
 st.title("Salla E-Commerce Analytics")
 
+# ============================================================================
+# SIDEBAR FILTERS
+# ============================================================================
+
+# Selections are passed down to the semantic layer and applied in SQL, so each rerun
+# only reads the slice it needs
+filter_states, filter_categories, first_day, last_day = load_filter_options()
+
+with st.sidebar:
+    st.header("Filters")
+    date_range = st.date_input("Order date range", value=(first_day, last_day), min_value=first_day, max_value=last_day)
+    selected_filter_states = st.multiselect("Customer states", filter_states, placeholder="All states")
+    selected_filter_categories = st.multiselect("Product categories", filter_categories, placeholder="All categories")
+
+FILTERS = {}
+if len(date_range) == 2 and tuple(date_range) != (first_day, last_day):
+    FILTERS['start_date'], FILTERS['end_date'] = (day.isoformat() for day in date_range)
+if selected_filter_states:
+    FILTERS['customer_states'] = selected_filter_states
+if selected_filter_categories:
+    FILTERS['categories'] = selected_filter_categories
+FILTERS = FILTERS or None
+
 # ============================================================================
 # TABS
 # ============================================================================
@@ -140,14 +251,11 @@ with tab1:
     st.markdown("")
     st.markdown("")
     
-    # Load data
-    df = load_top_products()
-
     # Layout
     col1, col_right = st.columns([1, 4])
     
     # Filters for data processing
-    regions = ['All Regions'] + sorted(df['customer_state'].unique().tolist())
+    regions = ['All Regions'] + (selected_filter_states or filter_states)
     
     with col1:
         st.subheader("Filters")
@@ -158,8 +266,10 @@ with tab1:
         st.markdown("")
         st.markdown("")
     
-    # Filter data
+    # Load data (a single region is a slice of the product x state rows)
+    df = load_top_products(FILTERS)
     if selected_region == 'All Regions':
+        # num_orders stays exact when summed across states (an order has a single state)
         df_filtered = df.groupby('product_id').agg({
             'total_revenue': 'sum',
             'total_quantity': 'sum',
@@ -167,11 +277,13 @@ with tab1:
         }).reset_index()
         region_text = "All Regions"
     else:
-        df_filtered = df[df['customer_state'] == selected_region].copy()
+        df = df[df['customer_state'] == selected_region]
+        df_filtered = df.drop(columns='orders_sketch')
         region_text = selected_region
     
     # Get top N
     df_top = df_filtered.nlargest(top_n, 'total_revenue').reset_index(drop=True)
+    top_orders_sketches = df.loc[df['product_id'].isin(df_top['product_id']), 'orders_sketch']
     
     # Add Key Insights to filter column
     with col1:
@@ -190,7 +302,7 @@ with tab1:
         with col_metric2:
             st.metric("Total Quantity", f"{df_top['total_quantity'].sum():,.0f}")
         with col_metric3:
-            st.metric("Total Orders", f"{df_top['num_orders'].sum():,.0f}")
+            estimated_orders_metric("Total Orders", top_orders_sketches)
         
         st.markdown("")
         
@@ -303,8 +415,8 @@ with tab2:
     st.markdown("")
     
     # Load data
-    top_n_categories = st.slider("Show Top N Categories:", 5, 25, 12, key='top_n_categories')
-    df_categories = load_popular_categories(top_n_categories)
+    top_n_categories = st.slider("Show Top N Categories:", 5, 25, DEFAULT_TOP_N_CATEGORIES, key='top_n_categories')
+    df_categories = load_top_n(load_popular_categories, top_n_categories, 'top_n_categories', FILTERS)
     
     # Metrics
     st.markdown("### Summary Statistics")
@@ -313,7 +425,7 @@ with tab2:
     with metric_cols[0]:
         st.metric("Total Sales (SAR)", f"{df_categories['total_revenue'].sum():,.0f}")
     with metric_cols[1]:
-        st.metric("Orders", f"{df_categories['num_orders'].sum():,.0f}")
+        estimated_orders_metric("Orders", df_categories['orders_sketch'])
     with metric_cols[2]:
         st.metric("Units Sold", f"{df_categories['total_quantity'].sum():,.0f}")
     with metric_cols[3]:
@@ -378,7 +490,7 @@ with tab2:
     # Detailed data table
     st.markdown("")
     with st.expander("📋 View Detailed Data Table"):
-        df_display = df_categories.copy()
+        df_display = df_categories.drop(columns='orders_sketch')
         df_display['total_revenue'] = df_display['total_revenue'].apply(lambda x: f"SAR {x:,.2f}")
         df_display['total_quantity'] = df_display['total_quantity'].apply(lambda x: f"{x:,.0f}")
         df_display['num_orders'] = df_display['num_orders'].apply(lambda x: f"{x:,.0f}")
@@ -397,7 +509,7 @@ with tab3:
     st.markdown("")
     
     # Load data
-    df_time = load_time_series()
+    df_time = load_time_series(FILTERS)
     
     # Time period selector
     time_period = st.radio(
@@ -513,7 +625,7 @@ with tab4:
     
     st.markdown("")
     
-    df_avg_sale = load_avg_sale_by_category()
+    df_avg_sale = load_avg_sale_by_category(FILTERS)
     
     col1, col2 = st.columns([3, 1])
     
@@ -561,8 +673,8 @@ with tab4:
     
     st.markdown("")
     
-    top_n_location = st.slider("Top N Categories per State:", 3, 12, 5, key='top_n_location')
-    df_location = load_top_categories_by_location(top_n_location)
+    top_n_location = st.slider("Top N Categories per State:", 3, 12, DEFAULT_TOP_N_LOCATION, key='top_n_location')
+    df_location = load_top_n(load_top_categories_by_location, top_n_location, 'top_n_location', FILTERS)
     
     # Heatmap
     df_pivot = df_location.pivot(
@@ -669,8 +781,8 @@ with tab5:
     st.markdown("")
     
     # Load data
-    top_n_stores = st.slider("Show Top N Stores:", 5, 30, 15, key='top_n_stores')
-    df_stores = load_top_stores(top_n_stores)
+    top_n_stores = st.slider("Show Top N Stores:", 5, 30, DEFAULT_TOP_N_STORES, key='top_n_stores')
+    df_stores = load_top_n(load_top_stores, top_n_stores, 'top_n_stores', FILTERS)
     
     # Summary Statistics
     st.markdown("### Summary Statistics")
@@ -829,7 +941,7 @@ with tab6:
     st.markdown("")
     
     # Load data
-    df_growth = load_monthly_growth()
+    df_growth = load_monthly_growth(FILTERS)
     
     # Summary Statistics
     st.markdown("### Summary Statistics")
@@ -867,7 +979,8 @@ with tab6:
     )
     
     if selected_stores:
-        df_filtered = df_growth[df_growth['seller_id'].isin(selected_stores)]
+        # Fetch only the charted stores
+        df_filtered = load_store_growth(tuple(selected_stores), FILTERS)
         
         fig = go.Figure()
         
@@ -957,13 +1070,13 @@ with tab6:
     with st.expander("📋 View Detailed Data Table"):
         # Show data for selected stores or top 20
         if selected_stores:
-            df_display = df_growth[df_growth['seller_id'].isin(selected_stores)].copy()
+            df_display = df_filtered.copy()
         else:
             df_display = df_growth[df_growth['seller_id'].isin(top_growth_stores[:20])].copy()
         
         df_display['monthly_revenue'] = df_display['monthly_revenue'].apply(lambda x: f"SAR {x:,.2f}")
         df_display['prev_month_revenue'] = df_display['prev_month_revenue'].apply(lambda x: f"SAR {x:,.2f}")
-        df_display['growth_pct'] = df_display['growth_pct'].apply(lambda x: f"{x:.1f}%")
+        df_display['growth_pct'] = df_display['growth_pct'].apply(lambda x: f"{x:.1f}%" if pd.notna(x) else "n/a")
         st.dataframe(df_display, use_container_width=True, hide_index=True)
 
 # ============================================================================
@@ -978,7 +1091,7 @@ with tab7:
     st.markdown("")
     
     # Load data
-    df_cohort = load_cohort_analysis()
+    df_cohort = load_cohort_analysis(FILTERS)
     
     # Summary Statistics
     st.markdown("### Summary Statistics")
@@ -1201,3 +1314,7 @@ with tab7:
 
 st.markdown("---")
 st.markdown(f"<div style='text-align: center; color: {COLORS['gray_light']};'>Salla Analytics Dashboard | Data refreshes every 5 minutes</div>", unsafe_allow_html=True)
+
+slider_stats = st.session_state.get('slider_stats', {'changes': 0, 'from_cache': 0})
+if slider_stats['changes']:
+    st.markdown(f"<div style='text-align: center; color: {COLORS['gray_mid']};'>Top-N slider changes served from cache this session: {slider_stats['from_cache']} of {slider_stats['changes']}</div>", unsafe_allow_html=True)
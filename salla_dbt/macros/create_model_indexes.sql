@@ -0,0 +1,26 @@
+{% macro create_model_indexes() %}
+
+{#
+    Create the indexes declared in a model's `indexes` config, then ANALYZE the table so
+    the SQLite query planner has statistics (sqlite_stat1) for it.
+    Used as a post-hook; each index is a dict with `columns` and optional `unique`.
+    Columns may be expressions, e.g. 'DATE(order_purchase_timestamp)'.
+    Example: indexes=[{'columns': ['customer_id', 'effective_from']}]
+             -> CREATE INDEX main_curated.dim_customers__customer_id_effective_from
+                ON dim_customers (customer_id, effective_from)
+#}
+
+    {% if execute %}
+        {% for index in config.get('indexes', []) %}
+            {% set index_name = this.identifier ~ '__' ~ modules.re.sub('[^0-9a-zA-Z]+', '_', index['columns'] | join('__')).strip('_') %}
+            {% do run_query(
+                "CREATE " ~ ("UNIQUE " if index.get('unique', false) else "") ~ "INDEX IF NOT EXISTS "
+                ~ this.schema ~ "." ~ index_name
+                ~ " ON " ~ this.identifier ~ " (" ~ index['columns'] | join(', ') ~ ")"
+            ) %}
+        {% endfor %}
+
+        {% do run_query("ANALYZE " ~ this.schema ~ "." ~ this.identifier) %}
+    {% endif %}
+
+{% endmacro %}
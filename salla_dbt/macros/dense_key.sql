@@ -0,0 +1,22 @@
+{% macro dense_key(relation, id_column, key_column) %}
+
+{#
+    Map every distinct non-NULL identifier of a relation to a dense integer key
+    (0, 1, 2, ...), numbered in identifier order so ordering by the key is ordering
+    by the identifier.
+    Example: dense_key(ref('stg_products'), 'product_id', 'product_key')
+             -> (product_key, product_id) rows (0, '0009406fd...'), (1, '000b8f95f...'), ...
+#}
+    SELECT
+        ROW_NUMBER() OVER (ORDER BY {{ id_column }}) - 1 AS {{ key_column }}
+        , {{ id_column }}
+    FROM (
+        SELECT DISTINCT
+            {{ id_column }}
+        FROM
+            {{ relation }}
+        WHERE
+            {{ id_column }} IS NOT NULL
+    )
+
+{% endmacro %}
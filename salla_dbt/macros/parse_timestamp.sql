@@ -1,10 +1,15 @@
-{% macro parse_timestamp(column_name) %}
+{% macro parse_timestamp(column_name, normalized=false) %}
 
 {#
     Parse timestamp stringinto SQLite datetime (YYYY-MM-DD HH:MM:00).
     Example: '9/4/2016 21:15' -> '2016-09-04 21:15:00'
+    When normalized is true, the column already holds that format (see raw_timestamps_normalized)
+    and is passed through without any per-row parsing.
 #}
 
+    {% if normalized %}
+    {{ column_name }}
+    {% else %}
     (
         CASE 
             WHEN {{ column_name }} IS NULL THEN NULL
@@ -27,6 +32,7 @@
             )
         END
     )
+    {% endif %}
 
 {% endmacro %}
 
@@ -0,0 +1,36 @@
+{% macro raw_timestamps_normalized(table_name) %}
+
+{#
+    Check whether the loader already stored a raw table's timestamps as ISO-8601 text
+    (python scripts/load_raw_data.py --normalize-timestamps).
+    Reads the _raw_load_metadata table written by the loader. Can be forced with the
+    raw_timestamps_normalized var.
+    Example: raw_timestamps_normalized('orders') -> true
+#}
+
+    {% set forced = var('raw_timestamps_normalized', none) %}
+    {% if forced is not none %}
+        {{ return(forced) }}
+    {% endif %}
+
+    {% if not execute %}
+        {{ return(false) }}
+    {% endif %}
+
+    {% set raw_schema = source('raw', table_name).schema %}
+
+    {% set metadata_exists = run_query(
+        "SELECT COUNT(*) FROM " ~ raw_schema ~ ".sqlite_master"
+        ~ " WHERE type = 'table' AND name = '_raw_load_metadata'"
+    ) %}
+    {% if metadata_exists.rows[0][0] == 0 %}
+        {{ return(false) }}
+    {% endif %}
+
+    {% set timestamp_format = run_query(
+        "SELECT timestamp_format FROM " ~ raw_schema ~ "._raw_load_metadata"
+        ~ " WHERE table_name = '" ~ table_name ~ "'"
+    ) %}
+    {{ return(timestamp_format.rows | length > 0 and timestamp_format.rows[0][0] == 'iso8601') }}
+
+{% endmacro %}
@@ -1,7 +1,11 @@
 {{
     config(
         materialized='table',
-        tags=['curated', 'sales']
+        tags=['curated', 'sales'],
+        indexes=[
+            {'columns': ['customer_address_id', 'customer_state'], 'unique': true},
+            {'columns': ['customer_key', 'effective_from', 'effective_to', 'customer_state']}
+        ]
     )
 }}
 
@@ -11,7 +15,7 @@
     Tracks historical address changes for each customer to enable
     accurate regional sales analysis over time.
 
-    Natural Key: customer_id
+    Natural Key: customer_id (integer key: customer_key)
     Surrogate Key: customer_address_id
 */
 
@@ -19,6 +23,10 @@ WITH customer_orders AS (
     SELECT * FROM {{ ref('int_customer_orders') }}
 )
 
+, customer_keys AS (
+    SELECT * FROM {{ ref('key_customers') }}
+)
+
 , add_date_ranges AS (
     SELECT
         customer_address_id
@@ -41,19 +49,24 @@ WITH customer_orders AS (
 
 SELECT
     -- primary key
-    customer_address_id
+    D.customer_address_id
 
     -- natural key
-    , customer_id
+    , D.customer_id
+    , K.customer_key
 
     -- dimensions
-    , customer_city
-    , customer_state
-    , effective_from
-    , effective_to
+    , D.customer_city
+    , D.customer_state
+    , D.effective_from
+    , D.effective_to
     , (
-        effective_to = DATETIME('9999-12-31 00:00:00')
+        D.effective_to = DATETIME('9999-12-31 00:00:00')
     ) AS is_current_address
 
 FROM
-    add_date_ranges
+    add_date_ranges AS D
+LEFT JOIN
+    customer_keys AS K ON (
+        D.customer_id = K.customer_id
+    )
@@ -1,7 +1,11 @@
 {{
     config(
         materialized='table',
-        tags=['curated', 'sales']
+        tags=['curated', 'sales'],
+        indexes=[
+            {'columns': ['product_id', 'product_category_name'], 'unique': true},
+            {'columns': ['product_key', 'product_category_name'], 'unique': true}
+        ]
     )
 }}
 
@@ -9,10 +13,19 @@ WITH products AS (
     SELECT * FROM {{ ref('stg_products') }}
 )
 
+, product_keys AS (
+    SELECT * FROM {{ ref('key_products') }}
+)
+
 SELECT
-    product_id
-    , product_id AS product_name -- Placeholder: would be actual name if present
-    , product_category_name
-    , product_photos_qty
+    P.product_id
+    , K.product_key
+    , P.product_id AS product_name -- Placeholder: would be actual name if present
+    , P.product_category_name
+    , P.product_photos_qty
 FROM
-    products
+    products AS P
+LEFT JOIN
+    product_keys AS K ON (
+        P.product_id = K.product_id
+    )
@@ -27,8 +27,17 @@ WITH order_items AS (
     SELECT DISTINCT seller_id FROM order_items
 )
 
+, seller_keys AS (
+    SELECT * FROM {{ ref('key_sellers') }}
+)
+
 SELECT
-    seller_id
-    , seller_id AS seller_name -- Placeholder: would be actual name if present
+    S.seller_id
+    , K.seller_key
+    , S.seller_id AS seller_name -- Placeholder: would be actual name if present
 FROM
-    unique_sellers
+    unique_sellers AS S
+LEFT JOIN
+    seller_keys AS K ON (
+        S.seller_id = K.seller_id
+    )
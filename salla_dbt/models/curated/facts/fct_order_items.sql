@@ -1,7 +1,16 @@
 {{
     config(
         materialized='table',
-        tags=['curated', 'sales']
+        tags=['curated', 'sales'],
+        indexes=[
+            {'columns': ['customer_key', 'order_purchase_timestamp']},
+            {'columns': ['customer_address_id']},
+            {'columns': ['product_key']},
+            {'columns': ['seller_key', 'order_purchase_timestamp']},
+            {'columns': ['order_purchase_timestamp']},
+            {'columns': ['seller_key', 'DATE(order_purchase_timestamp)', 'order_key', 'total_item_price', 'total_shipping_price']},
+            {'columns': ['seller_key', 'SUBSTR(order_purchase_timestamp, 1, 7)', 'total_item_price', 'total_shipping_price']}
+        ]
     )
 }}
 
@@ -18,6 +27,10 @@
     - Excludes cancelled orders (assumption: all 7 use cases provided focus on completed sales)
     - Makes a distinction between shipping price and product revenue if needed for separate analysis
 
+    Keys:
+    - order_id, product_id, seller_id and customer_id are carried both as strings and as
+      dense integer keys (key_* tables); the semantic layer groups and joins on the keys
+
     Materialization:
     - Full refresh (table) instead of incremental due to:
       1. Small dataset (~110K rows, rebuilds in <1 second)
@@ -33,6 +46,22 @@ WITH customer_orders AS (
     SELECT * FROM {{ ref('int_order_items') }}
 )
 
+, order_keys AS (
+    SELECT * FROM {{ ref('key_orders') }}
+)
+
+, product_keys AS (
+    SELECT * FROM {{ ref('key_products') }}
+)
+
+, seller_keys AS (
+    SELECT * FROM {{ ref('key_sellers') }}
+)
+
+, customer_keys AS (
+    SELECT * FROM {{ ref('key_customers') }}
+)
+
 , joined AS (
     SELECT
         -- identifiers
@@ -47,6 +76,12 @@ WITH customer_orders AS (
         -- customer surrogate key
         , CO.customer_address_id
 
+        -- integer keys of the identifiers
+        , KO.order_key
+        , KP.product_key
+        , KS.seller_key
+        , KC.customer_key
+
         -- order attributes
         , CO.order_status
         , CO.order_purchase_timestamp
@@ -65,6 +100,22 @@ WITH customer_orders AS (
         order_items AS OI ON (
             CO.order_id = OI.order_id
         )
+    LEFT JOIN
+        order_keys AS KO ON (
+            OI.order_id = KO.order_id
+        )
+    LEFT JOIN
+        product_keys AS KP ON (
+            OI.product_id = KP.product_id
+        )
+    LEFT JOIN
+        seller_keys AS KS ON (
+            OI.seller_id = KS.seller_id
+        )
+    LEFT JOIN
+        customer_keys AS KC ON (
+            CO.customer_id = KC.customer_id
+        )
     WHERE
         -- exclude cancelled orders
         LOWER(CO.order_status) != 'canceled'
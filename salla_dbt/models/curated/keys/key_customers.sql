@@ -0,0 +1,23 @@
+{{
+    config(
+        materialized='table',
+        tags=['curated', 'key'],
+        indexes=[
+            {'columns': ['customer_key'], 'unique': true},
+            {'columns': ['customer_id', 'customer_key'], 'unique': true}
+        ]
+    )
+}}
+
+/*
+    Key Table: Customers
+
+    Grain: One row per customer_id
+
+    Purpose:
+    - Maps the 32-character customer_id to a dense integer customer_key (0, 1, 2, ... in customer_id
+      order), carried by fct_order_items and dim_customers
+    - The semantic layer groups and joins on customer_key and decodes to customer_id only on output
+*/
+
+{{ dense_key(ref('int_customer_orders'), 'customer_id', 'customer_key') }}
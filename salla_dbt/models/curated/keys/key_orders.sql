@@ -0,0 +1,23 @@
+{{
+    config(
+        materialized='table',
+        tags=['curated', 'key'],
+        indexes=[
+            {'columns': ['order_key'], 'unique': true},
+            {'columns': ['order_id', 'order_key'], 'unique': true}
+        ]
+    )
+}}
+
+/*
+    Key Table: Orders
+
+    Grain: One row per order_id
+
+    Purpose:
+    - Maps the 32-character order_id to a dense integer order_key (0, 1, 2, ... in order_id
+      order), carried by fct_order_items
+    - The semantic layer groups and joins on order_key and decodes to order_id only on output
+*/
+
+{{ dense_key(ref('int_customer_orders'), 'order_id', 'order_key') }}
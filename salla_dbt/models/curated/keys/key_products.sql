@@ -0,0 +1,23 @@
+{{
+    config(
+        materialized='table',
+        tags=['curated', 'key'],
+        indexes=[
+            {'columns': ['product_key'], 'unique': true},
+            {'columns': ['product_id', 'product_key'], 'unique': true}
+        ]
+    )
+}}
+
+/*
+    Key Table: Products
+
+    Grain: One row per product_id
+
+    Purpose:
+    - Maps the 32-character product_id to a dense integer product_key (0, 1, 2, ... in product_id
+      order), carried by fct_order_items, dim_products and the product rollups
+    - The semantic layer groups and joins on product_key and decodes to product_id only on output
+*/
+
+{{ dense_key(ref('stg_products'), 'product_id', 'product_key') }}
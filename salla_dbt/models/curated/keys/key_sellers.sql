@@ -0,0 +1,23 @@
+{{
+    config(
+        materialized='table',
+        tags=['curated', 'key'],
+        indexes=[
+            {'columns': ['seller_key'], 'unique': true},
+            {'columns': ['seller_id', 'seller_key'], 'unique': true}
+        ]
+    )
+}}
+
+/*
+    Key Table: Sellers (Stores)
+
+    Grain: One row per seller_id
+
+    Purpose:
+    - Maps the 32-character seller_id to a dense integer seller_key (0, 1, 2, ... in seller_id
+      order), carried by fct_order_items, dim_sellers and the seller rollups
+    - The semantic layer groups and joins on seller_key and decodes to seller_id only on output
+*/
+
+{{ dense_key(ref('int_order_items'), 'seller_id', 'seller_key') }}
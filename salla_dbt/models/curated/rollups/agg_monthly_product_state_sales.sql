@@ -0,0 +1,68 @@
+{{
+    config(
+        materialized='table',
+        tags=['curated', 'rollup'],
+        indexes=[
+            {'columns': ['product_key', 'customer_state', 'order_month'], 'unique': true},
+            {'columns': ['product_category_name', 'product_key']}
+        ]
+    )
+}}
+
+/*
+    Rollup: Monthly Sales by Product and Customer State
+
+    Grain: One row per order_month + product_key + customer_state
+    (product_category_name is carried along; it is an attribute of the product)
+
+    Purpose:
+    - Answers product metrics overall and by region, and distinct product counts per
+      category, without scanning fct_order_items
+
+    Additivity:
+    - total_revenue, total_quantity and num_order_items are additive across all dimensions
+    - num_orders (distinct orders) is exact at this grain and stays exact when summed
+      across months and states, but not across products
+*/
+
+WITH order_items AS (
+    SELECT * FROM {{ ref('fct_order_items') }}
+)
+
+, customers AS (
+    SELECT * FROM {{ ref('dim_customers') }}
+)
+
+, products AS (
+    SELECT * FROM {{ ref('dim_products') }}
+)
+
+SELECT
+    -- grain
+    SUBSTR(F.order_purchase_timestamp, 1, 7) AS order_month
+    , F.product_key
+    , C.customer_state
+    , P.product_category_name
+
+    -- measures
+    , SUM(F.total_item_price + F.total_shipping_price) AS total_revenue
+    , SUM(F.quantity) AS total_quantity
+    , COUNT(*) AS num_order_items
+    , COUNT(DISTINCT F.order_key) AS num_orders
+
+FROM
+    order_items AS F
+
+INNER JOIN
+    customers AS C
+    ON F.customer_address_id = C.customer_address_id
+
+INNER JOIN
+    products AS P
+    ON F.product_key = P.product_key
+
+GROUP BY
+    SUBSTR(F.order_purchase_timestamp, 1, 7)
+    , F.product_key
+    , C.customer_state
+    , P.product_category_name
@@ -0,0 +1,46 @@
+{{
+    config(
+        materialized='table',
+        tags=['curated', 'rollup'],
+        indexes=[
+            {'columns': ['seller_key', 'order_month', 'total_revenue'], 'unique': true}
+        ]
+    )
+}}
+
+/*
+    Rollup: Monthly Sales by Seller
+
+    Grain: One row per order_month + seller_key
+
+    Purpose:
+    - Answers store-level monthly metrics (monthly growth by store) without scanning
+      fct_order_items
+
+    Additivity:
+    - total_revenue, total_quantity and num_order_items are additive across all dimensions
+    - num_orders (distinct orders) is exact at this grain and stays exact when summed
+      across months, but not across sellers
+*/
+
+WITH order_items AS (
+    SELECT * FROM {{ ref('fct_order_items') }}
+)
+
+SELECT
+    -- grain
+    SUBSTR(order_purchase_timestamp, 1, 7) AS order_month
+    , seller_key
+
+    -- measures
+    , SUM(total_item_price + total_shipping_price) AS total_revenue
+    , SUM(quantity) AS total_quantity
+    , COUNT(*) AS num_order_items
+    , COUNT(DISTINCT order_key) AS num_orders
+
+FROM
+    order_items
+
+GROUP BY
+    SUBSTR(order_purchase_timestamp, 1, 7)
+    , seller_key
@@ -0,0 +1,64 @@
+{{
+    config(
+        materialized='table',
+        tags=['curated', 'rollup'],
+        indexes=[
+            {'columns': ['customer_state', 'product_category_name', 'order_month'], 'unique': true}
+        ]
+    )
+}}
+
+/*
+    Rollup: Monthly Sales by Customer State and Product Category
+
+    Grain: One row per order_month + customer_state + product_category_name
+
+    Purpose:
+    - Answers category metrics overall and by customer location without scanning
+      fct_order_items
+
+    Additivity:
+    - total_revenue, total_quantity and num_order_items are additive across all dimensions
+    - num_orders (distinct orders) is exact at this grain and stays exact when summed
+      across months and states (order-level attributes), but not across categories
+*/
+
+WITH order_items AS (
+    SELECT * FROM {{ ref('fct_order_items') }}
+)
+
+, customers AS (
+    SELECT * FROM {{ ref('dim_customers') }}
+)
+
+, products AS (
+    SELECT * FROM {{ ref('dim_products') }}
+)
+
+SELECT
+    -- grain
+    SUBSTR(F.order_purchase_timestamp, 1, 7) AS order_month
+    , C.customer_state
+    , P.product_category_name
+
+    -- measures
+    , SUM(F.total_item_price + F.total_shipping_price) AS total_revenue
+    , SUM(F.quantity) AS total_quantity
+    , COUNT(*) AS num_order_items
+    , COUNT(DISTINCT F.order_key) AS num_orders
+
+FROM
+    order_items AS F
+
+INNER JOIN
+    customers AS C
+    ON F.customer_address_id = C.customer_address_id
+
+INNER JOIN
+    products AS P
+    ON F.product_key = P.product_key
+
+GROUP BY
+    SUBSTR(F.order_purchase_timestamp, 1, 7)
+    , C.customer_state
+    , P.product_category_name
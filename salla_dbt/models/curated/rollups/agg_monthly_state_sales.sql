@@ -0,0 +1,50 @@
+{{
+    config(
+        materialized='table',
+        tags=['curated', 'rollup'],
+        indexes=[
+            {'columns': ['order_month', 'customer_state'], 'unique': true}
+        ]
+    )
+}}
+
+/*
+    Rollup: Monthly Sales by Customer State
+
+    Grain: One row per order_month + customer_state (address at time of order)
+
+    Purpose:
+    - Answers time series metrics, including distinct order counts, without scanning
+      fct_order_items. Both dimensions are order-level attributes, so num_orders stays
+      exact when summed across months and states.
+*/
+
+WITH order_items AS (
+    SELECT * FROM {{ ref('fct_order_items') }}
+)
+
+, customers AS (
+    SELECT * FROM {{ ref('dim_customers') }}
+)
+
+SELECT
+    -- grain
+    SUBSTR(F.order_purchase_timestamp, 1, 7) AS order_month
+    , C.customer_state
+
+    -- measures
+    , SUM(F.total_item_price + F.total_shipping_price) AS total_revenue
+    , SUM(F.quantity) AS total_quantity
+    , COUNT(*) AS num_order_items
+    , COUNT(DISTINCT F.order_key) AS num_orders
+
+FROM
+    order_items AS F
+
+INNER JOIN
+    customers AS C
+    ON F.customer_address_id = C.customer_address_id
+
+GROUP BY
+    SUBSTR(F.order_purchase_timestamp, 1, 7)
+    , C.customer_state
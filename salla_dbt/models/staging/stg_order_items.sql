@@ -1,3 +1,5 @@
+{% set timestamps_normalized = raw_timestamps_normalized('order_items') %}
+
 WITH source AS (
     SELECT * FROM {{ source('raw', 'order_items') }}
 )
@@ -8,7 +10,7 @@ SELECT
     , CAST(order_item_id AS INTEGER) AS order_item_sequence
     , product_id
     , seller_id
-    , {{ parse_timestamp('shipping_limit_date') }} AS shipping_limit_date
+    , {{ parse_timestamp('shipping_limit_date', timestamps_normalized) }} AS shipping_limit_date
     , CAST(price AS REAL) AS item_price
     , CAST(freight_value AS REAL) AS shipping_price
 FROM
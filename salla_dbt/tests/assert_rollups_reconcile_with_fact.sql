@@ -0,0 +1,51 @@
+/*
+    Test: Rollups Reconcile with the Fact Table
+
+    Validates that every rollup adds up to the same total revenue and number of
+    order items as fct_order_items, i.e. no rows were lost or duplicated by the
+    dimension joins.
+    Allows for small floating point rounding differences (< 0.01)
+*/
+
+WITH fact_totals AS (
+    SELECT
+        SUM(total_item_price + total_shipping_price) AS total_revenue
+        , COUNT(*) AS num_order_items
+    FROM
+        {{ ref('fct_order_items') }}
+)
+
+, rollup_totals AS (
+    {% for rollup in [
+        'agg_daily_seller_sales',
+        'agg_monthly_seller_sales',
+        'agg_monthly_state_sales',
+        'agg_monthly_state_category_sales',
+        'agg_monthly_product_state_sales'
+    ] %}
+    SELECT
+        '{{ rollup }}' AS rollup_name
+        , SUM(total_revenue) AS total_revenue
+        , SUM(num_order_items) AS num_order_items
+    FROM
+        {{ ref(rollup) }}
+    {% if not loop.last %}UNION ALL{% endif %}
+    {% endfor %}
+)
+
+SELECT
+    R.rollup_name
+    , R.total_revenue
+    , F.total_revenue AS fact_total_revenue
+    , R.num_order_items
+    , F.num_order_items AS fact_num_order_items
+
+FROM
+    rollup_totals AS R
+
+CROSS JOIN
+    fact_totals AS F
+
+WHERE
+    ABS(R.total_revenue - F.total_revenue) > 0.01
+    OR R.num_order_items != F.num_order_items
@@ -0,0 +1,348 @@
+"""
+Benchmark and equivalence check for alternative semantic-layer query paths
+
+Some query functions can compute the same result in more than one way (e.g. the
+customer join strategy of the region queries). For each curated database given on the
+command line (typically builds of the synthetic data at different scale factors), this
+script runs every variant of every function on every execution backend (SQLite and
+DuckDB, see semantic_layer_mocked/backends.py), checks that all of them return the same
+DataFrame as the first variant on the first backend and reports the median run time and
+the peak Python memory (tracemalloc, which includes NumPy/pandas buffers) of one extra
+traced run. The one-off DuckDB setup (Parquet export of the database) is timed
+separately.
+
+tracemalloc does not see memory allocated outside Python's allocator (Arrow buffers,
+polars, DuckDB). With --rss (Linux only), each variant also runs once in a fresh
+interpreter and the growth of its peak resident set size during the call is reported,
+which covers both.
+
+Rankings are also compared in their row order, which normalize() hides: for the ranked
+functions in RANKING_CHECKS, every variant must return the full ranking in the same
+order as the reference, over several runs (a swap of two near-tied rows is a mismatch).
+
+With --bundle, get_dashboard_bundle (every dashboard dataset from one read of the fact
+table) is also timed against the sum of the individual calls it replaces, with and
+without rollups, and each of its datasets is checked against the individual result.
+
+Build a curated database per scale factor first, e.g.:
+    python scripts/generate_synthetic_data.py --scale-factor 1 10
+    python scripts/load_raw_data.py --mode stream --csv-dir synthetic_data/sf10
+    (cd salla_dbt && dbt build)
+    cp data_warehouse/main_curated.db data_warehouse/sf10_curated.db
+
+Usage:
+    python scripts/benchmark_semantic_layer.py --databases sf1=data_warehouse/sf1_curated.db sf10=data_warehouse/sf10_curated.db
+    python scripts/benchmark_semantic_layer.py --functions get_top_products_by_region --repeats 5
+    python scripts/benchmark_semantic_layer.py --backends sqlite duckdb --databases sf1=... sf3=...
+    python scripts/benchmark_semantic_layer.py --functions get_cohort_analysis --rss
+    python scripts/benchmark_semantic_layer.py --filters '{"customer_states": ["SP"], "start_date": "2024-01-01"}'
+    python scripts/benchmark_semantic_layer.py --functions --bundle
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from semantic_layer_mocked import queries
+from semantic_layer_mocked.backends import BACKENDS, get_duckdb_backend
+from semantic_layer_mocked.connection import DEFAULT_DB_PATH
+
+# Function name -> {variant name: keyword arguments}; the first variant is the reference
+VARIANTS = {
+    'get_top_products_by_region': {
+        'rollup': {},
+        'surrogate_key': {'use_rollups': False, 'join_strategy': 'surrogate_key'},
+        'range': {'use_rollups': False, 'join_strategy': 'range'}
+    },
+    'get_popular_categories': {
+        'rollup': {},
+        'fact': {'use_rollups': False}
+    },
+    'get_time_series_sales': {
+        'rollup': {},
+        'fact': {'use_rollups': False}
+    },
+    'get_avg_sale_by_category': {
+        'rollup': {},
+        'fact': {'use_rollups': False}
+    },
+    'get_top_categories_by_location': {
+        'rollup': {},
+        'surrogate_key': {'use_rollups': False, 'join_strategy': 'surrogate_key'},
+        'range': {'use_rollups': False, 'join_strategy': 'range'}
+    },
+    'get_top_stores_by_daily_sales': {
+        'rollup': {},
+        'sql': {'use_rollups': False, 'engine': 'sql'},
+        'pandas': {'engine': 'pandas'},
+        'polars': {'engine': 'polars'}
+    },
+    'get_monthly_growth_by_store': {
+        'rollup': {},
+        'sql': {'use_rollups': False, 'engine': 'sql'},
+        'pandas': {'engine': 'pandas'},
+        'polars': {'engine': 'polars'}
+    },
+    'get_cohort_analysis': {
+        'vectorized': {'engine': 'vectorized'},
+        'pandas': {'engine': 'pandas'},
+        'polars': {'engine': 'polars'}
+    }
+}
+
+# Ranked function -> keyword arguments of the full rankings whose row order is checked
+RANKING_CHECKS = {
+    'get_top_stores_by_daily_sales': [
+        {'top_n': None},
+        {'top_n': None, 'filters': {'start_date': '2017-06-01', 'end_date': '2018-03-31'}}
+    ]
+}
+RANKING_RUNS = 3
+
+# get_dashboard_bundle dataset -> (query function, keyword arguments giving the same result)
+BUNDLE_DATASETS = {
+    'top_products_by_region': ('get_top_products_by_region', {'with_sketches': True}),
+    'popular_categories': ('get_popular_categories', {'top_n': None, 'with_sketches': True}),
+    'time_series_sales': ('get_time_series_sales', {}),
+    'avg_sale_by_category': ('get_avg_sale_by_category', {}),
+    'top_categories_by_location': ('get_top_categories_by_location', {'top_n': None}),
+    'top_stores_by_daily_sales': ('get_top_stores_by_daily_sales', {'top_n': None}),
+    'monthly_growth_by_store': ('get_monthly_growth_by_store', {}),
+    'cohort_analysis': ('get_cohort_analysis', {})
+}
+BUNDLE_KWARGS = {'top_n_categories': None, 'top_n_location': None, 'top_n_stores': None, 'with_sketches': True}
+
+
+def normalize(df):
+    """
+    Sort rows and columns so results can be compared independently of row order. Rows are
+    sorted by the non-float columns first, so float rounding differences between
+    implementations cannot change the row order. Decoded identifiers (Categoricals, see
+    semantic_layer_mocked/keys.py) compare as their strings.
+    """
+    df = df[sorted(df.columns)]
+    df = df.astype({column: str for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+    float_columns = [column for column in df.columns if pd.api.types.is_float_dtype(df[column])]
+    sort_columns = [column for column in df.columns if column not in float_columns] + float_columns
+    return df.sort_values(sort_columns).reset_index(drop=True)
+
+
+def time_variant(func, kwargs, repeats):
+    """
+    Returns:
+        tuple: (median seconds, result of the last run)
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(**kwargs)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def peak_memory_mb(func, kwargs):
+    tracemalloc.start()
+    try:
+        func(**kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def _proc_status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+
+
+def _peak_rss_growth_mb(name, kwargs):
+    """
+    Runs in a fresh interpreter: growth of the peak RSS during one uncached call, after
+    a warm-up statement has loaded the backend and the optional engine modules. Uses
+    Linux's /proc/self/status (VmHWM, reset through /proc/self/clear_refs).
+    """
+    # Load the polars engine's module before measuring, so its import is not counted
+    importlib.import_module('polars')
+    from semantic_layer_mocked.backends import read_arrow
+
+    read_arrow("SELECT * FROM fct_order_items LIMIT 1")
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return float('nan')
+    before = _proc_status_mb('VmRSS')
+    getattr(queries, name).__wrapped__(**kwargs)
+    return _proc_status_mb('VmHWM') - before
+
+
+def peak_rss_mb(name, kwargs):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_peak_rss_growth_mb, (name, kwargs))
+
+
+def benchmark_bundle(label, backend, filters, repeats):
+    """
+    Time get_dashboard_bundle against the individual calls (fact table only, and with
+    rollups) and check its datasets against the fact-table results.
+
+    Returns:
+        int: number of datasets that differ
+    """
+    bundle_kwargs = {**BUNDLE_KWARGS, 'filters': filters}
+    bundle_seconds, bundle = time_variant(queries.get_dashboard_bundle, bundle_kwargs, repeats)
+    bundle_peak_mb = peak_memory_mb(queries.get_dashboard_bundle, bundle_kwargs)
+    print(f"{label:<10}{'get_dashboard_bundle':<34}{backend:<8}{'one pass':<16}{bundle_seconds:>9.3f}s{bundle_peak_mb:>9.1f} MB")
+
+    mismatches = 0
+    for use_rollups in (False, True):
+        total_seconds = 0.0
+        for dataset, (name, kwargs) in BUNDLE_DATASETS.items():
+            func = getattr(queries, name).__wrapped__
+            kwargs = {**kwargs, 'filters': filters}
+            if name != 'get_cohort_analysis':
+                kwargs['use_rollups'] = use_rollups
+            seconds, result = time_variant(func, kwargs, repeats)
+            total_seconds += seconds
+            if use_rollups:
+                continue
+            try:
+                pd.testing.assert_frame_equal(normalize(bundle[dataset]), normalize(result), check_dtype=False, rtol=1e-9)
+            except AssertionError as e:
+                mismatches += 1
+                print(f"{label} get_dashboard_bundle [{backend}] {dataset} differs from {name}:\n{e}\n")
+        variant = 'sum of rollups' if use_rollups else 'sum of fact'
+        print(f"{label:<10}{'get_dashboard_bundle':<34}{backend:<8}{variant:<16}{total_seconds:>9.3f}s"
+              f"  (bundle {bundle_seconds / total_seconds:.0%} of it)")
+    return mismatches
+
+
+def check_rankings(label, name, backend, filters):
+    """
+    Compare the row order of every variant's full ranking with the first variant's, for
+    each case of RANKING_CHECKS (plus the --filters, if any).
+
+    Returns:
+        int: number of variants whose order differs
+    """
+    func = getattr(queries, name).__wrapped__
+    cases = RANKING_CHECKS[name] + ([{'top_n': None, 'filters': filters}] if filters is not None else [])
+    mismatches = 0
+    for case in cases:
+        reference = None
+        case_mismatches = 0
+        for variant, kwargs in VARIANTS[name].items():
+            for _ in range(RANKING_RUNS):
+                result = func(**{**kwargs, **case})
+                order = result.iloc[:, 0].astype(str).tolist()
+                if reference is None:
+                    reference = order
+                elif order != reference:
+                    case_mismatches += 1
+                    first = next(i for i, (a, b) in enumerate(zip(order, reference)) if a != b) if len(order) == len(reference) else None
+                    print(f"{label} {name} [{backend} {variant}] ranks differently from the reference for {case}"
+                          f" (first difference at row {first})")
+                    break
+        mismatches += case_mismatches
+        status = 'same order' if not case_mismatches else 'MISMATCH'
+        print(f"{label:<10}{name:<34}{backend:<8}{'ranking':<16}{len(reference or []):>9,} rows  {json.dumps(case)}  {status}")
+    return mismatches
+
+
+def parse_database(value):
+    label, _, path = value.rpartition('=')
+    path = Path(path)
+    return (label or path.stem), path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--databases', nargs='+', type=parse_database, default=[('current', DEFAULT_DB_PATH)],
+                        metavar='LABEL=PATH', help='curated databases to benchmark (default: data_warehouse/main_curated.db)')
+    parser.add_argument('--functions', nargs='*', choices=sorted(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--filters', type=json.loads, default=None, metavar='JSON',
+                        help='filters passed to every variant, e.g. \'{"customer_states": ["SP"]}\'')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['sqlite'],
+                        help='execution backends to run every variant on (default: sqlite)')
+    parser.add_argument('--rss', action='store_true',
+                        help='also measure the peak RSS growth of each variant in a fresh process (slower)')
+    parser.add_argument('--bundle', action='store_true',
+                        help='also compare get_dashboard_bundle with the individual calls')
+    args = parser.parse_args()
+
+    rows = []
+    mismatches = 0
+
+    for label, db_path in args.databases:
+        if not db_path.exists():
+            raise SystemExit(f"Database not found: {db_path}")
+        # The connection pool switches to the new path on the next query
+        os.environ['SALLA_CURATED_DB'] = str(db_path.resolve())
+
+        if 'duckdb' in args.backends:
+            start = time.perf_counter()
+            get_duckdb_backend()
+            print(f"{label:<10}DuckDB setup {time.perf_counter() - start:.3f}s")
+
+        for name in args.functions:
+            # Bypass the result cache
+            func = getattr(queries, name).__wrapped__
+            reference = None
+
+            for backend in args.backends:
+                os.environ['SALLA_BACKEND'] = backend
+                for variant, kwargs in VARIANTS[name].items():
+                    if args.filters is not None:
+                        kwargs = {**kwargs, 'filters': args.filters}
+                    seconds, result = time_variant(func, kwargs, args.repeats)
+                    peak_mb = peak_memory_mb(func, kwargs)
+                    rss_mb = peak_rss_mb(name, kwargs) if args.rss else float('nan')
+                    result = normalize(result)
+
+                    if reference is None:
+                        reference, status = result, 'reference'
+                    else:
+                        try:
+                            pd.testing.assert_frame_equal(result, reference, check_dtype=False, rtol=1e-9)
+                            status = 'identical'
+                        except AssertionError as e:
+                            status = 'MISMATCH'
+                            mismatches += 1
+                            print(f"{label} {name} [{backend} {variant}] differs from the reference:\n{e}\n")
+
+                    rows.append((label, name, backend, variant, len(result), seconds, peak_mb, rss_mb, status))
+                    print(f"{label:<10}{name:<34}{backend:<8}{variant:<16}{seconds:>9.3f}s{peak_mb:>9.1f} MB{rss_mb:>9.1f} MB  {status}")
+
+                if name in RANKING_CHECKS:
+                    mismatches += check_rankings(label, name, backend, args.filters)
+
+        if args.bundle:
+            for backend in args.backends:
+                os.environ['SALLA_BACKEND'] = backend
+                mismatches += benchmark_bundle(label, backend, args.filters, args.repeats)
+
+    print()
+    print(f"{'database':<10}{'function':<34}{'backend':<8}{'variant':<16}{'rows':>9}{'median (s)':>12}{'peak MB':>9}{'RSS MB':>9}  result")
+    for label, name, backend, variant, num_rows, seconds, peak_mb, rss_mb, status in rows:
+        print(f"{label:<10}{name:<34}{backend:<8}{variant:<16}{num_rows:>9,}{seconds:>12.3f}{peak_mb:>9.1f}{rss_mb:>9.1f}  {status}")
+
+    if mismatches:
+        raise SystemExit(f"\n{mismatches} variant(s) returned different results")
+    print("\nAll variants returned identical results")
+
+
+if __name__ == '__main__':
+    main()
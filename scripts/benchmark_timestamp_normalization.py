@@ -0,0 +1,76 @@
+"""
+Benchmark: load-time timestamp normalization vs. per-row parse_timestamp in dbt
+
+For each variant, loads the raw layer with scripts/load_raw_data.py (with and without
+--normalize-timestamps) and times a full `dbt build` on top of it. Reports the median
+load, build and total time over several repeats.
+
+Note: this rebuilds the databases in data_warehouse/ (the paths used by the dbt profile).
+
+Usage:
+    python scripts/benchmark_timestamp_normalization.py --csv-dir path/to/csv_exports --repeats 3
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent
+DBT_DIR = PROJECT_DIR / 'salla_dbt'
+LOADER = PROJECT_DIR / 'scripts' / 'load_raw_data.py'
+
+VARIANTS = {
+    'parse_timestamp macro': [],
+    'normalized at load': ['--normalize-timestamps']
+}
+
+
+def timed_run(command, cwd):
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=cwd, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+
+    if result.returncode != 0:
+        print(result.stdout[-2000:])
+        print(result.stderr[-2000:])
+        raise SystemExit(f"Command failed: {' '.join(map(str, command))}")
+
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv-dir', type=Path, default=PROJECT_DIR / 'problem_statement')
+    parser.add_argument('--mode', default='stream', help='loader mode used for both variants (default: stream)')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+
+    for name, loader_args in VARIANTS.items():
+        load_times, build_times = [], []
+
+        for i in range(args.repeats):
+            load_command = [sys.executable, str(LOADER), '--mode', args.mode,
+                            '--csv-dir', str(args.csv_dir.resolve()), *loader_args]
+            load_times.append(timed_run(load_command, PROJECT_DIR))
+            build_times.append(timed_run(['dbt', 'build'], DBT_DIR))
+            print(f"{name} run {i + 1}: load {load_times[-1]:.2f}s, dbt build {build_times[-1]:.2f}s")
+
+        results[name] = (statistics.median(load_times), statistics.median(build_times))
+
+    print()
+    print(f"{'variant':<24}{'load (s)':>10}{'dbt build (s)':>15}{'total (s)':>11}")
+    for name, (load_seconds, build_seconds) in results.items():
+        print(f"{name:<24}{load_seconds:>10.2f}{build_seconds:>15.2f}{load_seconds + build_seconds:>11.2f}")
+
+    baseline = sum(results['parse_timestamp macro'])
+    normalized = sum(results['normalized at load'])
+    print(f"\nTotal speedup: {baseline / normalized:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Build the HyperLogLog sketch rollups for the semantic layer
+
+Recomputes every rollup of the curated database from fct_order_items with sketches of
+the orders and customers of each row (see semantic_layer_mocked/sketches.py) and
+stores them in a side database under .cache/sketches, keyed on the curated database
+build. Run it after `dbt build`; until then, sketch measures are computed from the fact
+table.
+
+Then reports the accuracy of the estimates: distinct orders and customers estimated
+from merged sketches against the exact counts, for several groupings.
+
+Usage:
+    python scripts/build_sketches.py
+    python scripts/build_sketches.py --force    # rebuild even if up to date
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from semantic_layer_mocked import metrics
+from semantic_layer_mocked.rollups import table_sizes
+from semantic_layer_mocked.sketches import RELATIVE_ERROR
+
+# Groupings the accuracy report checks (dimensions of metrics.query)
+GROUPINGS = [(), ('customer_state',), ('product_category_name',), ('order_month',), ('seller_id',)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--force', action='store_true', help='rebuild even if the sketches are up to date')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = metrics.build_sketch_rollups(force=args.force)
+    print(f"Sketch rollups ready in {time.perf_counter() - start:.2f}s: {path}")
+    for table, rows in sorted(table_sizes().items()):
+        if table.startswith('sketches.'):
+            print(f"  {table:<45}{rows:>10,} rows")
+
+    print(f"\nAccuracy (expected relative standard error {RELATIVE_ERROR:.2%})")
+    print(f"{'grouping':<24}{'measure':<12}{'groups':>8}{'mean |error|':>14}{'max |error|':>13}{'within 2 SE':>13}")
+    for dimensions in GROUPINGS:
+        for name in ('orders', 'customers'):
+            df = metrics.query.__wrapped__([f"num_{name}", f"approx_num_{name}"], dimensions)
+            error = (df[f"approx_num_{name}"] / df[f"num_{name}"] - 1).abs()
+            within = (error <= 2 * RELATIVE_ERROR).mean()
+            label = ', '.join(dimensions) or '(total)'
+            print(f"{label:<24}{name:<12}{len(df):>8,}{error.mean():>14.2%}{error.max():>13.2%}{within:>13.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Build the precomputed dashboard snapshot
+
+Runs every semantic-layer function behind the dashboard's first paint, with the full
+top-N rankings, and writes the results to one snapshot file stamped with the curated
+database build (see semantic_layer_mocked/snapshot.py). Run it after `dbt build` (and
+scripts/build_sketches.py, so the rankings come from the sketch rollups); the dashboard
+then starts from the snapshot instead of querying the warehouse.
+
+Then reports the file size and the time to load the snapshot, as the dashboard does on
+a cold start.
+
+Usage:
+    python scripts/build_snapshot.py
+    python scripts/build_snapshot.py --compression zstd    # smaller file, decompressed on load
+    python scripts/build_snapshot.py --output /path/to/dashboard_snapshot.arrow
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from semantic_layer_mocked import snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--compression', choices=['lz4', 'zstd'], default=None,
+                        help='compress the columns (default: uncompressed, loaded zero-copy)')
+    parser.add_argument('--output', type=Path, default=None,
+                        help='snapshot path (default: SALLA_SNAPSHOT or next to the curated database)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = snapshot.build_snapshot(path=args.output, compression=args.compression)
+    print(f"Snapshot built in {time.perf_counter() - start:.2f}s: {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+    header = snapshot.read_header(path)
+    for name, section in header['datasets'].items():
+        print(f"  {name:<30}{section['rows']:>10,} rows{section['length'] / 1e6:>10.2f} MB")
+
+    start = time.perf_counter()
+    datasets = snapshot.load_snapshot(path)
+    elapsed = time.perf_counter() - start
+    if datasets is None:
+        print("The snapshot does not match the current database build (was it rebuilt meanwhile?)")
+        sys.exit(1)
+    print(f"\nLoaded {len(datasets)} datasets in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
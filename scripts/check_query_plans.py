@@ -0,0 +1,96 @@
+"""
+Query plan check for the semantic layer
+
+Runs every query function in semantic_layer_mocked.queries, captures the SQL it sends to
+the curated database and prints the `EXPLAIN QUERY PLAN` of each statement. Steps that
+read a whole table without an index (SCAN <table>) or build a temporary B-tree for
+GROUP BY / ORDER BY / DISTINCT are reported as findings.
+
+Note: queries that aggregate the entire fact table are expected to scan it once; the
+report is meant to catch scans of the probed side of a join and avoidable sorts.
+
+Usage:
+    python scripts/check_query_plans.py
+    python scripts/check_query_plans.py --strict    # exit with status 1 on any finding
+"""
+
+import argparse
+import inspect
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from semantic_layer_mocked import queries
+from semantic_layer_mocked.connection import connection
+
+
+def capture_statements(func):
+    """
+    Call a query function and return the SQL statements it executed.
+    """
+    statements = []
+
+    # The pool reuses this thread's connection inside the query function
+    with connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            func()
+        finally:
+            conn.set_trace_callback(None)
+
+    return [sql for sql in statements if sql.lstrip().upper().startswith(('SELECT', 'WITH'))]
+
+
+def explain(sql):
+    """
+    Returns:
+        list: (plan step, is_finding) tuples, indented by depth in the plan tree
+    """
+    with connection() as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+
+    # Scanning a CTE or subquery result is not a table scan
+    subqueries = {detail.split(' ', 1)[1] for _, _, _, detail in rows
+                  if detail.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+
+    depth = {0: 0}
+    steps = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, 0) + 1
+        target = detail[len('SCAN '):].split(' ')[0]
+        is_full_scan = (
+            detail.startswith('SCAN ') and 'INDEX' not in detail
+            and target not in subqueries and not target.startswith('(subquery')
+        )
+        is_temp_btree = 'USE TEMP B-TREE' in detail
+        steps.append(('  ' * depth[node_id] + detail, is_full_scan or is_temp_btree))
+
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--strict', action='store_true', help='exit with status 1 if any finding is reported')
+    args = parser.parse_args()
+
+    # Undecorated functions, so the SQL runs even when a result is cached
+    query_functions = [
+        getattr(func, '__wrapped__', func) for name, func in inspect.getmembers(queries, inspect.isfunction)
+        if name.startswith('get_') and func.__module__ == queries.__name__
+    ]
+
+    total_findings = 0
+    for func in query_functions:
+        print(f"\n{func.__name__}")
+        for sql in capture_statements(func):
+            for step, is_finding in explain(sql):
+                print(f"  {'!!' if is_finding else '  '} {step}")
+                total_findings += is_finding
+
+    print(f"\n{total_findings} full scan / temp B-tree step(s) found")
+    if args.strict and total_findings:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+"""
+Synthetic data generator for load and query benchmarking
+
+Generates customers.csv, orders.csv, order_items.csv and products.csv with the same schemas
+and formats as the source exports in problem_statement/, at a configurable scale factor.
+SF1 has roughly the size of the original dataset (~99K orders, ~113K order item rows).
+
+Distributions:
+- Order volume grows over time, with a daily purchase-hour profile
+- Repeat customers, a share of whom change address (A -> B, and A -> B -> A) to exercise
+  the SCD Type 2 logic in int_customer_orders / dim_customers
+- Multi-unit orders: one row per unit with a repeated order_item_id sequence
+- Order status mix including canceled orders (missing lifecycle timestamps where relevant)
+- Zipf-skewed product popularity and seller size
+- Product categories sampled from problem_statement/products.csv when available
+
+Orders are generated in independent chunks, so memory stays bounded at any scale factor.
+
+Usage:
+    python scripts/generate_synthetic_data.py --scale-factor 10
+    python scripts/load_raw_data.py --mode stream --csv-dir synthetic_data/sf10
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+PRODUCTS_CSV = Path('problem_statement/products.csv')
+OUTPUT_DIR = Path('synthetic_data')
+
+# Size of the original dataset (scale factor 1)
+SF1_ORDERS = 99_441
+SF1_PRODUCTS = 32_951
+SF1_SELLERS = 3_095
+
+ORDERS_PER_CHUNK = 250_000
+
+START_DATE = pd.Timestamp('2016-09-04')
+END_DATE = pd.Timestamp('2018-10-17')
+
+ORDER_STATUSES = {
+    'delivered': 0.965,
+    'shipped': 0.011,
+    'canceled': 0.0065,
+    'unavailable': 0.006,
+    'invoiced': 0.0032,
+    'processing': 0.003,
+    'approved': 0.0003
+}
+
+CUSTOMER_STATES = {
+    'SP': 0.420, 'RJ': 0.129, 'MG': 0.117, 'RS': 0.055, 'PR': 0.051, 'SC': 0.037,
+    'BA': 0.034, 'DF': 0.022, 'ES': 0.020, 'GO': 0.020, 'PE': 0.017, 'CE': 0.013,
+    'PA': 0.010, 'MT': 0.009, 'MA': 0.008, 'MS': 0.007, 'PB': 0.005, 'PI': 0.005,
+    'RN': 0.005, 'AL': 0.004, 'SE': 0.004, 'TO': 0.003, 'RO': 0.003, 'AM': 0.002,
+    'AC': 0.001, 'AP': 0.001, 'RR': 0.001
+}
+
+CITIES_PER_STATE = 120
+
+# Orders per customer, units per order line and distinct products per order
+ORDERS_PER_CUSTOMER = {1: 0.970, 2: 0.024, 3: 0.004, 4: 0.0015, 6: 0.0005}
+UNITS_PER_LINE = {1: 0.930, 2: 0.045, 3: 0.012, 4: 0.006, 5: 0.004, 6: 0.003}
+PRODUCTS_PER_ORDER = {1: 0.900, 2: 0.070, 3: 0.020, 4: 0.010}
+
+MOVER_SHARE = 0.30          # share of repeat customers who change address
+RETURNER_SHARE = 0.20       # share of movers with 3+ orders who move back (A -> B -> A)
+SECOND_SELLER_SHARE = 0.10  # share of order lines sold by a product's secondary seller
+
+HOUR_WEIGHTS = np.array([
+    2, 1, 0.5, 0.3, 0.3, 0.5, 1, 2, 4, 5, 6, 6, 6, 6, 6, 6, 6, 5, 5, 5, 6, 6, 5, 3
+])
+
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def random_hex_ids(rng, n):
+    """
+    n random 32-character hex identifiers, built without a Python-level loop.
+    """
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    chars = np.empty((n, 32), dtype=np.uint8)
+    chars[:, 0::2] = HEX_DIGITS[raw >> 4]
+    chars[:, 1::2] = HEX_DIGITS[raw & 0x0F]
+    return chars.view('S32').ravel().astype(str)
+
+
+def sample(rng, distribution, size):
+    values = np.array(list(distribution.keys()))
+    weights = np.array(list(distribution.values()), dtype=float)
+    return rng.choice(values, size=size, p=weights / weights.sum())
+
+
+def zipf_weights(rng, n, exponent):
+    """
+    Shuffled Zipf weights, so popularity is skewed but unrelated to generation order.
+    """
+    weights = 1.0 / np.power(np.arange(1, n + 1) + 10, exponent)
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def format_timestamps(minutes):
+    """
+    Format minutes since START_DATE as source-style 'M/D/YYYY H:MM' text (NaN stays empty).
+    Only distinct values are formatted, then mapped back to every row.
+    """
+    result = np.full(len(minutes), '', dtype=object)
+    valid = ~np.isnan(minutes)
+    unique, inverse = np.unique(minutes[valid].astype(np.int64), return_inverse=True)
+
+    timestamps = START_DATE + pd.to_timedelta(unique, unit='min')
+    formatted = (
+        timestamps.month.astype(str) + '/' + timestamps.day.astype(str) + '/'
+        + timestamps.year.astype(str) + ' ' + timestamps.hour.astype(str) + ':'
+        + pd.Index(timestamps.minute).map('{:02d}'.format)
+    )
+    result[valid] = np.asarray(formatted, dtype=object)[inverse]
+    return result
+
+
+# ============================================================================
+# DIMENSIONS
+# ============================================================================
+
+def get_category_distribution():
+    if PRODUCTS_CSV.exists():
+        categories = pd.read_csv(PRODUCTS_CSV, usecols=['product_category_name'])['product_category_name']
+        return categories.fillna('').value_counts(normalize=True).to_dict()
+    return {'cama_mesa_banho': 0.1, 'esporte_lazer': 0.1, 'moveis_decoracao': 0.1,
+            'beleza_saude': 0.1, 'utilidades_domesticas': 0.1, 'automotivo': 0.1,
+            'informatica_acessorios': 0.1, 'brinquedos': 0.1, 'relogios_presentes': 0.1, '': 0.1}
+
+
+def generate_products(rng, n_products):
+    ids = random_hex_ids(rng, n_products)
+    categories = sample(rng, get_category_distribution(), n_products).astype(object)
+    has_details = categories != ''
+    categories[~has_details] = np.nan
+
+    def measure(low, high):
+        return np.round(rng.uniform(low, high, n_products))
+
+    products = pd.DataFrame({
+        'product_id': ids,
+        'product_category_name': categories,
+        'product_name_lenght': np.where(has_details, measure(5, 76), np.nan),
+        'product_description_lenght': np.where(has_details, measure(4, 3992), np.nan),
+        'product_photos_qty': np.where(has_details, rng.integers(1, 8, n_products), np.nan),
+        'product_weight_g': np.round(rng.lognormal(6.5, 1.2, n_products)),
+        'product_length_cm': measure(7, 105),
+        'product_height_cm': measure(2, 105),
+        'product_width_cm': measure(6, 118)
+    })
+    # Whole numbers, written without a decimal part like in the source export
+    measures = products.columns[2:]
+    products[measures] = products[measures].astype('Int64')
+
+    # Per-product price level, order lines vary around it
+    base_prices = np.round(rng.lognormal(4.3, 0.9, n_products), 2) + 0.85
+    return products, base_prices
+
+
+def generate_addresses(rng, n):
+    states = sample(rng, CUSTOMER_STATES, n)
+    city_numbers = np.minimum(rng.zipf(1.6, n) - 1, CITIES_PER_STATE - 1)
+    cities = np.char.add(np.char.add(np.char.lower(states.astype(str)), ' city '), city_numbers.astype(str))
+    return states, cities
+
+
+# ============================================================================
+# ORDERS
+# ============================================================================
+
+def sample_purchase_minutes(rng, n):
+    """
+    Purchase times with linearly growing order volume and a purchase-hour profile.
+    """
+    total_days = (END_DATE - START_DATE).days
+    # Inverse CDF of a density proportional to (0.2 + t) on [0, 1]
+    u = rng.random(n)
+    t = -0.2 + np.sqrt(0.04 + 1.4 * u)
+    days = np.floor(t * total_days)
+    hours = rng.choice(24, size=n, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    minutes = rng.integers(0, 60, n)
+    return days * 1440 + hours * 60 + minutes
+
+
+def generate_chunk(rng, n_orders, product_ids, product_weights, base_prices,
+                   primary_sellers, secondary_sellers, seller_ids):
+    # ---- customers: orders per customer, home address and address changes ----
+    counts = sample(rng, ORDERS_PER_CUSTOMER, int(n_orders / 1.03) + 10)
+    counts = counts[:np.searchsorted(np.cumsum(counts), n_orders) + 1]
+    customer_of_order = np.repeat(np.arange(len(counts)), counts)[:n_orders]
+    counts = np.bincount(customer_of_order)
+    n_customers = len(counts)
+
+    customer_unique_ids = random_hex_ids(rng, n_customers)
+    home_states, home_cities = generate_addresses(rng, n_customers)
+    new_states, new_cities = generate_addresses(rng, n_customers)
+
+    purchase = sample_purchase_minutes(rng, n_orders)
+
+    # Rank of each order within its customer's history
+    order_sequence = np.lexsort((purchase, customer_of_order))
+    first_position = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.empty(n_orders, dtype=np.int64)
+    rank[order_sequence] = np.arange(n_orders) - first_position[customer_of_order[order_sequence]]
+
+    is_mover = (counts >= 2) & (rng.random(n_customers) < MOVER_SHARE)
+    move_at = np.maximum(1, np.floor(rng.random(n_customers) * counts)).astype(np.int64)
+    is_returner = is_mover & (counts >= 3) & (rng.random(n_customers) < RETURNER_SHARE)
+
+    moved = is_mover[customer_of_order] & (rank >= move_at[customer_of_order])
+    moved &= ~(is_returner[customer_of_order] & (rank == counts[customer_of_order] - 1))
+
+    customers = pd.DataFrame({
+        'customer_id': random_hex_ids(rng, n_orders),
+        'customer_unique_id': customer_unique_ids[customer_of_order],
+        'customer_zip_code_prefix': np.char.zfill(rng.integers(1000, 99999, n_orders).astype(str), 5),
+        'customer_city': np.where(moved, new_cities[customer_of_order], home_cities[customer_of_order]),
+        'customer_state': np.where(moved, new_states[customer_of_order], home_states[customer_of_order])
+    })
+
+    # ---- orders: status and lifecycle timestamps ----
+    status = sample(rng, ORDER_STATUSES, n_orders)
+    approved = purchase + np.round(rng.exponential(600, n_orders))
+    carrier = approved + np.round(rng.exponential(3 * 1440, n_orders))
+    delivered = carrier + np.round(rng.gamma(2.0, 4 * 1440, n_orders))
+    estimated = np.floor(purchase / 1440 + rng.integers(15, 35, n_orders)) * 1440
+
+    approved = np.where(np.isin(status, ['canceled', 'unavailable']) & (rng.random(n_orders) < 0.3), np.nan, approved)
+    carrier = np.where(np.isin(status, ['delivered', 'shipped']), carrier, np.nan)
+    delivered = np.where(status == 'delivered', delivered, np.nan)
+
+    orders = pd.DataFrame({
+        'order_id': random_hex_ids(rng, n_orders),
+        'customer_id': customers['customer_id'].to_numpy(),
+        'order_status': status,
+        'order_purchase_timestamp': format_timestamps(purchase),
+        'order_approved_at': format_timestamps(approved),
+        'order_delivered_carrier_date': format_timestamps(carrier),
+        'order_delivered_customer_date': format_timestamps(delivered),
+        'order_estimated_delivery_date': format_timestamps(estimated)
+    })
+
+    # ---- order lines: distinct products per order, seller, units ----
+    products_per_order = sample(rng, PRODUCTS_PER_ORDER, n_orders)
+    line_order = np.repeat(np.arange(n_orders), products_per_order)
+    line_product = rng.choice(len(product_ids), size=len(line_order), p=product_weights)
+
+    lines = pd.DataFrame({'order': line_order, 'product': line_product}).drop_duplicates()
+    line_order = lines['order'].to_numpy()
+    line_product = lines['product'].to_numpy()
+    n_lines = len(line_order)
+
+    use_secondary = rng.random(n_lines) < SECOND_SELLER_SHARE
+    line_seller = np.where(use_secondary, secondary_sellers[line_product], primary_sellers[line_product])
+    line_price = np.round(base_prices[line_product] * rng.uniform(0.9, 1.1, n_lines), 2)
+    line_freight = np.round(rng.lognormal(2.8, 0.6, n_lines), 2)
+    units = sample(rng, UNITS_PER_LINE, n_lines)
+
+    # One row per unit, order_item_id is the sequence number within the order
+    unit_line = np.repeat(np.arange(n_lines), units)
+    unit_order = line_order[unit_line]
+    order_start = np.searchsorted(unit_order, np.arange(n_orders))
+    order_item_id = np.arange(len(unit_line)) - order_start[unit_order] + 1
+
+    order_items = pd.DataFrame({
+        'order_id': orders['order_id'].to_numpy()[unit_order],
+        'order_item_id': order_item_id,
+        'product_id': product_ids[line_product[unit_line]],
+        'seller_id': seller_ids[line_seller[unit_line]],
+        'shipping_limit_date': format_timestamps((purchase + 6 * 1440)[unit_order]),
+        'price': line_price[unit_line],
+        'freight_value': line_freight[unit_line]
+    })
+
+    return customers, orders, order_items
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def scale_factor_name(scale_factor):
+    return f"sf{scale_factor:g}"
+
+
+def generate(scale_factor, output_dir, seed=42):
+    """
+    Write the four CSV files for a scale factor into output_dir.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    n_orders = max(1, round(SF1_ORDERS * scale_factor))
+    n_products = max(10, round(SF1_PRODUCTS * scale_factor))
+    n_sellers = max(5, round(SF1_SELLERS * scale_factor))
+
+    products, base_prices = generate_products(rng, n_products)
+    products.to_csv(output_dir / 'products.csv', index=False)
+
+    product_ids = products['product_id'].to_numpy()
+    product_weights = zipf_weights(rng, n_products, 1.1)
+    seller_ids = random_hex_ids(rng, n_sellers)
+    seller_weights = zipf_weights(rng, n_sellers, 1.3)
+    primary_sellers = rng.choice(n_sellers, size=n_products, p=seller_weights)
+    secondary_sellers = rng.choice(n_sellers, size=n_products, p=seller_weights)
+
+    totals = {'customers': 0, 'orders': 0, 'order_items': 0, 'products': n_products}
+    remaining = n_orders
+    chunk_index = 0
+
+    while remaining > 0:
+        chunk_orders = min(ORDERS_PER_CHUNK, remaining)
+        chunk_rng = np.random.default_rng([seed, chunk_index])
+        tables = generate_chunk(chunk_rng, chunk_orders, product_ids, product_weights, base_prices,
+                                primary_sellers, secondary_sellers, seller_ids)
+
+        for table_name, df in zip(['customers', 'orders', 'order_items'], tables):
+            df.to_csv(output_dir / f'{table_name}.csv', index=False,
+                      mode='w' if chunk_index == 0 else 'a', header=chunk_index == 0)
+            totals[table_name] += len(df)
+
+        remaining -= chunk_orders
+        chunk_index += 1
+
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic Salla source CSV files.')
+    parser.add_argument('--scale-factor', type=float, nargs='+', default=[1.0],
+                        help='one or more scale factors, e.g. 1 10 100 (SF1 ~ original dataset size)')
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR,
+                        help=f'parent directory; files go to <output-dir>/sf<N>/ (default: {OUTPUT_DIR})')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    for scale_factor in args.scale_factor:
+        output_dir = args.output_dir / scale_factor_name(scale_factor)
+        start = time.perf_counter()
+        totals = generate(scale_factor, output_dir, args.seed)
+
+        print(f"Generated {scale_factor_name(scale_factor)} in {time.perf_counter() - start:.1f}s -> {output_dir}")
+        for table_name, rows in totals.items():
+            print(f"  {table_name}: {rows:,} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,45 @@ This script performs the Extract and Load phases of ELT:
 - Load raw data from backend DB (mocked by CSV files) into the data warehouse (mocked by SQLite)
 - Loads into raw_salla_data.db without transformations
 - Creates raw tables: customers, orders, order_items, products
+
+Load modes:
+- replace: read each CSV whole with pandas and replace the table (default)
+- stream:  read each CSV in fixed-size chunks with explicit dtypes and bulk-insert
+           through executemany in one transaction per table (bounded memory)
+- incremental: skip files whose fingerprint is unchanged since the last run and upsert
+           only new and changed rows by natural key (manifest kept next to the database)
+- parallel: parse every table in its own worker process into a temporary SQLite file,
+           then ATTACH and merge the parts into the raw database from a single writer
+
+With --normalize-timestamps, the M/D/YYYY H:MM source timestamps are parsed once at load
+time (vectorized) and stored as ISO-8601 text, so the staging models can skip the per-row
+parse_timestamp macro. The format of every loaded table is recorded in _raw_load_metadata.
 """
 
+import argparse
+import hashlib
+import json
+import os
 import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
 import pandas as pd
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # optional, pandas is used to parse timestamps instead
+    pa = None
+
 CSV_DIR = Path('problem_statement')
 DB_PATH = Path('data_warehouse/raw_salla_data.db')
 
@@ -19,23 +52,643 @@ CSV_FILES = {
     'products': 'products.csv'
 }
 
-def main():
-    DB_PATH.parent.mkdir(exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    
+# Explicit pandas dtypes for the streaming loader. Columns not listed here are read as text,
+# so that type inference can never disagree between two chunks of the same file.
+CSV_DTYPES = {
+    'customers': {
+        'customer_id': 'str',
+        'customer_unique_id': 'str',
+        'customer_zip_code_prefix': 'str',
+        'customer_city': 'str',
+        'customer_state': 'str'
+    },
+    'orders': {
+        'order_id': 'str',
+        'customer_id': 'str',
+        'order_status': 'str',
+        'order_purchase_timestamp': 'str',
+        'order_approved_at': 'str',
+        'order_delivered_carrier_date': 'str',
+        'order_delivered_customer_date': 'str',
+        'order_estimated_delivery_date': 'str'
+    },
+    'order_items': {
+        'order_id': 'str',
+        'order_item_id': 'Int64',
+        'product_id': 'str',
+        'seller_id': 'str',
+        'shipping_limit_date': 'str',
+        'price': 'float64',
+        'freight_value': 'float64'
+    },
+    'products': {
+        'product_id': 'str',
+        'product_category_name': 'str',
+        'product_name_lenght': 'float64',
+        'product_description_lenght': 'float64',
+        'product_photos_qty': 'float64',
+        'product_weight_g': 'float64',
+        'product_length_cm': 'float64',
+        'product_height_cm': 'float64',
+        'product_width_cm': 'float64'
+    }
+}
+
+SQLITE_TYPES = {
+    'str': 'TEXT',
+    'Int64': 'INTEGER',
+    'float64': 'REAL'
+}
+
+# Indexes on the natural keys, created by the streaming loader after the data is in
+RAW_INDEXES = {
+    'customers': [('customer_id',)],
+    'orders': [('order_id',), ('customer_id',)],
+    'order_items': [('order_id', 'order_item_id')],
+    'products': [('product_id',)]
+}
+
+# Natural keys used by the incremental loader to upsert rows
+NATURAL_KEYS = {
+    'customers': ('customer_id',),
+    'orders': ('order_id',),
+    'order_items': ('order_id', 'order_item_id'),
+    'products': ('product_id',)
+}
+
+# Timestamp column tracked as a per-table high-water mark in the incremental manifest
+HIGH_WATER_MARKS = {
+    'orders': 'order_purchase_timestamp',
+    'order_items': 'shipping_limit_date'
+}
+
+# Timestamp columns stored as M/D/YYYY H:MM text in the source files
+TIMESTAMP_COLUMNS = {
+    'orders': [
+        'order_purchase_timestamp',
+        'order_approved_at',
+        'order_delivered_carrier_date',
+        'order_delivered_customer_date',
+        'order_estimated_delivery_date'
+    ],
+    'order_items': ['shipping_limit_date']
+}
+
+SOURCE_TIMESTAMP_FORMAT = '%m/%d/%Y %H:%M'
+NORMALIZED_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Load metadata read by dbt to detect tables with already-normalized timestamps
+METADATA_TABLE = '_raw_load_metadata'
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+# ============================================================================
+# MEMORY REPORTING
+# ============================================================================
+
+def reset_peak_rss():
+    """
+    Reset the process peak RSS so the next reading covers one table only.
+    Only supported on Linux; elsewhere the reading is the peak of the whole run.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (None if it cannot be measured).
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+
+def report(table_name, rows, seconds):
+    rss = peak_rss_mb()
+    rss_text = f"{rss:,.1f} MB" if rss is not None else "n/a"
+    rate = rows / seconds if seconds > 0 else float('inf')
+    print(f"Loaded {table_name}: {rows:,} rows in {seconds:.2f}s ({rate:,.0f} rows/s, peak RSS {rss_text})")
+
+
+# ============================================================================
+# TIMESTAMP NORMALIZATION
+# ============================================================================
+
+def normalize_timestamp_values(values):
+    """
+    Convert M/D/YYYY H:MM strings to ISO-8601 text ('YYYY-MM-DD HH:MM:SS') in one vectorized
+    pass. Missing or unparseable values become NaN, like in the source file.
+    """
+    if pa is not None:
+        parsed = pc.strptime(pa.array(values, type=pa.string(), from_pandas=True),
+                             format=SOURCE_TIMESTAMP_FORMAT, unit='s', error_is_null=True)
+        normalized = pc.strftime(parsed, format=NORMALIZED_TIMESTAMP_FORMAT)
+        return pd.Series(normalized.to_numpy(zero_copy_only=False), index=values.index, dtype='str')
+
+    parsed = pd.to_datetime(values, format=SOURCE_TIMESTAMP_FORMAT, errors='coerce')
+    return parsed.dt.strftime(NORMALIZED_TIMESTAMP_FORMAT)
+
+
+def normalize_timestamps(df, table_name):
+    for column in TIMESTAMP_COLUMNS.get(table_name, []):
+        if column in df.columns:
+            df[column] = normalize_timestamp_values(df[column])
+    return df
+
+
+def get_timestamp_format(normalize):
+    return 'iso8601' if normalize else 'source'
+
+
+def record_load_metadata(conn, table_name, normalize):
+    with conn:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS "{METADATA_TABLE}" (
+                table_name TEXT PRIMARY KEY
+                , timestamp_format TEXT NOT NULL
+                , loaded_at TEXT NOT NULL
+            )
+        """)
+        conn.execute(f"""
+            INSERT INTO "{METADATA_TABLE}" (table_name, timestamp_format, loaded_at) VALUES (?, ?, ?)
+            ON CONFLICT (table_name) DO UPDATE SET
+                timestamp_format = excluded.timestamp_format
+                , loaded_at = excluded.loaded_at
+        """, (table_name, get_timestamp_format(normalize), datetime.now(timezone.utc).isoformat(timespec='seconds')))
+
+
+def read_timestamp_format(conn, table_name):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (METADATA_TABLE,)
+    ).fetchone()
+    if not exists:
+        return 'source'
+    row = conn.execute(
+        f'SELECT timestamp_format FROM "{METADATA_TABLE}" WHERE table_name = ?', (table_name,)
+    ).fetchone()
+    return row[0] if row else 'source'
+
+
+# ============================================================================
+# LOAD MODES
+# ============================================================================
+
+def load_replace(conn, table_name, csv_path, normalize=False):
+    """
+    Read the whole CSV into memory and replace the table through pandas.
+    """
+    df = pd.read_csv(csv_path)
+    if normalize:
+        df = normalize_timestamps(df, table_name)
+    df.to_sql(table_name, conn, if_exists='replace', index=False)
+    return len(df)
+
+
+def get_csv_dtypes(table_name, csv_path):
+    """
+    Explicit dtypes for every column in the CSV header (unknown columns are read as text).
+    """
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    known = CSV_DTYPES.get(table_name, {})
+    return {column: known.get(column, 'str') for column in columns}
+
+
+def read_csv_chunks(table_name, csv_path, dtypes, chunksize, normalize=False):
+    for chunk in pd.read_csv(csv_path, dtype=dtypes, chunksize=chunksize):
+        yield normalize_timestamps(chunk, table_name) if normalize else chunk
+
+
+def chunk_to_rows(chunk):
+    """
+    Convert a DataFrame chunk to a list of rows that sqlite3 can bind (NaN/NA -> None).
+    """
+    return chunk.to_numpy(dtype=object, na_value=None).tolist()
+
+
+def create_table(conn, table_name, dtypes):
+    column_defs = ', '.join(f'"{column}" {SQLITE_TYPES[dtype]}' for column, dtype in dtypes.items())
+    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    conn.execute(f'CREATE TABLE "{table_name}" ({column_defs})')
+
+
+def create_indexes(conn, table_name, columns):
+    for index_columns in RAW_INDEXES.get(table_name, []):
+        if not set(index_columns).issubset(columns):
+            continue
+        index_name = f"idx_{table_name}__{'_'.join(index_columns)}"
+        column_list = ', '.join(f'"{column}"' for column in index_columns)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({column_list})')
+
+
+def load_stream(conn, table_name, csv_path, chunksize=DEFAULT_CHUNKSIZE, on_chunk=None,
+                with_indexes=True, normalize=False):
+    """
+    Stream the CSV in chunks with explicit dtypes and bulk-insert each chunk through a
+    prepared executemany. The whole table is written in a single transaction and indexes
+    are created only after all rows are in, so peak memory is bounded by the chunk size.
+    on_chunk, if given, is called with every chunk after it is inserted.
+    """
+    dtypes = get_csv_dtypes(table_name, csv_path)
+    placeholders = ', '.join('?' for _ in dtypes)
+    insert_sql = f'INSERT INTO "{table_name}" VALUES ({placeholders})'
+
+    rows = 0
+    with conn:
+        create_table(conn, table_name, dtypes)
+        for chunk in read_csv_chunks(table_name, csv_path, dtypes, chunksize, normalize):
+            conn.executemany(insert_sql, chunk_to_rows(chunk))
+            rows += len(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+        if with_indexes:
+            create_indexes(conn, table_name, dtypes)
+
+    return rows
+
+
+# ============================================================================
+# INCREMENTAL MODE
+# ============================================================================
+
+def get_manifest_path(db_path):
+    return db_path.with_suffix('.manifest.json')
+
+
+def read_manifest(manifest_path):
+    if not manifest_path.exists():
+        return {'tables': {}}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest_path, manifest):
+    tmp_path = manifest_path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    tmp_path.replace(manifest_path)
+
+
+def file_fingerprint(csv_path, previous=None):
+    """
+    Size, mtime and SHA-256 of a source file. The hash is only recomputed when size or
+    mtime differ from the previous fingerprint, so unchanged files are never re-read.
+    """
+    stat = csv_path.stat()
+    fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    if previous and all(previous.get(k) == v for k, v in fingerprint.items()):
+        fingerprint['sha256'] = previous['sha256']
+        return fingerprint
+
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+
+def table_exists(conn, table_name):
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+    return conn.execute(query, (table_name,)).fetchone() is not None
+
+
+def get_table_columns(conn, table_name):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+
+def has_unique_key(conn, table_name, key_columns):
+    for index in conn.execute(f'PRAGMA index_list("{table_name}")').fetchall():
+        is_unique, index_name = index[2], index[1]
+        if not is_unique:
+            continue
+        index_columns = tuple(row[2] for row in conn.execute(f'PRAGMA index_info("{index_name}")'))
+        if index_columns == tuple(key_columns):
+            return True
+    return False
+
+
+def create_unique_key(conn, table_name, key_columns):
+    index_name = f"uq_{table_name}__{'_'.join(key_columns)}"
+    column_list = ', '.join(f'"{column}"' for column in key_columns)
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({column_list})')
+
+
+def get_high_water_mark(chunk, table_name, normalize=False):
+    """
+    Latest value of the table's high-water mark column in a chunk, as ISO-8601 text.
+    """
+    column = HIGH_WATER_MARKS.get(table_name)
+    if column is None or column not in chunk.columns:
+        return None
+    # ISO-8601 text sorts chronologically, source M/D/YYYY text has to be parsed first
+    values = chunk[column] if normalize else normalize_timestamp_values(chunk[column])
+    return values.max() if values.notna().any() else None
+
+
+def load_incremental(conn, table_name, csv_path, chunksize=DEFAULT_CHUNKSIZE, normalize=False):
+    """
+    Upsert the CSV into an existing table by natural key. New keys are inserted, existing
+    keys are only rewritten when at least one column differs, unchanged rows are untouched.
+    Falls back to a full streaming load when the table does not exist yet, or when its
+    columns or timestamp format no longer match the file.
+
+    Returns:
+        dict: rows read, inserted, updated and the high-water mark (ISO string or None)
+    """
+    dtypes = get_csv_dtypes(table_name, csv_path)
+    columns = list(dtypes)
+    key_columns = NATURAL_KEYS[table_name]
+    high_water_marks = []
+
+    def track_high_water_mark(chunk):
+        chunk_mark = get_high_water_mark(chunk, table_name, normalize)
+        if chunk_mark is not None:
+            high_water_marks.append(chunk_mark)
+
+    def result(rows, inserted, updated, full_reload):
+        high_water_mark = max(high_water_marks) if high_water_marks else None
+        return {
+            'rows': rows,
+            'inserted': inserted,
+            'updated': updated,
+            'high_water_mark': high_water_mark,
+            'full_reload': full_reload
+        }
+
+    same_format = (
+        table_name not in TIMESTAMP_COLUMNS
+        or read_timestamp_format(conn, table_name) == get_timestamp_format(normalize)
+    )
+
+    if get_table_columns(conn, table_name) != columns or not same_format:
+        rows = load_stream(conn, table_name, csv_path, chunksize, on_chunk=track_high_water_mark,
+                           normalize=normalize)
+        with conn:
+            create_unique_key(conn, table_name, key_columns)
+        return result(rows, rows, 0, full_reload=True)
+
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    non_key_columns = [column for column in columns if column not in key_columns]
+    update_set = ', '.join(f'"{column}" = excluded."{column}"' for column in non_key_columns)
+    changed = ' OR '.join(f'"{column}" IS NOT excluded."{column}"' for column in non_key_columns)
+    conflict = ', '.join(f'"{column}"' for column in key_columns)
+
+    upsert_sql = f"""
+        INSERT INTO "{table_name}" ({column_list}) VALUES ({placeholders})
+        ON CONFLICT ({conflict}) DO UPDATE SET {update_set}
+        WHERE {changed}
+    """
+
+    rows = 0
+
+    with conn:
+        if not has_unique_key(conn, table_name, key_columns):
+            create_unique_key(conn, table_name, key_columns)
+
+        rows_before = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+        changes_before = conn.total_changes
+
+        for chunk in read_csv_chunks(table_name, csv_path, dtypes, chunksize, normalize):
+            conn.executemany(upsert_sql, chunk_to_rows(chunk))
+            rows += len(chunk)
+            track_high_water_mark(chunk)
+
+        rows_after = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+        inserted = rows_after - rows_before
+        updated = conn.total_changes - changes_before - inserted
+
+    return result(rows, inserted, updated, full_reload=False)
+
+
+# ============================================================================
+# PARALLEL MODE
+# ============================================================================
+
+def load_table_part(table_name, csv_path, part_path, chunksize, normalize=False):
+    """
+    Worker process: parse one CSV into its own temporary SQLite file. Each worker owns its
+    file, so the workers never wait on each other for SQLite's write lock.
+    """
+    reset_peak_rss()
+    start = time.perf_counter()
+
+    conn = sqlite3.connect(part_path)
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA journal_mode = OFF')
+    rows = load_stream(conn, table_name, csv_path, chunksize, with_indexes=False, normalize=normalize)
+    conn.close()
+
+    return {
+        'rows': rows,
+        'seconds': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def merge_table_part(conn, table_name, part_path):
+    """
+    Copy a table from a worker's part file into the raw database. INSERT INTO ... SELECT *
+    between identical schemas lets SQLite copy pages directly instead of re-encoding rows.
+    """
+    conn.execute('ATTACH DATABASE ? AS part', (str(part_path),))
+    try:
+        with conn:
+            table_sql = conn.execute(
+                "SELECT sql FROM part.sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+            ).fetchone()[0]
+            conn.execute(f'DROP TABLE IF EXISTS main."{table_name}"')
+            conn.execute(table_sql)
+            conn.execute(f'INSERT INTO main."{table_name}" SELECT * FROM part."{table_name}"')
+            create_indexes(conn, table_name, get_table_columns(conn, table_name))
+    finally:
+        conn.execute('DETACH DATABASE part')
+
+
+def load_parallel(conn, tables, db_path, chunksize=DEFAULT_CHUNKSIZE, workers=None, normalize=False):
+    """
+    Parse all tables concurrently in a process pool, then merge each part into the raw
+    database as soon as its worker finishes. Wall-clock time is bounded by the largest
+    table instead of the sum of all tables.
+
+    Args:
+        tables (dict): table_name -> csv_path
+    """
+    workers = workers or min(len(tables), os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory(prefix='raw_load_', dir=db_path.parent) as tmp_dir:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(load_table_part, table_name, csv_path,
+                            Path(tmp_dir) / f'{table_name}.db', chunksize, normalize): table_name
+                for table_name, csv_path in tables.items()
+            }
+
+            for future in as_completed(futures):
+                table_name = futures[future]
+                part = future.result()
+
+                merge_start = time.perf_counter()
+                merge_table_part(conn, table_name, Path(tmp_dir) / f'{table_name}.db')
+                record_load_metadata(conn, table_name, normalize)
+                merge_seconds = time.perf_counter() - merge_start
+
+                rss = part['peak_rss_mb']
+                rss_text = f"{rss:,.1f} MB" if rss is not None else "n/a"
+                rate = part['rows'] / part['seconds'] if part['seconds'] > 0 else float('inf')
+                print(f"Loaded {table_name}: {part['rows']:,} rows in {part['seconds']:.2f}s "
+                      f"({rate:,.0f} rows/s, worker peak RSS {rss_text}), merged in {merge_seconds:.2f}s")
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load raw CSV files into the SQLite raw layer.')
+    parser.add_argument('--mode', choices=['replace', 'stream', 'incremental', 'parallel'], default='replace',
+                        help='replace: whole-file pandas load (default); stream: chunked bulk load; '
+                             'incremental: upsert changed rows of changed files only; '
+                             'parallel: chunked bulk load of all tables in a process pool')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f'rows per chunk in stream/incremental/parallel mode (default: {DEFAULT_CHUNKSIZE:,})')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes in parallel mode (default: one per table, up to the CPU count)')
+    parser.add_argument('--normalize-timestamps', action='store_true',
+                        help='store source timestamps as ISO-8601 text so staging can skip parse_timestamp')
+    parser.add_argument('--csv-dir', type=Path, default=CSV_DIR,
+                        help=f'directory containing the source CSV files (default: {CSV_DIR})')
+    parser.add_argument('--db-path', type=Path, default=DB_PATH,
+                        help=f'SQLite raw database to load into (default: {DB_PATH})')
+    return parser.parse_args(argv)
+
+
+def load_sequential(conn, tables, args, manifest):
+    """
+    Load tables one after another in replace, stream or incremental mode.
+
+    Returns:
+        list: names of the tables whose contents changed
+    """
+    changed_tables = []
+
+    for table_name, csv_path in tables.items():
+        reset_peak_rss()
+        start = time.perf_counter()
+
+        if args.mode == 'incremental':
+            previous = manifest['tables'].get(table_name, {})
+            fingerprint = file_fingerprint(csv_path, previous.get('fingerprint'))
+
+            # The manifest outlives a deleted or rebuilt database: only skip tables it still holds
+            unchanged = (
+                previous.get('fingerprint', {}).get('sha256') == fingerprint['sha256']
+                and previous.get('timestamp_format') == get_timestamp_format(args.normalize_timestamps)
+                and table_exists(conn, table_name)
+            )
+
+            if unchanged:
+                manifest['tables'][table_name]['fingerprint'] = fingerprint
+                print(f"Skipped {table_name}: {csv_path} unchanged since last load")
+                continue
+
+            result = load_incremental(conn, table_name, csv_path, args.chunksize, args.normalize_timestamps)
+            rows = result['rows']
+            report(table_name, rows, time.perf_counter() - start)
+            print(f"  {result['inserted']:,} inserted, {result['updated']:,} updated"
+                  + (" (full reload)" if result['full_reload'] else ""))
+
+            manifest['tables'][table_name] = {
+                'file': str(csv_path),
+                'fingerprint': fingerprint,
+                'timestamp_format': get_timestamp_format(args.normalize_timestamps),
+                'high_water_mark': result['high_water_mark'] or previous.get('high_water_mark'),
+                'rows_read': rows,
+                'rows_inserted': result['inserted'],
+                'rows_updated': result['updated'],
+                'loaded_at': datetime.now(timezone.utc).isoformat(timespec='seconds')
+            }
+            record_load_metadata(conn, table_name, args.normalize_timestamps)
+            if result['inserted'] or result['updated'] or result['full_reload']:
+                changed_tables.append(table_name)
+            continue
+
+        if args.mode == 'stream':
+            rows = load_stream(conn, table_name, csv_path, args.chunksize, normalize=args.normalize_timestamps)
+        else:
+            rows = load_replace(conn, table_name, csv_path, args.normalize_timestamps)
+
+        record_load_metadata(conn, table_name, args.normalize_timestamps)
+        report(table_name, rows, time.perf_counter() - start)
+        changed_tables.append(table_name)
+
+    return changed_tables
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    args.db_path.parent.mkdir(exist_ok=True)
+    conn = sqlite3.connect(args.db_path)
+
+    if args.mode in ('stream', 'parallel'):
+        # The raw layer is fully rebuildable from the CSV files, so trade durability for speed
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA journal_mode = MEMORY')
+
+    tables = {}
     for table_name, csv_file in CSV_FILES.items():
-        csv_path = CSV_DIR / csv_file
-        
+        csv_path = args.csv_dir / csv_file
+
         if not csv_path.exists():
             print(f"Warning: {csv_path} not found, skipping {table_name}")
             continue
-        
-        df = pd.read_csv(csv_path)
-        df.to_sql(table_name, conn, if_exists='replace', index=False)
-        print(f"Loaded {table_name}: {len(df):,} rows")
-    
+
+        tables[table_name] = csv_path
+
+    manifest_path = get_manifest_path(args.db_path)
+    manifest = read_manifest(manifest_path)
+
+    if args.mode == 'parallel':
+        start = time.perf_counter()
+        load_parallel(conn, tables, args.db_path, args.chunksize, args.workers, args.normalize_timestamps)
+        print(f"Parallel load wall-clock: {time.perf_counter() - start:.2f}s")
+        changed_tables = list(tables)
+    else:
+        changed_tables = load_sequential(conn, tables, args, manifest)
+
     conn.close()
-    print(f"\nCompleted loading into {DB_PATH}")
+
+    # Only incremental runs can trust the fingerprints; full reloads reset the manifest
+    if args.mode != 'incremental':
+        manifest = {'tables': {}}
+    manifest['changed_tables'] = changed_tables
+    write_manifest(manifest_path, manifest)
+
+    print(f"\nCompleted loading into {args.db_path}")
+    if changed_tables:
+        selectors = ' '.join(f'source:raw.{table_name}+' for table_name in changed_tables)
+        print(f"Changed tables: {', '.join(changed_tables)}")
+        print(f"Rebuild downstream with: dbt build --select {selectors}")
+    else:
+        print("No table changed, downstream rebuild not needed")
 
 if __name__ == '__main__':
     main()
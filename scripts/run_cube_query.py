@@ -0,0 +1,95 @@
+"""
+Run the Cube data model locally
+
+Loads semantic_layer_cube/model with the Python engine (semantic_layer_mocked/cube_model.py),
+which validates every cube, join, view and pre-aggregation, then optionally builds the
+pre-aggregations and runs a Cube query against the curated database. With --compare
+the query also runs without pre-aggregations and the two results must match, which is
+a quick check of a rollup definition change.
+
+Usage:
+    python scripts/run_cube_query.py --list
+    python scripts/run_cube_query.py --build
+    python scripts/run_cube_query.py --sql --compare --query '{
+        "measures": ["vw_sales_by_region_product.total_sales"],
+        "dimensions": ["vw_sales_by_region_product.customer_state"],
+        "timeDimensions": [{"dimension": "vw_sales_by_region_product.order_purchase_timestamp",
+                            "granularity": "month", "dateRange": ["2018-01-01", "2018-06-30"]}]
+    }'
+    python scripts/run_cube_query.py --query-file my_query.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from semantic_layer_mocked.cube_model import load_model
+
+
+def run(model, query, use_pre_aggregations):
+    start = time.perf_counter()
+    df = model.load(query, use_pre_aggregations=use_pre_aggregations)
+    return df, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model-dir', type=Path, default=None, help='Cube model directory (default: semantic_layer_cube/model)')
+    parser.add_argument('--list', action='store_true', help='list the members of every view and cube')
+    parser.add_argument('--build', action='store_true', help='(re)build the pre-aggregations')
+    parser.add_argument('--query', type=json.loads, default=None, metavar='JSON', help='Cube query to run')
+    parser.add_argument('--query-file', type=Path, default=None, help='file containing a Cube query')
+    parser.add_argument('--sql', action='store_true', help='print the compiled SQL')
+    parser.add_argument('--no-pre-aggregations', action='store_true', help='always read the curated tables')
+    parser.add_argument('--compare', action='store_true', help='check the result against a run without pre-aggregations')
+    args = parser.parse_args()
+
+    model = load_model(args.model_dir)
+    print(f"Model OK: {len(model.cubes)} cubes, {len(model.views)} views, {len(model.pre_aggregations())} pre-aggregations")
+
+    if args.list:
+        for owner, paths in model.members().items():
+            print(f"\n{owner}")
+            for path in paths:
+                print(f"  {path}")
+
+    if args.build:
+        start = time.perf_counter()
+        path = model.build_pre_aggregations(force=True)
+        if path is None:
+            print("The model defines no pre-aggregations")
+        else:
+            print(f"\nBuilt pre-aggregations in {time.perf_counter() - start:.2f}s: {path}")
+            for table, rows in model.pre_aggregation_sizes(path).items():
+                print(f"  {table:<45}{rows:>10,} rows")
+
+    query = json.loads(args.query_file.read_text()) if args.query_file else args.query
+    if query is None:
+        return
+
+    use_pre_aggregations = not args.no_pre_aggregations
+    df, seconds = run(model, query, use_pre_aggregations)
+    sql, params, path = model.compile(query, use_pre_aggregations)
+    source = f"pre-aggregations ({path.name})" if path else "curated tables"
+
+    if args.sql:
+        print(f"\n{sql}\n\nParameters: {params}")
+    print(f"\n{len(df):,} rows in {seconds:.3f}s from the {source}\n")
+    print(df.to_string(max_rows=50))
+
+    if args.compare:
+        reference, reference_seconds = run(model, query, use_pre_aggregations=False)
+        try:
+            pd.testing.assert_frame_equal(df, reference, check_dtype=False, rtol=1e-9)
+        except AssertionError as e:
+            raise SystemExit(f"\nMISMATCH against the curated tables:\n{e}")
+        print(f"\nIdentical to the curated tables ({reference_seconds:.3f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,16 @@ from .queries import (
     get_top_categories_by_location,
     get_top_stores_by_daily_sales,
     get_monthly_growth_by_store,
-    get_cohort_analysis
+    get_cohort_analysis,
+    get_dashboard_bundle,
+    iter_top_products_by_region,
+    iter_popular_categories,
+    iter_time_series_sales,
+    iter_avg_sale_by_category,
+    iter_top_categories_by_location,
+    iter_top_stores_by_daily_sales,
+    iter_monthly_growth_by_store,
+    iter_cohort_analysis
 )
 
 __all__ = [
@@ -24,6 +33,15 @@ __all__ = [
     'get_top_categories_by_location',
     'get_top_stores_by_daily_sales',
     'get_monthly_growth_by_store',
-    'get_cohort_analysis'
+    'get_cohort_analysis',
+    'get_dashboard_bundle',
+    'iter_top_products_by_region',
+    'iter_popular_categories',
+    'iter_time_series_sales',
+    'iter_avg_sale_by_category',
+    'iter_top_categories_by_location',
+    'iter_top_stores_by_daily_sales',
+    'iter_monthly_growth_by_store',
+    'iter_cohort_analysis'
 ]
 
@@ -0,0 +1,132 @@
+"""
+Async Semantic Layer API
+
+asyncio front end for the query functions in queries.py. Each call runs the SQL and pandas
+work of one query function on a bounded thread pool, so independent queries (e.g. the ones
+behind the dashboard's first paint) run concurrently and cost about as much as the slowest
+one instead of the sum of all of them.
+
+Example:
+    results = asyncio.run(gather_all(top_n_categories=12))
+    df = results['popular_categories']
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import queries
+from .backends import interrupt
+
+# Pool size (override with SALLA_QUERY_WORKERS) and default per-call timeout in seconds
+MAX_WORKERS = int(os.environ.get('SALLA_QUERY_WORKERS', min(8, os.cpu_count() or 1)))
+DEFAULT_TIMEOUT = 120
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='semantic_layer')
+
+
+async def run_query(func, *args, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """
+    Run a blocking query function on the thread pool and await its result.
+
+    On timeout, the SQL statement running for this call is interrupted so the worker
+    thread is released, and asyncio.TimeoutError is raised. pandas work that already
+    started after the SQL finished cannot be interrupted and runs to completion.
+
+    The interrupt only reaches this call: the worker records its thread in a per-call
+    token while the call runs and clears it, under the token's lock, before the thread
+    can pick up another task, so a call that finishes as the timeout fires cannot get
+    another caller's statement interrupted.
+    """
+    token = {'ident': None, 'lock': threading.Lock()}
+
+    def call():
+        with token['lock']:
+            token['ident'] = threading.get_ident()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with token['lock']:
+                token['ident'] = None
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, call)
+
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        # Holding the lock keeps the worker inside this call until the interrupt is sent
+        with token['lock']:
+            if token['ident'] is not None:
+                interrupt(token['ident'])
+        raise
+
+
+# ============================================================================
+# ASYNC QUERY FUNCTIONS (same arguments as the functions in queries.py)
+# ============================================================================
+
+async def aget_top_products_by_region(*args, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return await run_query(queries.get_top_products_by_region, *args, timeout=timeout, **kwargs)
+
+
+async def aget_popular_categories(*args, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return await run_query(queries.get_popular_categories, *args, timeout=timeout, **kwargs)
+
+
+async def aget_time_series_sales(*args, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return await run_query(queries.get_time_series_sales, *args, timeout=timeout, **kwargs)
+
+
+async def aget_avg_sale_by_category(*args, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return await run_query(queries.get_avg_sale_by_category, *args, timeout=timeout, **kwargs)
+
+
+async def aget_top_categories_by_location(*args, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return await run_query(queries.get_top_categories_by_location, *args, timeout=timeout, **kwargs)
+
+
+async def aget_top_stores_by_daily_sales(*args, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return await run_query(queries.get_top_stores_by_daily_sales, *args, timeout=timeout, **kwargs)
+
+
+async def aget_monthly_growth_by_store(*args, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return await run_query(queries.get_monthly_growth_by_store, *args, timeout=timeout, **kwargs)
+
+
+async def aget_cohort_analysis(*args, timeout=DEFAULT_TIMEOUT, **kwargs):
+    return await run_query(queries.get_cohort_analysis, *args, timeout=timeout, **kwargs)
+
+
+# ============================================================================
+# ALL DATASETS AT ONCE
+# ============================================================================
+
+async def gather_all(top_n_categories=10, top_n_location=10, top_n_stores=10, with_sketches=False, timeout=DEFAULT_TIMEOUT):
+    """
+    Run every query function concurrently.
+
+    Args:
+        top_n_categories (int): top_n for get_popular_categories
+        top_n_location (int): top_n for get_top_categories_by_location
+        top_n_stores (int): top_n for get_top_stores_by_daily_sales
+        with_sketches (bool): with_sketches for the product and category datasets
+        timeout (float): per-call timeout in seconds
+
+    Returns:
+        dict: dataset name (function name without 'get_') -> pd.DataFrame
+    """
+    calls = {
+        'top_products_by_region': aget_top_products_by_region(with_sketches=with_sketches, timeout=timeout),
+        'popular_categories': aget_popular_categories(top_n_categories, with_sketches=with_sketches, timeout=timeout),
+        'time_series_sales': aget_time_series_sales(timeout=timeout),
+        'avg_sale_by_category': aget_avg_sale_by_category(timeout=timeout),
+        'top_categories_by_location': aget_top_categories_by_location(top_n_location, timeout=timeout),
+        'top_stores_by_daily_sales': aget_top_stores_by_daily_sales(top_n_stores, timeout=timeout),
+        'monthly_growth_by_store': aget_monthly_growth_by_store(timeout=timeout),
+        'cohort_analysis': aget_cohort_analysis(timeout=timeout)
+    }
+
+    results = await asyncio.gather(*calls.values())
+    return dict(zip(calls.keys(), results))
@@ -0,0 +1,500 @@
+"""
+Execution backends for the semantic layer
+
+Every statement built by queries.py and metrics.py runs through read_sql(), on the
+backend selected with the SALLA_BACKEND environment variable:
+
+    sqlite  (default) pooled read-only connections to main_curated.db (connection.py)
+    duckdb  DuckDB's vectorized, multi-threaded engine over the same tables
+
+The DuckDB backend keeps one in-memory DuckDB database per curated database build, with
+the curated tables exposed as views over one of two sources (SALLA_DUCKDB_SOURCE):
+
+    parquet (default) a Parquet export of main_curated.db under .cache/duckdb, written on
+            first use and rewritten when the curated database changes
+    sqlite  main_curated.db itself, attached read-only through DuckDB's sqlite extension
+            (which DuckDB downloads on first use unless it is already installed)
+
+The SQL is written for SQLite; to_duckdb_sql() rewrites the few SQLite-only constructs
+it uses, and every DuckDB connection is set to SQLite's integer division and NULL
+ordering, so both backends return the same results. DuckDB results are fetched as Arrow
+tables and converted to pandas column by column, without going through Python rows;
+read_arrow() returns the Arrow table itself, on either backend, and iter_batches()
+streams a result as Arrow record batches of a fixed number of rows.
+Statements calling the HyperLogLog functions (registered on SQLite connections only,
+see sketches.py) always run on SQLite.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import uuid
+import weakref
+from pathlib import Path
+
+import pandas as pd
+
+from .connection import connection, get_db_path, get_pool
+
+BACKENDS = ('sqlite', 'duckdb')
+DUCKDB_SOURCES = ('parquet', 'sqlite')
+DEFAULT_DUCKDB_DIR = Path(__file__).parent.parent / '.cache' / 'duckdb'
+
+# Applied to every DuckDB connection: SQLite semantics for `/` on integers and for
+# the position of NULLs in ORDER BY
+DUCKDB_SETTINGS = {
+    'integer_division': 'true',
+    'default_null_order': "'nulls_first_on_asc_last_on_desc'"
+}
+
+# Rows per Parquet row group, and per fetch while exporting, reading into Arrow or streaming
+EXPORT_BATCH_ROWS = 100_000
+
+# Statements using these run on SQLite whatever the backend
+SQLITE_ONLY = re.compile(r'\bHLL_(SKETCH|MERGE|ESTIMATE)\s*\(', re.IGNORECASE)
+
+
+def get_backend():
+    """
+    Name of the selected backend (SALLA_BACKEND environment variable, default 'sqlite').
+    """
+    backend = os.environ.get('SALLA_BACKEND', 'sqlite').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SALLA_BACKEND {backend!r}, expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def get_duckdb_source():
+    source = os.environ.get('SALLA_DUCKDB_SOURCE', 'parquet').lower()
+    if source not in DUCKDB_SOURCES:
+        raise ValueError(f"Unknown SALLA_DUCKDB_SOURCE {source!r}, expected one of {', '.join(DUCKDB_SOURCES)}")
+    return source
+
+
+def get_duckdb_dir():
+    return Path(os.environ.get('SALLA_DUCKDB_DIR', DEFAULT_DUCKDB_DIR))
+
+
+# ============================================================================
+# SQL DIALECT
+# ============================================================================
+
+def _call_arguments(sql, start):
+    """
+    Split the argument list of a function call whose opening parenthesis is at sql[start].
+
+    Returns:
+        tuple: (list of argument strings, index just past the closing parenthesis)
+    """
+    depth, quote, args, begin = 0, None, [], start + 1
+    for i in range(start, len(sql)):
+        char = sql[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                args.append(sql[begin:i].strip())
+                return args, i + 1
+        elif char == ',' and depth == 1:
+            args.append(sql[begin:i].strip())
+            begin = i + 1
+    raise ValueError(f"Unbalanced parentheses in SQL: {sql[start:start + 80]!r}")
+
+
+def _rewrite_calls(sql, name, rewrite):
+    """
+    Replace every call of a SQL function (matched case-insensitively) with
+    rewrite(arguments), innermost calls first.
+    """
+    pattern = re.compile(rf'\b{name}\s*\(', re.IGNORECASE)
+    out, position = [], 0
+    while True:
+        match = pattern.search(sql, position)
+        if match is None:
+            break
+        args, end = _call_arguments(sql, match.end() - 1)
+        args = [_rewrite_calls(arg, name, rewrite) for arg in args]
+        out.append(sql[position:match.start()] + rewrite(args))
+        position = end
+    return ''.join(out) + sql[position:]
+
+
+def _date(args):
+    # DATE(timestamp text) -> 'YYYY-MM-DD' text, as in SQLite (modifiers are not supported)
+    if len(args) != 1:
+        raise ValueError("DATE() with modifiers has no DuckDB translation")
+    return f"SUBSTR(CAST({args[0]} AS VARCHAR), 1, 10)"
+
+
+def _strftime(args):
+    fmt, value = args[0], args[1]
+    return f"STRFTIME(CAST({value} AS TIMESTAMP), {fmt})"
+
+
+def _julianday(args):
+    # DuckDB's JULIAN() counts days from noon; SQLite's JULIANDAY() from midnight
+    return f"(JULIAN(CAST({args[0]} AS DATE)) - 0.5)"
+
+
+_IS_COLUMN = re.compile(r'\b(\w+\.\w+)\s+IS\s+(?!NOT\b|NULL\b|DISTINCT\b)(\w+\.\w+)', re.IGNORECASE)
+
+
+def to_duckdb_sql(sql):
+    """
+    Rewrite the SQLite-only constructs the semantic layer uses into DuckDB SQL:
+
+        DATE(x)              SUBSTR(CAST(x AS VARCHAR), 1, 10)
+        STRFTIME(format, x)  STRFTIME(CAST(x AS TIMESTAMP), format)
+        JULIANDAY(x)         JULIAN(CAST(x AS DATE)) - 0.5 (day precision)
+        a.x IS b.y           a.x IS NOT DISTINCT FROM b.y
+
+    Everything else (SUBSTR, CAST, ||, window functions, recursive CTEs, ? parameters)
+    is shared by both dialects.
+    """
+    sql = _rewrite_calls(sql, 'DATE', _date)
+    sql = _rewrite_calls(sql, 'STRFTIME', _strftime)
+    sql = _rewrite_calls(sql, 'JULIANDAY', _julianday)
+    return _IS_COLUMN.sub(r'\1 IS NOT DISTINCT FROM \2', sql)
+
+
+# ============================================================================
+# PARQUET EXPORT
+# ============================================================================
+
+def _arrow_type(storage_classes):
+    """
+    Arrow type of a SQLite column from the storage classes of its values (most curated
+    columns have no declared type).
+    """
+    import pyarrow as pa
+
+    storage_classes = set(storage_classes) - {'null'}
+    if storage_classes == {'integer'}:
+        return pa.int64()
+    if storage_classes and storage_classes <= {'integer', 'real'}:
+        return pa.float64()
+    if storage_classes == {'blob'}:
+        return pa.binary()
+    return pa.string()
+
+
+def export_path():
+    """
+    Directory holding the Parquet export of the current curated database build.
+    """
+    db_path = get_db_path()
+    payload = json.dumps([str(db_path.resolve()), *get_pool().fingerprint()])
+    return get_duckdb_dir() / hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+_export_lock = threading.Lock()
+
+
+def export_parquet(force=False):
+    """
+    Export every table of the curated database to one Parquet file per table (see
+    export_path). Exports of older builds are deleted.
+
+    Returns:
+        Path: the export directory
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = export_path()
+    with _export_lock:
+        if path.exists() and not force:
+            return path
+
+        tmp_path = path.parent / f".{path.name}.{uuid.uuid4().hex}.tmp"
+        tmp_path.mkdir(parents=True)
+        conn = sqlite3.connect(f"{get_db_path().resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            tables = [name for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            )]
+            for table in tables:
+                columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+                fields, select = [], []
+                for column in columns:
+                    storage_classes = [value for (value,) in conn.execute(f'SELECT DISTINCT typeof("{column}") FROM "{table}"')]
+                    arrow_type = _arrow_type(storage_classes)
+                    fields.append((column, arrow_type))
+                    # Coerce columns mixing storage classes to the exported type
+                    cast = {pa.float64(): 'REAL', pa.string(): 'TEXT'}.get(arrow_type)
+                    select.append(f'CAST("{column}" AS {cast}) AS "{column}"' if cast and len(set(storage_classes) - {'null'}) > 1 else f'"{column}"')
+                schema = pa.schema(fields)
+
+                cursor = conn.execute(f'SELECT {", ".join(select)} FROM "{table}"')
+                with pq.ParquetWriter(tmp_path / f"{table}.parquet", schema) as writer:
+                    while rows := cursor.fetchmany(EXPORT_BATCH_ROWS):
+                        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+                        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        finally:
+            conn.close()
+
+        if path.exists():
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+        for old_path in path.parent.iterdir():
+            if old_path != path and old_path.is_dir():
+                shutil.rmtree(old_path, ignore_errors=True)
+    return path
+
+
+# ============================================================================
+# DUCKDB BACKEND
+# ============================================================================
+
+def _sqlite_schema(schema):
+    """
+    Arrow schema of a DuckDB result with SQLite's types: SUM() of integers is a HUGEINT
+    in DuckDB (decimal(38, 0) in Arrow); SQLite returns a 64-bit integer.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for field in schema:
+        if pa.types.is_decimal(field.type):
+            field = field.with_type(pa.int64() if field.type.scale == 0 else pa.float64())
+        fields.append(field)
+    return pa.schema(fields)
+
+
+class DuckDBBackend:
+    """
+    In-memory DuckDB database exposing the curated tables as views over a Parquet export
+    or over the attached SQLite file. Each thread gets its own cursor (a connection to the
+    same database, with DUCKDB_SETTINGS applied); DuckDB parallelizes each statement
+    across its own worker threads.
+    """
+
+    def __init__(self, source=None):
+        import duckdb
+
+        self.source = source or get_duckdb_source()
+        self.db_path = get_db_path()
+        self.fingerprint = get_pool().fingerprint()
+        self.database = duckdb.connect(':memory:')
+        self._local = threading.local()
+        self._cursors = {}  # thread ident -> (weak reference to the thread, cursor)
+        self._lock = threading.Lock()
+
+        if self.source == 'parquet':
+            directory = export_parquet()
+            for file in sorted(directory.glob('*.parquet')):
+                self.database.execute(f"CREATE VIEW \"{file.stem}\" AS SELECT * FROM read_parquet('{file.as_posix()}')")
+        else:
+            self.database.execute(f"ATTACH '{self.db_path.resolve().as_posix()}' AS curated (TYPE SQLITE, READ_ONLY)")
+            tables = self.database.execute(
+                "SELECT table_name FROM information_schema.tables WHERE table_catalog = 'curated'"
+            ).fetchall()
+            for (table,) in tables:
+                self.database.execute(f"CREATE VIEW \"{table}\" AS SELECT * FROM curated.\"{table}\"")
+
+    def _cursor(self):
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self.database.cursor()
+            for name, value in DUCKDB_SETTINGS.items():
+                cursor.execute(f"SET {name} = {value}")
+            thread = threading.current_thread()
+            with self._lock:
+                for ident, (thread_ref, old_cursor) in list(self._cursors.items()):
+                    old_thread = thread_ref()
+                    if old_thread is None or not old_thread.is_alive():
+                        old_cursor.close()
+                        del self._cursors[ident]
+                self._cursors[thread.ident] = (weakref.ref(thread), cursor)
+            self._local.cursor = cursor
+        return cursor
+
+    def read_arrow(self, sql, params=None):
+        """
+        Run a SQLite statement on DuckDB and return the result as an Arrow table.
+        """
+        table = self._cursor().execute(to_duckdb_sql(sql), list(params or [])).to_arrow_table()
+        return table.cast(_sqlite_schema(table.schema))
+
+    def iter_batches(self, sql, params=None, batch_size=EXPORT_BATCH_ROWS):
+        """
+        Run a SQLite statement on DuckDB and yield the result as Arrow record batches of
+        batch_size rows (the last one may be shorter), as DuckDB produces them.
+
+        The statement runs on its own cursor, closed when the generator is exhausted or
+        closed, so this thread's other queries can run while a result is being consumed.
+        """
+        cursor = self.database.cursor()
+        try:
+            for name, value in DUCKDB_SETTINGS.items():
+                cursor.execute(f"SET {name} = {value}")
+            reader = cursor.execute(to_duckdb_sql(sql), list(params or [])).to_arrow_reader(batch_size)
+            schema = _sqlite_schema(reader.schema)
+            for batch in reader:
+                yield batch.cast(schema)
+        finally:
+            cursor.close()
+
+    def interrupt(self, thread_ident):
+        with self._lock:
+            entry = self._cursors.get(thread_ident)
+        if entry is not None:
+            entry[1].interrupt()
+
+    def close(self):
+        with self._lock:
+            for _, cursor in self._cursors.values():
+                cursor.close()
+            self._cursors.clear()
+        self.database.close()
+
+
+_duckdb_backend = None
+_duckdb_lock = threading.Lock()
+
+
+def get_duckdb_backend():
+    """
+    The process-wide DuckDB backend for the current curated database build and source,
+    created on first use and recreated when either changes.
+    """
+    global _duckdb_backend
+    with _duckdb_lock:
+        backend = _duckdb_backend
+        if (backend is None or backend.source != get_duckdb_source() or backend.db_path != get_db_path()
+                or backend.fingerprint != get_pool().fingerprint()):
+            if backend is not None:
+                backend.close()
+            _duckdb_backend = backend = DuckDBBackend()
+        return backend
+
+
+# ============================================================================
+# ENTRY POINTS
+# ============================================================================
+
+def read_sql(sql, params=None, backend=None):
+    """
+    Run a statement on the selected backend.
+
+    Args:
+        sql: SQLite statement with ? placeholders
+        params: parameter values
+        backend: 'sqlite' or 'duckdb' (default: get_backend())
+
+    Returns:
+        pd.DataFrame
+    """
+    backend = backend or get_backend()
+    if backend == 'duckdb' and not SQLITE_ONLY.search(sql):
+        return get_duckdb_backend().read_arrow(sql, params).to_pandas()
+    with connection() as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def read_arrow(sql, params=None, backend=None):
+    """
+    Run a statement on the selected backend and return the result as an Arrow table,
+    for code that does not need pandas (e.g. the polars engines in queries.py). Text
+    columns become Arrow strings rather than pandas object columns.
+
+    On SQLite, rows are fetched in batches of EXPORT_BATCH_ROWS and converted column by
+    column; column types are inferred from the values (all-NULL columns have the null type).
+
+    Returns:
+        pyarrow.Table
+    """
+    import pyarrow as pa
+
+    backend = backend or get_backend()
+    if backend == 'duckdb' and not SQLITE_ONLY.search(sql):
+        return get_duckdb_backend().read_arrow(sql, params)
+
+    columns = []
+    batches = [pa.Table.from_batches([batch]) for batch in _sqlite_batches(sql, params, EXPORT_BATCH_ROWS, columns)]
+    if not batches:
+        return pa.table({column: pa.nulls(0) for column in columns})
+    return pa.concat_tables(batches, promote_options='permissive')
+
+
+def _sqlite_batches(sql, params, batch_size, columns):
+    """
+    Yield a SQLite result as Arrow record batches of batch_size rows, converted column by
+    column from each fetchmany(); column types are inferred per batch. Fills columns with
+    the column names once the statement has run.
+    """
+    import pyarrow as pa
+
+    with connection() as conn:
+        cursor = conn.execute(sql, params or [])
+        try:
+            columns[:] = [column[0] for column in cursor.description]
+            while rows := cursor.fetchmany(batch_size):
+                yield pa.RecordBatch.from_arrays([pa.array(values) for values in zip(*rows)], names=columns)
+        finally:
+            cursor.close()
+
+
+def iter_batches(sql, params=None, batch_size=EXPORT_BATCH_ROWS, backend=None):
+    """
+    Run a statement on the selected backend and yield the result as Arrow record batches
+    of batch_size rows (the last one may be shorter), fetched from the open cursor as
+    they are consumed, so only one batch is held in memory at a time. The engine may
+    still buffer rows it has to sort or rank before it can return the first one.
+
+    On SQLite, column types are inferred from each batch's values, as in read_arrow();
+    a column that is all NULL in a batch takes the type the column has in the first
+    batch, so the batches of a result share a schema (except for a column that is all
+    NULL in the first batch and not in a later one). A result without rows yields no
+    batch.
+
+    Closing the generator early (e.g. breaking out of a loop over it) closes the cursor.
+
+    Args:
+        sql: SQLite statement with ? placeholders
+        params: parameter values
+        batch_size (int): rows per batch (default EXPORT_BATCH_ROWS)
+        backend: 'sqlite' or 'duckdb' (default: get_backend())
+
+    Yields:
+        pyarrow.RecordBatch
+    """
+    import pyarrow as pa
+
+    backend = backend or get_backend()
+    if backend == 'duckdb' and not SQLITE_ONLY.search(sql):
+        yield from get_duckdb_backend().iter_batches(sql, params, batch_size)
+        return
+
+    schema = None
+    for batch in _sqlite_batches(sql, params, batch_size, []):
+        if schema is None:
+            schema = batch.schema
+        elif batch.schema != schema:
+            batch = pa.RecordBatch.from_arrays([
+                column.cast(field.type) if pa.types.is_null(column.type) else column
+                for column, field in zip(batch.columns, schema)
+            ], names=batch.schema.names)
+        yield batch
+
+
+def interrupt(thread_ident):
+    """
+    Abort the statement another thread is running, on whichever backend runs it.
+    """
+    get_pool().interrupt(thread_ident)
+    with _duckdb_lock:
+        backend = _duckdb_backend
+    if backend is not None:
+        backend.interrupt(thread_ident)
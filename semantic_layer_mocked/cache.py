@@ -0,0 +1,252 @@
+"""
+Persistent result cache for the semantic layer
+
+Query results are stored as Parquet files, keyed on the function name, its (bound)
+arguments and a fingerprint of the curated database file. A warm restart of the
+dashboard, or a second server process, is therefore served from disk without touching
+SQLite, and entries only go stale when a new build replaces main_curated.db.
+
+The cache is bounded in size: file modification times double as LRU access times
+(a hit touches the file), and the least recently used files are deleted once the total
+size exceeds the limit. Hit/miss/eviction counters are kept per process.
+
+Top-N functions (cached_ranking) keep one entry per call apart from top_n, holding the
+largest ranking fetched so far: any N it covers is answered by slicing it, and only a
+larger N (or the full ranking) goes back to the database.
+
+Settings (environment variables):
+    SALLA_CACHE              'off' disables the cache (default: on)
+    SALLA_CACHE_DIR          cache directory (default: .cache/semantic_layer in the project)
+    SALLA_CACHE_MAX_MB       size bound in MB (default: 512)
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+from .connection import get_db_path
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine)
+except ImportError:
+    pyarrow = None
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / '.cache' / 'semantic_layer'
+DEFAULT_MAX_MB = 512
+
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'top_n_slices': 0}
+_stats_lock = threading.Lock()
+
+
+def is_enabled():
+    return pyarrow is not None and os.environ.get('SALLA_CACHE', 'on').lower() not in ('off', '0', 'false')
+
+
+def get_cache_dir():
+    return Path(os.environ.get('SALLA_CACHE_DIR', DEFAULT_CACHE_DIR))
+
+
+def get_max_bytes():
+    return int(float(os.environ.get('SALLA_CACHE_MAX_MB', DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def db_fingerprint():
+    """
+    Identity of the current curated database build: path, inode, size and mtime.
+    """
+    db_path = get_db_path()
+    stat = os.stat(db_path)
+    return [str(db_path.resolve()), stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+def cache_key(func, args, kwargs):
+    """
+    Stable hash of a call: arguments are bound to the signature with defaults applied,
+    so f(10) and f(top_n=10) share an entry.
+    """
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    payload = {
+        'function': f"{func.__module__}.{func.__qualname__}",
+        'arguments': bound.arguments,
+        'database': db_fingerprint()
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=lambda value: sorted(value) if isinstance(value, (set, frozenset)) else str(value))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _read(key):
+    path = get_cache_dir() / f"{key}.parquet"
+    try:
+        df = pd.read_parquet(path)
+        os.utime(path)  # mark as recently used
+    except (OSError, ValueError):  # missing, or a partial/corrupt file
+        return None
+    return df
+
+
+def load(key):
+    """
+    Returns:
+        pd.DataFrame or None: cached result for the key, or None on a miss
+    """
+    df = _read(key)
+    _count('misses' if df is None else 'hits')
+    return df
+
+
+def store(key, df):
+    """
+    Write a result atomically (temporary file + rename), then enforce the size bound.
+    """
+    cache_dir = get_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = cache_dir / f".{key}.{uuid.uuid4().hex}.tmp"
+    df.to_parquet(tmp_path)
+    os.replace(tmp_path, cache_dir / f"{key}.parquet")
+
+    evict(get_max_bytes())
+
+
+def evict(max_bytes):
+    """
+    Delete least recently used entries until the cache fits in max_bytes.
+    """
+    entries = []
+    for path in get_cache_dir().glob('*.parquet'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+            _count('evictions')
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cached(func):
+    """
+    Decorator caching a query function's DataFrame result on disk. The undecorated
+    function stays available as func.__wrapped__.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not is_enabled():
+            return func(*args, **kwargs)
+
+        key = cache_key(func, args, kwargs)
+        df = load(key)
+        if df is None:
+            df = func(*args, **kwargs)
+            store(key, df)
+        return df
+
+    return wrapper
+
+
+def cached_ranking(select_top_n):
+    """
+    Decorator factory for functions with a `top_n` argument, where top_n=None returns the
+    full ranking and the result for any N is a slice of a larger one. Calls that differ
+    only in top_n share one entry, holding the largest ranking fetched so far: a request
+    it covers is answered via select_top_n(df, top_n), a larger one runs the query for
+    the requested N and replaces the entry.
+    
+    Example:
+        @cached_ranking(lambda df, top_n: df.head(top_n))
+        def get_popular_categories(top_n=10): ...
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            top_n = bound.arguments['top_n']
+            bound.arguments['top_n'] = None
+            key = cache_key(func, bound.args, bound.kwargs)
+            bound.arguments['top_n'] = top_n
+
+            df = _read(key)
+            if df is not None:
+                # The N the entry was fetched with travels in the Parquet metadata
+                cached_n = df.attrs.pop('top_n', None)
+                if cached_n is None or (top_n is not None and cached_n >= top_n):
+                    _count('hits')
+                    if top_n is None or top_n == cached_n:
+                        return df
+                    _count('top_n_slices')
+                    return select_top_n(df, top_n)
+
+            _count('misses')
+            df = func(*bound.args, **bound.kwargs)
+            df.attrs['top_n'] = top_n
+            store(key, df)
+            del df.attrs['top_n']
+            return df
+
+        return wrapper
+
+    return decorator
+
+
+def get_counters():
+    """
+    Returns:
+        dict: hits, misses, evictions and top_n_slices (hits answered by slicing a cached
+            ranking) in this process
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def cache_stats():
+    """
+    Returns:
+        dict: the counters of get_counters(), hit_rate, and the number of entries and
+            bytes currently on disk
+    """
+    stats = get_counters()
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+
+    paths = list(get_cache_dir().glob('*.parquet'))
+    stats['entries'] = len(paths)
+    stats['bytes'] = sum(path.stat().st_size for path in paths if path.exists())
+    return stats
+
+
+def clear_cache():
+    """
+    Delete every cached result and reset the counters.
+    """
+    for path in get_cache_dir().glob('*.parquet'):
+        path.unlink(missing_ok=True)
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
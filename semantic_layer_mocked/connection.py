@@ -1,16 +1,183 @@
 """
 Database connection helper for the semantic layer
+
+Queries go through a per-thread pool of read-only connections to the curated database,
+so repeated calls reuse an open connection with a warm page cache and a parsed schema
+instead of reconnecting every time. When the database file is swapped or rebuilt
+(e.g. after `dbt build`), the pool notices and reconnects on the next checkout.
+
+Pooled connections have the HyperLogLog SQL functions (sketches.py) registered, and can
+have side databases attached read-only under a schema name (see ConnectionPool.attach).
 """
+import os
 import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
 from pathlib import Path
 
+from .sketches import register_functions
+
+DEFAULT_DB_PATH = Path(__file__).parent.parent / 'data_warehouse' / 'main_curated.db'
+
+# Applied to every pooled connection
+CONNECTION_PRAGMAS = {
+    'mmap_size': 256 * 1024 * 1024,  # memory-map up to 256 MB of the database file
+    'cache_size': -64 * 1024,        # 64 MB page cache (negative values are in KiB)
+    'temp_store': 'MEMORY',          # sorts, GROUP BY and DISTINCT temp tables stay in RAM
+    'query_only': 'ON'               # reject any write, even through an attached database
+}
+
+
+def get_db_path():
+    """
+    Path of the curated database (override with the SALLA_CURATED_DB environment variable).
+    """
+    return Path(os.environ.get('SALLA_CURATED_DB', DEFAULT_DB_PATH))
+
+
 def get_connection():
     """
     Get a connection to the curated database.
-    
+
     Returns:
         sqlite3.Connection: Database connection object
     """
-    db_path = Path(__file__).parent.parent / 'data_warehouse' / 'main_curated.db'
-    return sqlite3.connect(str(db_path))
+    return sqlite3.connect(str(get_db_path()))
+
+
+class ConnectionPool:
+    """
+    Per-thread pool of tuned, read-only connections to one SQLite database.
+
+    Each thread gets its own connection (sqlite3 connections must not be shared between
+    threads without locking). Connections are opened read-only (mode=ro) but keep SQLite's
+    locking: dbt rebuilds tables inside the existing database file, and the shared lock
+    each read takes keeps a statement, or a result being streamed (backends.iter_batches),
+    from seeing pages a build is rewriting. With the page cache and mmap PRAGMAs the lock
+    costs next to nothing. The pool also compares the file's inode, size and mtime on
+    every checkout and reopens the connection when they change (e.g. a swapped file).
+    """
+
+    def __init__(self, db_path=None, pragmas=None):
+        self.db_path = Path(db_path) if db_path is not None else get_db_path()
+        self.pragmas = CONNECTION_PRAGMAS if pragmas is None else pragmas
+        self._local = threading.local()
+        self._connections = {}  # thread ident -> (weak reference to the thread, connection)
+        self._attachments = {}  # schema name -> database path
+        self._lock = threading.Lock()
+
+    def fingerprint(self):
+        stat = os.stat(self.db_path)
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _open(self):
+        uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        register_functions(conn)
+        thread = threading.current_thread()
+        with self._lock:
+            # Close connections left behind by threads that have exited
+            for ident, (thread_ref, old_conn) in list(self._connections.items()):
+                old_thread = thread_ref()
+                if old_thread is None or not old_thread.is_alive() or ident == thread.ident:
+                    old_conn.close()
+                    del self._connections[ident]
+            self._connections[thread.ident] = (weakref.ref(thread), conn)
+        return conn
+
+    def _checkout(self):
+        fingerprint = self.fingerprint()
+        conn = getattr(self._local, 'conn', None)
 
+        if conn is not None and self._local.fingerprint != fingerprint:
+            conn = None
+
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.fingerprint = fingerprint
+            self._local.attached = {}
+
+        with self._lock:
+            attachments = dict(self._attachments)
+        if self._local.attached != attachments:
+            self._sync_attachments(conn, attachments)
+
+        return conn
+
+    def _sync_attachments(self, conn, attachments):
+        for schema, path in self._local.attached.items():
+            if attachments.get(schema) != path:
+                conn.execute(f"DETACH DATABASE {schema}")
+        for schema, path in attachments.items():
+            if self._local.attached.get(schema) != path:
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (f"{path.resolve().as_uri()}?mode=ro",))
+        self._local.attached = attachments
+
+    def attach(self, schema, path):
+        """
+        Attach a database read-only under a schema name on every pooled connection (on
+        their next checkout), replacing a previous database of that name. The file must
+        not change afterwards; attach a new path instead. path=None detaches.
+        """
+        with self._lock:
+            if path is None:
+                self._attachments.pop(schema, None)
+            else:
+                self._attachments[schema] = Path(path)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager yielding this thread's connection. The connection stays open in the
+        pool afterwards; do not close it.
+        """
+        yield self._checkout()
+
+    def interrupt(self, thread_ident):
+        """
+        Abort the statement currently running on another thread's connection. That thread's
+        query fails with sqlite3.OperationalError('interrupted'); the connection stays usable.
+        """
+        with self._lock:
+            entry = self._connections.get(thread_ident)
+        if entry is not None:
+            entry[1].interrupt()
+
+    def close_all(self):
+        with self._lock:
+            for _, conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    The process-wide pool for the curated database, created on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.db_path != get_db_path():
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool()
+        return _pool
+
+
+def connection():
+    """
+    Context manager yielding a pooled read-only connection to the curated database.
+
+    Example:
+        with connection() as conn:
+            df = pd.read_sql_query(query, conn)
+    """
+    return get_pool().connection()
@@ -0,0 +1,1090 @@
+"""
+Local engine for the Cube data model
+
+Parses the Cube model in semantic_layer_cube/model (cubes/*.yml and views/*.yml) and
+compiles Cube-style queries to SQLite against the curated database, so the metrics the
+Cube container serves can be queried, and changes to the model tested, without Docker:
+
+    model = load_model()
+    model.load({
+        'measures': ['vw_sales_by_region_product.total_sales'],
+        'dimensions': ['vw_sales_by_region_product.customer_state'],
+        'timeDimensions': [{'dimension': 'vw_sales_by_region_product.order_purchase_timestamp',
+                            'granularity': 'month', 'dateRange': ['2018-01-01', '2018-06-30']}],
+        'filters': [{'member': 'vw_sales_by_region_product.product_category_name',
+                     'operator': 'equals', 'values': ['esporte_lazer']}],
+        'order': {'vw_sales_by_region_product.total_sales': 'desc'},
+        'limit': 10
+    })
+
+Result columns are named as in Cube's REST API: 'view.member', and
+'view.member.granularity' for a time dimension (values are 'YYYY-MM-DD' bucket starts).
+
+Supported model features: cubes defined by sql or sql_table, many_to_one/one_to_one
+joins (walked from the cube owning the measures, as LEFT JOINs), dimensions of every
+type, measures of type count, count_distinct, count_distinct_approx (computed exactly),
+sum, avg, min, max and number (with {member} references), measure filters,
+rolling_window (trailing/leading/offset) on sum, count, min and max measures, and views
+with join_path, includes ('*' or a list), excludes, prefix and alias.
+
+Pre-aggregations come from the model and, for this engine only, from
+cube_pre_aggregations.yml next to this module: the Cube container reads the model
+directory with SQLite, where its pre-aggregations are disabled, so the local rollups are
+kept out of the model.
+
+Pre-aggregations of type rollup are materialized into a separate SQLite file per
+curated database build (the curated database itself is opened read-only), built on
+first use or by scripts/run_cube_query.py --build. A query is answered from the
+smallest rollup matching it, with Cube's rules: every measure, dimension and filtered
+member must be in the rollup, the time granularity must be the rollup's or roll up from
+it, a date range must be aligned to the rollup granularity, and non-additive measures
+(count_distinct, avg) need exactly the rollup's dimensions and granularity.
+
+Settings (environment variables):
+    SALLA_CUBE_MODEL_DIR               model directory (default: semantic_layer_cube/model)
+    SALLA_CUBE_PRE_AGGREGATIONS_DIR    rollup files (default: .cache/cube_pre_aggregations)
+    SALLA_CUBE_LOCAL_PRE_AGGREGATIONS  local rollup definitions (default:
+                                       cube_pre_aggregations.yml); 'off' uses only the
+                                       model's own pre-aggregations
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import yaml
+
+from .cache import db_fingerprint
+from .connection import ConnectionPool, connection, get_db_path
+
+PROJECT_DIR = Path(__file__).parent.parent
+DEFAULT_MODEL_DIR = PROJECT_DIR / 'semantic_layer_cube' / 'model'
+DEFAULT_PRE_AGGREGATIONS_DIR = PROJECT_DIR / '.cache' / 'cube_pre_aggregations'
+DEFAULT_LOCAL_PRE_AGGREGATIONS = Path(__file__).parent / 'cube_pre_aggregations.yml'
+
+# {CUBE}, {member}, {cube.member} or {CUBE.member} in model SQL
+REFERENCE = re.compile(r'\{(\w+)(?:\.(\w+))?\}')
+
+# Time granularity -> SQLite expression truncating {sql} to the start of its bucket
+GRANULARITIES = {
+    'day': "DATE({sql})",
+    'week': "DATE({sql}, '-6 days', 'weekday 1')",
+    'month': "DATE({sql}, 'start of month')",
+    'quarter': "DATE({sql}, 'start of month', '-' || ((CAST(STRFTIME('%m', {sql}) AS INTEGER) - 1) % 3) || ' months')",
+    'year': "DATE({sql}, 'start of year')"
+}
+
+# Granularity -> DATE() modifier moving a bucket start to the next bucket
+BUCKET_LENGTHS = {
+    'day': '+1 day',
+    'week': '+7 days',
+    'month': '+1 month',
+    'quarter': '+3 months',
+    'year': '+1 year'
+}
+
+# Granularity -> granularities its buckets roll up into exactly
+ROLLS_UP_TO = {
+    'day': {'day', 'week', 'month', 'quarter', 'year'},
+    'week': {'week'},
+    'month': {'month', 'quarter', 'year'},
+    'quarter': {'quarter', 'year'},
+    'year': {'year'}
+}
+
+AGGREGATES = {'sum': 'SUM', 'avg': 'AVG', 'min': 'MIN', 'max': 'MAX'}
+
+# Measure type -> aggregate combining partial results (per rollup row or per day);
+# types missing here are not additive
+REAGGREGATES = {'count': 'SUM', 'sum': 'SUM', 'min': 'MIN', 'max': 'MAX'}
+
+LEAF_TYPES = {'count', 'count_distinct', 'count_distinct_approx', 'sum', 'avg', 'min', 'max'}
+
+FILTER_OPERATORS = {
+    'equals', 'notEquals', 'contains', 'notContains', 'startsWith', 'endsWith',
+    'gt', 'gte', 'lt', 'lte', 'set', 'notSet',
+    'inDateRange', 'notInDateRange', 'beforeDate', 'afterDate'
+}
+
+# Operators whose values are compared as numbers on measures and number dimensions
+NUMERIC_OPERATORS = {'equals', 'notEquals', 'gt', 'gte', 'lt', 'lte'}
+
+
+def get_model_dir():
+    return Path(os.environ.get('SALLA_CUBE_MODEL_DIR', DEFAULT_MODEL_DIR))
+
+
+def get_pre_aggregations_dir():
+    return Path(os.environ.get('SALLA_CUBE_PRE_AGGREGATIONS_DIR', DEFAULT_PRE_AGGREGATIONS_DIR))
+
+
+def get_local_pre_aggregations():
+    """
+    Path of the local rollup definitions, or None when disabled.
+    """
+    value = os.environ.get('SALLA_CUBE_LOCAL_PRE_AGGREGATIONS')
+    if value is not None and value.lower() in ('off', '0', 'false'):
+        return None
+    return Path(value) if value else DEFAULT_LOCAL_PRE_AGGREGATIONS
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _next_day(date):
+    return (pd.Timestamp(date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def _truncate(timestamp, granularity):
+    """
+    Start of the bucket containing a pd.Timestamp, like GRANULARITIES in SQL.
+    """
+    day = timestamp.normalize()
+    if granularity == 'week':
+        return day - pd.Timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def _is_aligned(date_range, granularity):
+    """
+    Check whether an inclusive (start, end) date range covers whole buckets.
+    """
+    start, end = date_range
+    if start is not None and _truncate(pd.Timestamp(start), granularity) != pd.Timestamp(start):
+        return False
+    if end is not None:
+        after = pd.Timestamp(_next_day(end))
+        if _truncate(after, granularity) != after:
+            return False
+    return True
+
+
+def _interval(text):
+    """
+    Parse a rolling window interval such as '1 month' or '7 days'.
+
+    Returns:
+        tuple: (count, unit) with unit one of day, week, month, year; None for 'unbounded'
+    """
+    if text == 'unbounded':
+        return None
+    match = re.fullmatch(r'\s*(\d+)\s+(day|week|month|year)s?\s*', str(text))
+    if match is None:
+        raise ValueError(f"Unsupported rolling window interval {text!r}, expected e.g. '1 month' or 'unbounded'")
+    return int(match.group(1)), match.group(2)
+
+
+def _shift_sql(interval, sign):
+    count, unit = interval
+    if unit == 'week':
+        count, unit = count * 7, 'day'
+    return f"'{sign}{count} {unit}s'"
+
+
+def _shift_date(date, interval, sign):
+    count, unit = interval
+    offset = pd.DateOffset(**{f"{unit}s": count})
+    return pd.Timestamp(date) + offset if sign == '+' else pd.Timestamp(date) - offset
+
+
+def _date_range(value):
+    """
+    Normalize a dateRange ([start, end], inclusive) to 'YYYY-MM-DD' strings.
+    """
+    if isinstance(value, str) or len(value) != 2:
+        raise ValueError(f"dateRange must be [start, end], got {value!r}")
+    start, end = (None if date is None else pd.Timestamp(date).strftime('%Y-%m-%d') for date in value)
+    if start is not None and end is not None and start > end:
+        raise ValueError(f"dateRange start {start} is after end {end}")
+    return start, end
+
+
+def _number(path, value):
+    """
+    A filter value for a number member as a number. The REST API sends values as
+    strings, and SQLite sorts every number below every string.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Filter on {path!r} needs numeric values, got {value!r}") from None
+
+
+def _condition(sql, operator, values, params):
+    """
+    SQL condition for a Cube filter on an expression, appending its parameters.
+    """
+    values = list(values or [])
+    if operator == 'set':
+        return f"{sql} IS NOT NULL"
+    if operator == 'notSet':
+        return f"{sql} IS NULL"
+    if not values:
+        raise ValueError(f"Filter operator {operator!r} needs values")
+
+    if operator == 'equals':
+        params.extend(values)
+        return f"{sql} IN ({', '.join('?' * len(values))})"
+    if operator == 'notEquals':
+        params.extend(values)
+        return f"({sql} NOT IN ({', '.join('?' * len(values))}) OR {sql} IS NULL)"
+    if operator in ('contains', 'notContains', 'startsWith', 'endsWith'):
+        patterns = {
+            'contains': '%{}%', 'notContains': '%{}%', 'startsWith': '{}%', 'endsWith': '%{}'
+        }[operator]
+        params.extend(patterns.format(value) for value in values)
+        if operator == 'notContains':
+            return f"({' AND '.join([f'{sql} NOT LIKE ?'] * len(values))} OR {sql} IS NULL)"
+        return f"({' OR '.join([f'{sql} LIKE ?'] * len(values))})"
+    if operator in ('gt', 'gte', 'lt', 'lte'):
+        params.append(values[0])
+        return f"{sql} {dict(gt='>', gte='>=', lt='<', lte='<=')[operator]} ?"
+    if operator in ('inDateRange', 'notInDateRange'):
+        start, end = _date_range(values)
+        params.extend([start, _next_day(end)])
+        if operator == 'inDateRange':
+            return f"{sql} >= ? AND {sql} < ?"
+        return f"({sql} < ? OR {sql} >= ?)"
+    if operator == 'beforeDate':
+        params.append(values[0])
+        return f"{sql} < ?"
+    if operator == 'afterDate':
+        params.append(values[0])
+        return f"{sql} > ?"
+    raise ValueError(f"Unknown filter operator {operator!r}, expected one of {sorted(FILTER_OPERATORS)}")
+
+
+class CubeModel:
+    """
+    A parsed Cube data model that compiles queries to SQLite.
+
+    Members are addressed as 'cube.member' or 'view.member'. Internally a member is the
+    (cube, name) pair it resolves to.
+    """
+
+    def __init__(self, cubes, views):
+        self.cubes = {}
+        for cube in cubes:
+            self._add_cube(cube)
+
+        self.views = {}
+        for view in views:
+            self._add_view(view)
+
+        self._validate()
+        self._pools = {}
+        self._build_lock = threading.Lock()
+
+    # ========================================================================
+    # Model parsing
+    # ========================================================================
+
+    def _add_cube(self, cube):
+        name = cube['name']
+        if name in self.cubes:
+            raise ValueError(f"Cube {name!r} is defined twice")
+        if 'sql_table' in cube:
+            source = cube['sql_table']
+        elif 'sql' in cube:
+            source = f"(\n{cube['sql'].strip()}\n)"
+        else:
+            raise ValueError(f"Cube {name!r} needs sql or sql_table")
+
+        self.cubes[name] = {
+            'source': source,
+            'joins': {join['name']: join for join in cube.get('joins') or []},
+            'dimensions': {dimension['name']: dimension for dimension in cube.get('dimensions') or []},
+            'measures': {measure['name']: measure for measure in cube.get('measures') or []},
+            'pre_aggregations': {
+                pre_aggregation['name']: self._parse_pre_aggregation(name, pre_aggregation)
+                for pre_aggregation in cube.get('pre_aggregations') or []
+            }
+        }
+
+    def _parse_pre_aggregation(self, cube, pre_aggregation):
+        if pre_aggregation.get('type', 'rollup') != 'rollup':
+            raise ValueError(f"Pre-aggregation {cube}.{pre_aggregation['name']}: only type rollup is supported")
+
+        def member(reference):
+            owner, _, name = reference.partition('.')
+            return (cube if owner == 'CUBE' else owner, name)
+
+        time_dimension = pre_aggregation.get('time_dimension')
+        return {
+            'cube': cube,
+            'table': f"{cube}__{pre_aggregation['name']}",
+            'measures': [member(reference) for reference in pre_aggregation.get('measures') or []],
+            'dimensions': [member(reference) for reference in pre_aggregation.get('dimensions') or []],
+            'time_dimension': member(time_dimension) if time_dimension else None,
+            'granularity': pre_aggregation.get('granularity') if time_dimension else None
+        }
+
+    def _add_view(self, view):
+        name = view['name']
+        if name in self.views or name in self.cubes:
+            raise ValueError(f"View {name!r} is defined twice")
+
+        members = {}
+        for entry in view.get('cubes') or []:
+            cube = entry['join_path'].split('.')[-1]
+            if cube not in self.cubes:
+                raise ValueError(f"View {name!r}: unknown cube in join_path {entry['join_path']!r}")
+
+            includes = entry.get('includes', '*')
+            if includes == '*':
+                includes = list(self.cubes[cube]['dimensions']) + list(self.cubes[cube]['measures'])
+            excludes = set(entry.get('excludes') or [])
+
+            for include in includes:
+                member = include if isinstance(include, str) else include['name']
+                if member in excludes:
+                    continue
+                alias = member if isinstance(include, str) else include.get('alias', member)
+                if entry.get('prefix'):
+                    alias = f"{entry.get('alias', cube)}_{alias}"
+                if alias in members:
+                    raise ValueError(f"View {name!r}: member {alias!r} is included twice")
+                members[alias] = (cube, member)
+
+        self.views[name] = members
+
+    def _validate(self):
+        for cube, definition in self.cubes.items():
+            for target in definition['joins']:
+                if target not in self.cubes:
+                    raise ValueError(f"Cube {cube!r} joins unknown cube {target!r}")
+            for measure, spec in definition['measures'].items():
+                if spec.get('type') not in LEAF_TYPES | {'number'}:
+                    raise ValueError(f"Measure {cube}.{measure}: unsupported type {spec.get('type')!r}")
+            for pre_aggregation in definition['pre_aggregations'].values():
+                for member in pre_aggregation['measures']:
+                    if self._kind(member) != 'measure' or self._measure(member)['type'] == 'number':
+                        raise ValueError(f"Pre-aggregation {pre_aggregation['table']}: {member} is not an aggregate measure")
+                for member in pre_aggregation['dimensions']:
+                    if self._kind(member) != 'dimension':
+                        raise ValueError(f"Pre-aggregation {pre_aggregation['table']}: {member} is not a dimension")
+                if pre_aggregation['time_dimension'] is not None and pre_aggregation['granularity'] not in GRANULARITIES:
+                    raise ValueError(f"Pre-aggregation {pre_aggregation['table']}: unsupported granularity {pre_aggregation['granularity']!r}")
+
+        for view, members in self.views.items():
+            for alias, member in members.items():
+                if self._kind(member) is None:
+                    raise ValueError(f"View {view!r}: {member[0]!r} has no member {member[1]!r}")
+
+    # ========================================================================
+    # Members
+    # ========================================================================
+
+    def _kind(self, member):
+        cube, name = member
+        definition = self.cubes.get(cube)
+        if definition is None:
+            return None
+        if name in definition['dimensions']:
+            return 'dimension'
+        if name in definition['measures']:
+            return 'measure'
+        return None
+
+    def _is_number(self, member):
+        return self._kind(member) == 'measure' or self._dimension(member).get('type') == 'number'
+
+    def _measure(self, member):
+        return self.cubes[member[0]]['measures'][member[1]]
+
+    def _dimension(self, member):
+        return self.cubes[member[0]]['dimensions'][member[1]]
+
+    def resolve(self, path, kind=None):
+        """
+        Resolve 'cube.member' or 'view.member' to the (cube, name) it refers to.
+
+        Args:
+            path (str): Member path
+            kind (str): 'dimension' or 'measure' to require that kind
+
+        Returns:
+            tuple: (cube, name)
+        """
+        owner, _, name = path.partition('.')
+        if owner in self.views:
+            member = self.views[owner].get(name)
+        else:
+            member = (owner, name)
+
+        found = None if member is None else self._kind(member)
+        if found is None:
+            raise ValueError(f"Unknown member {path!r}")
+        if kind is not None and found != kind:
+            raise ValueError(f"{path!r} is a {found}, expected a {kind}")
+        return member
+
+    def members(self):
+        """
+        Returns:
+            dict: view or cube name -> list of its member paths
+        """
+        paths = {view: [f"{view}.{alias}" for alias in members] for view, members in self.views.items()}
+        for cube, definition in self.cubes.items():
+            paths[cube] = [f"{cube}.{name}" for name in list(definition['dimensions']) + list(definition['measures'])]
+        return paths
+
+    # ========================================================================
+    # SQL rendering
+    # ========================================================================
+
+    def _render(self, cube, template, used, measure_sql=None):
+        """
+        Substitute {CUBE} and member references in a model SQL snippet.
+
+        Args:
+            cube (str): Cube the snippet belongs to
+            template (str): Model SQL
+            used (set): Collects the cubes the rendered SQL reads from
+            measure_sql (callable): (cube, name) -> SQL of a referenced measure; measure
+                references are an error without it
+        """
+        used.add(cube)
+
+        def replace(match):
+            first, second = match.groups()
+            if second is None and (first == 'CUBE' or first in self.cubes):
+                owner = cube if first == 'CUBE' else first
+                used.add(owner)
+                return _quote(owner)
+
+            owner, name = (cube, first) if second is None else (cube if first == 'CUBE' else first, second)
+            kind = self._kind((owner, name))
+            if kind == 'dimension':
+                sql = self._dimension_sql((owner, name), used)
+                return sql if re.fullmatch(r'[\w."]+', sql) else f"({sql})"
+            if kind == 'measure' and measure_sql is not None:
+                return measure_sql(owner, name)
+            raise ValueError(f"Cannot resolve {match.group(0)} in cube {cube!r}")
+
+        return REFERENCE.sub(replace, template)
+
+    def _dimension_sql(self, member, used):
+        cube, name = member
+        return self._render(cube, self._dimension(member).get('sql', f"{{CUBE}}.{name}"), used)
+
+    def _aggregate_sql(self, member, used):
+        """
+        SQL aggregating a measure of a non-number type over the joined source rows.
+        """
+        cube, _ = member
+        measure = self._measure(member)
+        sql = self._render(cube, measure['sql'], used) if measure.get('sql') else None
+
+        if measure.get('filters'):
+            condition = ' AND '.join(f"({self._render(cube, item['sql'], used)})" for item in measure['filters'])
+            sql = f"CASE WHEN {condition} THEN {sql or 1} END"
+
+        measure_type = measure['type']
+        if measure_type == 'count':
+            return f"COUNT({sql})" if sql else "COUNT(*)"
+        if measure_type in ('count_distinct', 'count_distinct_approx'):
+            return f"COUNT(DISTINCT {sql})"
+        return f"{AGGREGATES[measure_type]}({sql})"
+
+    def _leaves(self, member):
+        """
+        Aggregate measures a measure is computed from: itself, or the measures a number
+        measure references (recursively).
+        """
+        measure = self._measure(member)
+        if measure['type'] != 'number':
+            return [member]
+
+        leaves = []
+        for first, second in REFERENCE.findall(measure['sql']):
+            if second == '' and first != 'CUBE' and first not in self.cubes:
+                reference = (member[0], first)
+            elif second != '':
+                reference = (member[0] if first == 'CUBE' else first, second)
+            else:
+                continue
+            if self._kind(reference) == 'measure':
+                leaves.extend(leaf for leaf in self._leaves(reference) if leaf not in leaves)
+        return leaves
+
+    def _join_clauses(self, root, used):
+        """
+        LEFT JOINs reaching every used cube from the root, along declared joins.
+        """
+        paths = {root: []}
+        queue = [root]
+        while queue:
+            cube = queue.pop(0)
+            for target in self.cubes[cube]['joins']:
+                if target not in paths:
+                    paths[target] = paths[cube] + [(cube, target)]
+                    queue.append(target)
+
+        edges = []
+        for cube in sorted(used - {root}):
+            if cube not in paths:
+                raise ValueError(f"Cube {cube!r} cannot be reached from {root!r} through joins")
+            edges.extend(edge for edge in paths[cube] if edge not in edges)
+
+        clauses = []
+        for source, target in edges:
+            join = self.cubes[source]['joins'][target]
+            if join.get('relationship', 'many_to_one') not in ('many_to_one', 'belongs_to', 'one_to_one', 'has_one'):
+                raise ValueError(f"Join {source} -> {target}: {join['relationship']} joins would multiply measures")
+            condition = self._render(source, join['sql'], set())
+            clauses.append(f"LEFT JOIN {self.cubes[target]['source']} AS {_quote(target)}\n        ON {condition}")
+        return clauses
+
+    # ========================================================================
+    # Query parsing
+    # ========================================================================
+
+    def _parse_query(self, query):
+        """
+        Bring a Cube query to an internal form.
+
+        Returns:
+            dict: 'measures' and 'dimensions' as (output name, member) pairs, 'time' as
+                (output name, member, granularity) or None, 'date_range' as (member, start,
+                end) or None, 'filters' as (member, operator, values), 'order' as (output
+                name, descending) and 'limit'
+        """
+        unknown = set(query) - {'measures', 'dimensions', 'timeDimensions', 'filters', 'order', 'limit'}
+        if unknown:
+            raise ValueError(f"Unsupported query keys {sorted(unknown)}")
+
+        measures = [(path, self.resolve(path, 'measure')) for path in query.get('measures') or []]
+        dimensions = [(path, self.resolve(path, 'dimension')) for path in query.get('dimensions') or []]
+
+        time, date_range, filters = None, None, []
+        time_dimensions = query.get('timeDimensions') or []
+        if len(time_dimensions) > 1:
+            raise ValueError("Only one entry in timeDimensions is supported")
+        for entry in time_dimensions:
+            member = self.resolve(entry['dimension'], 'dimension')
+            if self._dimension(member).get('type') != 'time':
+                raise ValueError(f"{entry['dimension']!r} is not a time dimension")
+            if entry.get('granularity') is not None:
+                if entry['granularity'] not in GRANULARITIES:
+                    raise ValueError(f"Unsupported granularity {entry['granularity']!r}, expected one of {list(GRANULARITIES)}")
+                time = (f"{entry['dimension']}.{entry['granularity']}", member, entry['granularity'])
+            if entry.get('dateRange') is not None:
+                date_range = (member, *_date_range(entry['dateRange']))
+
+        for entry in query.get('filters') or []:
+            if 'member' not in entry:
+                raise ValueError("Only member filters are supported (no and/or groups)")
+            if entry['operator'] not in FILTER_OPERATORS:
+                raise ValueError(f"Unknown filter operator {entry['operator']!r}, expected one of {sorted(FILTER_OPERATORS)}")
+            member = self.resolve(entry['member'])
+            values = entry.get('values')
+            if values and entry['operator'] in NUMERIC_OPERATORS and self._is_number(member):
+                values = [_number(entry['member'], value) for value in values]
+            filters.append((entry['member'], member, entry['operator'], values))
+
+        outputs = {path: path for path, _ in measures + dimensions}
+        if time is not None:
+            outputs[time_dimensions[0]['dimension']] = time[0]
+            outputs[time[0]] = time[0]
+
+        order = query.get('order')
+        if order is None:
+            if time is not None:
+                order = [(time[0], 'asc')]
+            elif measures:
+                order = [(measures[0][0], 'desc')]
+            else:
+                order = [(path, 'asc') for path, _ in dimensions[:1]]
+        elif isinstance(order, dict):
+            order = list(order.items())
+        for path, direction in order:
+            if path not in outputs:
+                raise ValueError(f"Cannot order by {path!r}: not a requested member")
+            if direction not in ('asc', 'desc'):
+                raise ValueError(f"Order direction must be 'asc' or 'desc', got {direction!r}")
+
+        limit = query.get('limit')
+        if limit is not None and (not isinstance(limit, int) or limit < 0):
+            raise ValueError(f"limit must be a non-negative integer, got {limit!r}")
+
+        return {
+            'measures': measures,
+            'dimensions': dimensions,
+            'time': time,
+            'date_range': date_range,
+            'filters': filters,
+            'order': [(outputs[path], direction == 'desc') for path, direction in order],
+            'limit': limit
+        }
+
+    def _root(self, parsed):
+        """
+        Cube the query is evaluated from: the one owning the measures, else the first
+        cube every requested dimension is reachable from.
+        """
+        owners = {member[0] for _, member in parsed['measures']}
+        if len(owners) > 1:
+            raise ValueError(f"Measures from several cubes ({sorted(owners)}) in one query are not supported")
+        if owners:
+            return owners.pop()
+
+        members = [member for _, member in parsed['dimensions']]
+        if parsed['time'] is not None:
+            members.append(parsed['time'][1])
+        if not members:
+            raise ValueError("A query needs at least one measure or dimension")
+        for candidate in dict.fromkeys(member[0] for member in members):
+            try:
+                self._join_clauses(candidate, {member[0] for member in members})
+                return candidate
+            except ValueError:
+                continue
+        raise ValueError("The requested dimensions are not connected through joins")
+
+    # ========================================================================
+    # Pre-aggregations
+    # ========================================================================
+
+    def pre_aggregations(self):
+        """
+        Returns:
+            list: every pre-aggregation of the model (dicts with cube, table, measures,
+                dimensions, time_dimension and granularity)
+        """
+        return [
+            pre_aggregation
+            for definition in self.cubes.values()
+            for pre_aggregation in definition['pre_aggregations'].values()
+        ]
+
+    def _matches(self, pre_aggregation, part):
+        """
+        Check whether a pre-aggregation can answer a query part exactly (Cube's rollup
+        matching rules, see the module docstring).
+        """
+        if pre_aggregation['cube'] != part['cube']:
+            return False
+        if not set(part['leaves']) <= set(pre_aggregation['measures']):
+            return False
+
+        rollup_dimensions = set(pre_aggregation['dimensions'])
+        groups = {member for _, member, granularity in part['groups'] if granularity is None}
+        if not groups | {member for member, _, _ in part['filters']} <= rollup_dimensions:
+            return False
+
+        time = next(((member, granularity) for _, member, granularity in part['groups'] if granularity), None)
+        rollup_time = pre_aggregation['time_dimension']
+        if time is not None:
+            if time[0] != rollup_time or time[1] not in ROLLS_UP_TO[pre_aggregation['granularity']]:
+                return False
+        if part['date_range'] is not None:
+            member, start, end = part['date_range']
+            if member != rollup_time or not _is_aligned((start, end), pre_aggregation['granularity']):
+                return False
+
+        additive = all(self._measure(leaf)['type'] in REAGGREGATES for leaf in part['leaves'])
+        if not additive:
+            same_time = rollup_time is None or (time is not None and time[1] == pre_aggregation['granularity'])
+            if groups != rollup_dimensions or not same_time:
+                return False
+
+        return True
+
+    def _build_select(self, pre_aggregation):
+        """
+        SQL materializing a pre-aggregation from the curated tables.
+        """
+        groups = [(f"{cube}.{name}", (cube, name), None) for cube, name in pre_aggregation['dimensions']]
+        if pre_aggregation['time_dimension'] is not None:
+            cube, name = pre_aggregation['time_dimension']
+            groups.append((f"{cube}.{name}", (cube, name), pre_aggregation['granularity']))
+        part = {
+            'cube': pre_aggregation['cube'],
+            'groups': groups,
+            'leaves': pre_aggregation['measures'],
+            'filters': [],
+            'date_range': None
+        }
+        return self._part_select(part, None, [])
+
+    def pre_aggregation_path(self):
+        """
+        File holding the pre-aggregations for the current curated database build and
+        the current model definitions.
+        """
+        definitions = [(pre_aggregation['table'], self._build_select(pre_aggregation)) for pre_aggregation in self.pre_aggregations()]
+        payload = json.dumps({'database': db_fingerprint(), 'definitions': definitions}, sort_keys=True)
+        return get_pre_aggregations_dir() / f"{hashlib.sha256(payload.encode()).hexdigest()}.db"
+
+    def build_pre_aggregations(self, force=False):
+        """
+        Materialize every pre-aggregation into the file given by pre_aggregation_path(),
+        unless it already exists. Files of older builds are deleted.
+
+        Returns:
+            Path: the pre-aggregation file, or None if the model defines none
+        """
+        if not self.pre_aggregations():
+            return None
+
+        path = self.pre_aggregation_path()
+        with self._build_lock:
+            if path.exists() and not force:
+                return path
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.parent / f".{path.stem}.{uuid.uuid4().hex}.tmp"
+            conn = sqlite3.connect(tmp_path.resolve().as_uri(), uri=True)
+            try:
+                # Unqualified table names resolve to the attached curated database
+                conn.execute("ATTACH DATABASE ? AS curated", (f"{get_db_path().resolve().as_uri()}?mode=ro",))
+                for pre_aggregation in self.pre_aggregations():
+                    conn.execute(f"CREATE TABLE {_quote(pre_aggregation['table'])} AS\n{self._build_select(pre_aggregation)}")
+                conn.commit()
+                conn.execute("DETACH DATABASE curated")
+                conn.execute("ANALYZE")
+                conn.commit()
+            finally:
+                conn.close()
+            os.replace(tmp_path, path)
+
+            for old_path in path.parent.glob('*.db'):
+                if old_path != path:
+                    old_path.unlink(missing_ok=True)
+        return path
+
+    def _pool(self, path):
+        pool = self._pools.get(path)
+        if pool is None:
+            pool = self._pools[path] = ConnectionPool(path)
+        return pool
+
+    def pre_aggregation_sizes(self, path):
+        """
+        Returns:
+            dict: pre-aggregation table -> number of rows
+        """
+        with self._pool(path).connection() as conn:
+            return {table: int(stat.split()[0]) for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1")}
+
+    # ========================================================================
+    # Compilation
+    # ========================================================================
+
+    def _part_select(self, part, pre_aggregation, params):
+        """
+        SELECT grouping a query part (its leaf measures by its group columns), read from
+        the joined cube sources or from a pre-aggregation table.
+
+        Args:
+            part (dict): cube, groups as (output name, member, granularity), leaves,
+                filters as (member, operator, values) and date_range
+            pre_aggregation (dict): Pre-aggregation to read from, or None
+            params (list): Collects the bound parameters
+        """
+        used = set()
+        if pre_aggregation is None:
+            def column(member):
+                return self._dimension_sql(member, used)
+        else:
+            def column(member):
+                return _quote(f"{member[0]}.{member[1]}")
+
+        columns, group_by = [], []
+        for name, member, granularity in part['groups']:
+            sql = column(member)
+            if granularity is not None and (pre_aggregation is None or granularity != pre_aggregation['granularity']):
+                sql = GRANULARITIES[granularity].format(sql=sql)
+            columns.append(f"{sql} AS {_quote(name)}")
+            group_by.append(sql)
+
+        for leaf in part['leaves']:
+            if pre_aggregation is None:
+                sql = self._aggregate_sql(leaf, used)
+            else:
+                # Non-additive measures only match with one rollup row per group
+                sql = f"{REAGGREGATES.get(self._measure(leaf)['type'], 'MAX')}({column(leaf)})"
+            columns.append(f"{sql} AS {_quote(f'{leaf[0]}.{leaf[1]}')}")
+
+        conditions = []
+        for member, operator, values in part['filters']:
+            conditions.append(_condition(column(member), operator, values, params))
+        if part['date_range'] is not None:
+            member, start, end = part['date_range']
+            if start is not None:
+                conditions.append(f"{column(member)} >= ?")
+                params.append(start)
+            if end is not None:
+                conditions.append(f"{column(member)} < ?")
+                params.append(_next_day(end))
+
+        if pre_aggregation is None:
+            source = [f"{self.cubes[part['cube']]['source']} AS {_quote(part['cube'])}"]
+            source += self._join_clauses(part['cube'], used)
+        else:
+            source = [_quote(pre_aggregation['table'])]
+
+        sql = "SELECT\n        " + "\n        , ".join(columns)
+        sql += "\n    FROM\n        " + "\n    ".join(source)
+        if conditions:
+            sql += "\n    WHERE\n        " + "\n        AND ".join(conditions)
+        if group_by and part['leaves']:
+            sql += "\n    GROUP BY\n        " + "\n        , ".join(group_by)
+        elif group_by:
+            sql = sql.replace("SELECT\n", "SELECT DISTINCT\n", 1)
+        return sql
+
+    def _plan(self, parsed):
+        """
+        Split a parsed query into the parts selected in CTEs: 'base' for the plain
+        measures, and with rolling windows a day-level 'rolling_source' part.
+
+        Returns:
+            tuple: (root cube, list of (CTE name, part), list of rolling windows as
+                (window, list of leaves))
+        """
+        root = self._root(parsed)
+        groups = [(name, member, None) for name, member in parsed['dimensions']]
+        if parsed['time'] is not None:
+            groups.append(parsed['time'])
+
+        leaves = []
+        for _, member in parsed['measures']:
+            leaves.extend(leaf for leaf in self._leaves(member) if leaf not in leaves)
+        for path, member, _, _ in parsed['filters']:
+            if self._kind(member) == 'measure':
+                leaves.extend(leaf for leaf in self._leaves(member) if leaf not in leaves)
+
+        dimension_filters = [(member, operator, values) for _, member, operator, values in parsed['filters']
+                             if self._kind(member) == 'dimension']
+        plain = [leaf for leaf in leaves if 'rolling_window' not in self._measure(leaf)]
+        rolling = [leaf for leaf in leaves if 'rolling_window' in self._measure(leaf)]
+
+        parts = [('base', {
+            'cube': root, 'groups': groups, 'leaves': plain,
+            'filters': dimension_filters, 'date_range': parsed['date_range']
+        })]
+        if not rolling:
+            return root, parts, []
+
+        if parsed['time'] is None:
+            raise ValueError("Rolling window measures need a time dimension with a granularity")
+        time_name, time_member, granularity = parsed['time']
+
+        windows = {}
+        for leaf in rolling:
+            measure = self._measure(leaf)
+            if measure['type'] not in REAGGREGATES:
+                raise ValueError(f"Rolling window on {leaf[0]}.{leaf[1]}: type {measure['type']} is not additive")
+            window = measure['rolling_window']
+            if window.get('type', 'fixed') != 'fixed':
+                raise ValueError(f"Rolling window on {leaf[0]}.{leaf[1]}: only fixed windows are supported")
+            key = (window.get('trailing'), window.get('leading'), window.get('offset', 'end'))
+            windows.setdefault(key, []).append(leaf)
+
+        # Days any window can reach, so the source only reads what the windows need
+        source_range = None
+        if parsed['date_range'] is not None:
+            member, start, end = parsed['date_range']
+            lowers, uppers = [], []
+            for trailing, leading, _ in windows:
+                trailing = _interval(trailing) if trailing is not None else (0, 'day')
+                leading = _interval(leading) if leading is not None else (0, 'day')
+                if start is None or trailing is None:
+                    lowers.append(None)
+                else:
+                    lowers.append(_shift_date(_truncate(pd.Timestamp(start), granularity), trailing, '-'))
+                if end is None or leading is None:
+                    uppers.append(None)
+                else:
+                    bucket_end = _truncate(pd.Timestamp(end), granularity) + pd.DateOffset(**{
+                        'day': {'days': 1}, 'week': {'days': 7}, 'month': {'months': 1},
+                        'quarter': {'months': 3}, 'year': {'years': 1}
+                    }[granularity])
+                    uppers.append(_shift_date(bucket_end, leading, '+') - pd.Timedelta(days=1))
+            lower = None if None in lowers else min(lowers).strftime('%Y-%m-%d')
+            upper = None if None in uppers else max(uppers).strftime('%Y-%m-%d')
+            if lower is not None or upper is not None:
+                source_range = (member, lower, upper)
+
+        source_groups = [group for group in groups if group[2] is None] + [(time_name, time_member, 'day')]
+        parts.append(('rolling_source', {
+            'cube': root, 'groups': source_groups, 'leaves': rolling,
+            'filters': dimension_filters, 'date_range': source_range
+        }))
+        return root, parts, list(windows.items())
+
+    def compile(self, query, use_pre_aggregations=True):
+        """
+        Compile a Cube query into one SQLite statement.
+
+        Args:
+            query (dict): Cube REST API query: measures, dimensions, timeDimensions (one
+                entry with dimension, granularity and/or dateRange), filters (member,
+                operator, values), order ({member: 'asc'|'desc'} or a list of pairs)
+                and limit
+            use_pre_aggregations (bool): Read from matching pre-aggregations (which must
+                have been built, see build_pre_aggregations)
+
+        Returns:
+            tuple: (SQL, list of parameters, pre-aggregation file or None when the
+                statement reads the curated database)
+        """
+        parsed = self._parse_query(query)
+        root, parts, windows = self._plan(parsed)
+
+        # Every part must come from a pre-aggregation, since they live in another file
+        chosen = [None] * len(parts)
+        path = None
+        if use_pre_aggregations and self.pre_aggregations():
+            path = self.pre_aggregation_path()
+            sizes = self.pre_aggregation_sizes(path) if path.exists() else {}
+            for i, (_, part) in enumerate(parts):
+                candidates = [pre_aggregation for pre_aggregation in self.pre_aggregations()
+                              if pre_aggregation['table'] in sizes and self._matches(pre_aggregation, part)]
+                if candidates:
+                    chosen[i] = min(candidates, key=lambda pre_aggregation: sizes[pre_aggregation['table']])
+            if None in chosen:
+                chosen, path = [None] * len(parts), None
+
+        params = []
+        ctes = [f"{name} AS (\n    {self._part_select(part, chosen[i], params)}\n)" for i, (name, part) in enumerate(parts)]
+
+        group_names = [name for name, _, _ in parts[0][1]['groups']]
+        columns = {}
+        for _, part in parts[:1]:
+            for leaf in part['leaves']:
+                columns[leaf] = f"base.{_quote(f'{leaf[0]}.{leaf[1]}')}"
+
+        joins = []
+        if windows:
+            time_name, _, granularity = parsed['time']
+            time = f"base.{_quote(time_name)}"
+            day = f"rolling_source.{_quote(time_name)}"
+            for i, ((trailing, leading, offset), leaves) in enumerate(windows):
+                anchor = [time] if offset == 'start' else [time, f"'{BUCKET_LENGTHS[granularity]}'"]
+                window_conditions = [f"rolling_source.{_quote(name)} IS base.{_quote(name)}" for name in group_names if name != time_name]
+                trailing, leading = _interval(trailing or '0 days'), _interval(leading or '0 days')
+                if trailing is not None:
+                    window_conditions.append(f"{day} >= DATE({', '.join(anchor + [_shift_sql(trailing, '-')])})")
+                if leading is not None:
+                    window_conditions.append(f"{day} < DATE({', '.join(anchor + [_shift_sql(leading, '+')])})")
+
+                name = f"rolling_{i}"
+                base_groups = [f"base.{_quote(group)}" for group in group_names]
+                aggregates = [
+                    f"{REAGGREGATES[self._measure(leaf)['type']]}(rolling_source.{_quote(f'{leaf[0]}.{leaf[1]}')}) AS {_quote(f'{leaf[0]}.{leaf[1]}')}"
+                    for leaf in leaves
+                ]
+                ctes.append(
+                    f"{name} AS (\n    SELECT\n        " + "\n        , ".join(base_groups + aggregates)
+                    + "\n    FROM\n        base\n    LEFT JOIN\n        rolling_source ON (\n            "
+                    + "\n            AND ".join(window_conditions)
+                    + "\n        )\n    GROUP BY\n        " + "\n        , ".join(base_groups) + "\n)"
+                )
+                joins.append(f"LEFT JOIN\n    {name} ON (\n        "
+                             + "\n        AND ".join(f"{name}.{_quote(group)} IS base.{_quote(group)}" for group in group_names)
+                             + "\n    )" if group_names else f"CROSS JOIN\n    {name}")
+                for leaf in leaves:
+                    columns[leaf] = f"{name}.{_quote(f'{leaf[0]}.{leaf[1]}')}"
+
+        def measure_sql(cube, name):
+            if (cube, name) in columns:
+                return columns[(cube, name)]
+            measure = self._measure((cube, name))
+            return f"({self._render(cube, measure['sql'], set(), measure_sql)})"
+
+        select = [f"base.{_quote(name)} AS {_quote(name)}" for name in group_names]
+        select += [f"{measure_sql(*member)} AS {_quote(path)}" for path, member in parsed['measures']]
+
+        outer_params = []
+        conditions = [
+            _condition(measure_sql(*member), operator, values, outer_params)
+            for _, member, operator, values in parsed['filters']
+            if self._kind(member) == 'measure'
+        ]
+
+        sql = "WITH " + "\n\n, ".join(ctes)
+        sql += "\n\nSELECT\n    " + "\n    , ".join(select) + "\nFROM\n    base"
+        if joins:
+            sql += "\n" + "\n".join(joins)
+        if conditions:
+            sql += "\nWHERE\n    " + "\n    AND ".join(conditions)
+        if parsed['order']:
+            sql += "\nORDER BY\n    " + "\n    , ".join(
+                f"{_quote(name)} {'DESC' if descending else 'ASC'}" for name, descending in parsed['order']
+            )
+        params.extend(outer_params)
+        if parsed['limit'] is not None:
+            sql += "\nLIMIT ?"
+            params.append(parsed['limit'])
+
+        return sql, params, path
+
+    def load(self, query, use_pre_aggregations=True):
+        """
+        Run a Cube query (see compile), building the pre-aggregations first if needed.
+
+        Returns:
+            pd.DataFrame: one column per requested dimension and measure
+        """
+        if use_pre_aggregations:
+            self.build_pre_aggregations()
+        sql, params, path = self.compile(query, use_pre_aggregations)
+
+        if path is None:
+            with connection() as conn:
+                return pd.read_sql_query(sql, conn, params=params)
+        with self._pool(path).connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+
+def load_model(model_dir=None, local_pre_aggregations=True):
+    """
+    Parse a Cube data model directory (cubes/*.yml and views/*.yml, or any *.yml below it).
+
+    Args:
+        model_dir (str or Path): Model directory (default: get_model_dir())
+        local_pre_aggregations (bool): Add the rollups of get_local_pre_aggregations()
+            to the model's own (default True)
+
+    Returns:
+        CubeModel
+    """
+    model_dir = Path(model_dir) if model_dir is not None else get_model_dir()
+    cubes, views = [], []
+    for path in sorted(model_dir.rglob('*.yml')) + sorted(model_dir.rglob('*.yaml')):
+        with open(path) as f:
+            content = yaml.safe_load(f) or {}
+        cubes.extend(content.get('cubes') or [])
+        views.extend(content.get('views') or [])
+
+    if not cubes:
+        raise ValueError(f"No cubes found in {model_dir}")
+
+    path = get_local_pre_aggregations() if local_pre_aggregations else None
+    if path is not None:
+        with open(path) as f:
+            content = yaml.safe_load(f) or {}
+        positions = {cube['name']: i for i, cube in enumerate(cubes)}
+        for extension in content.get('cubes') or []:
+            if extension['name'] not in positions:
+                raise ValueError(f"{path.name}: cube {extension['name']!r} is not in the model")
+            cube = dict(cubes[positions[extension['name']]])
+            cube['pre_aggregations'] = list(cube.get('pre_aggregations') or []) + list(extension.get('pre_aggregations') or [])
+            cubes[positions[extension['name']]] = cube
+    return CubeModel(cubes, views)
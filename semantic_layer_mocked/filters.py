@@ -0,0 +1,156 @@
+"""
+Filters shared by the semantic layer functions
+
+Every query function accepts a `filters` dict with any of these keys:
+
+    start_date       first order date to include, 'YYYY-MM-DD' (or a date/Timestamp)
+    end_date         last order date to include (inclusive)
+    customer_states  list of customer_state values (state at order time)
+    categories       list of product_category_name values
+    seller_ids       list of seller_id values
+
+Filters become WHERE conditions with bound parameters, never formatted into the SQL, so
+each call reads only the slice it needs. None (or a missing key) means no filter on that
+dimension; an empty list matches nothing. seller_ids are compared on the integer
+seller_key (see keys.py); ids not in the data match nothing.
+
+Example:
+    get_top_products_by_region(filters={'customer_states': ['SP'], 'start_date': '2024-01-01'})
+"""
+
+import pandas as pd
+
+from .keys import KEYS, encode
+
+# Filter key -> dimension it restricts (see rollups.py)
+FILTER_DIMENSIONS = {
+    'customer_states': 'customer_state',
+    'categories': 'product_category_name',
+    'seller_ids': 'seller_id'
+}
+
+DATE_FILTERS = ('start_date', 'end_date')
+
+
+def normalize_filters(filters):
+    """
+    Validate a filters dict and bring it to a canonical form: dates as 'YYYY-MM-DD' strings,
+    value lists sorted and de-duplicated, None entries dropped.
+
+    Returns:
+        dict
+    """
+    if not filters:
+        return {}
+
+    unknown = set(filters) - set(FILTER_DIMENSIONS) - set(DATE_FILTERS)
+    if unknown:
+        raise ValueError(f"Unknown filters {sorted(unknown)}, expected any of {list(DATE_FILTERS) + list(FILTER_DIMENSIONS)}")
+
+    normalized = {}
+    for key in DATE_FILTERS:
+        if filters.get(key) is not None:
+            normalized[key] = pd.Timestamp(filters[key]).strftime('%Y-%m-%d')
+
+    if 'start_date' in normalized and 'end_date' in normalized and normalized['start_date'] > normalized['end_date']:
+        raise ValueError(f"start_date {normalized['start_date']} is after end_date {normalized['end_date']}")
+
+    for key in FILTER_DIMENSIONS:
+        if filters.get(key) is not None:
+            values = [filters[key]] if isinstance(filters[key], str) else filters[key]
+            normalized[key] = sorted(set(values))
+
+    return normalized
+
+
+def date_dimension(filters):
+    """
+    Dimension a date range needs: 'order_month' when both bounds fall on month boundaries
+    (so monthly rollups can answer it), otherwise 'order_date'. None without a date range.
+    """
+    start, end = filters.get('start_date'), filters.get('end_date')
+    if start is None and end is None:
+        return None
+
+    starts_month = start is None or start.endswith('-01')
+    ends_month = end is None or pd.Timestamp(end).is_month_end
+    return 'order_month' if starts_month and ends_month else 'order_date'
+
+
+def filter_dimensions(filters):
+    """
+    Dimensions a source must carry to apply the filters (used for rollup routing).
+
+    Returns:
+        tuple: (dimensions pinned to a single value, dimensions filtered to a range or a
+            set of values). Rows of the latter are summed together, which matters for
+            distinct counts.
+    """
+    pinned, filtered = [], []
+    for key, dimension in FILTER_DIMENSIONS.items():
+        if key in filters:
+            (pinned if len(filters[key]) == 1 else filtered).append(dimension)
+    if date_dimension(filters) is not None:
+        filtered.append(date_dimension(filters))
+    return pinned, filtered
+
+
+def filter_conditions(filters, columns):
+    """
+    WHERE conditions and bound parameters for normalized filters.
+
+    Args:
+        filters (dict): Output of normalize_filters
+        columns (dict): Dimension -> SQL expression in the queried source (the integer key
+            column for dimensions in keys.KEYS). The date range
+            is applied to 'order_timestamp' (ISO timestamps) if present, else to
+            'order_date' ('YYYY-MM-DD'), else to 'order_month' ('YYYY-MM')
+
+    Returns:
+        tuple: (list of SQL conditions, list of parameters)
+    """
+    conditions, params = [], []
+
+    for key, dimension in FILTER_DIMENSIONS.items():
+        if key in filters:
+            values = encode(dimension, filters[key]) if dimension in KEYS else filters[key]
+            if not values:
+                # IN () is SQLite-only
+                conditions.append("1 = 0")
+                continue
+            conditions.append(f"{columns[dimension]} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+
+    start, end = filters.get('start_date'), filters.get('end_date')
+    if 'order_timestamp' in columns:
+        if start is not None:
+            conditions.append(f"{columns['order_timestamp']} >= ?")
+            params.append(start)
+        if end is not None:
+            # Compare with the start of the following day
+            conditions.append(f"{columns['order_timestamp']} < ?")
+            params.append((pd.Timestamp(end) + pd.Timedelta(days=1)).strftime('%Y-%m-%d'))
+    elif 'order_date' in columns:
+        if start is not None:
+            conditions.append(f"{columns['order_date']} >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append(f"{columns['order_date']} <= ?")
+            params.append(end)
+    elif start is not None or end is not None:
+        # Only reached for month-aligned ranges (see date_dimension)
+        if start is not None:
+            conditions.append(f"{columns['order_month']} >= ?")
+            params.append(start[:7])
+        if end is not None:
+            conditions.append(f"{columns['order_month']} <= ?")
+            params.append(end[:7])
+
+    return conditions, params
+
+
+def where_clause(conditions):
+    """
+    'WHERE a AND b' for a list of conditions, or an empty string.
+    """
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
@@ -0,0 +1,133 @@
+"""
+Dictionary-encoded identifiers for the semantic layer
+
+product_id, seller_id, customer_id and order_id are 32-character hex strings. The curated
+layer maps each of them to a dense integer key (models/curated/keys, numbered 0, 1, 2, ...
+in identifier order), and fct_order_items and the rollups carry the keys. Queries group,
+join and filter on the integers; results are decoded only on output, into pandas
+Categoricals whose categories are the identifiers, so a frame holds one copy of each
+distinct identifier plus a small integer code per row.
+
+Because keys are numbered in identifier order, ordering by a key orders by the
+identifier, and the decoded Categoricals sort the same way as the strings.
+
+Example:
+    encode('seller_id', ['3442f8959a84dea7ee197c632cb2df15'])  -> [1234]
+    decode(pd.DataFrame({'seller_id': [1234]}))                 -> seller_id '3442f89...'
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .connection import connection, get_pool
+
+# Identifier -> (key table, key column)
+KEYS = {
+    'product_id': ('key_products', 'product_key'),
+    'seller_id': ('key_sellers', 'seller_key'),
+    'customer_id': ('key_customers', 'customer_key'),
+    'order_id': ('key_orders', 'order_key')
+}
+
+_dictionaries = {}
+_arrow_dictionaries = {}  # identifier -> (dictionary() index, the same as an Arrow array)
+_dictionaries_lock = threading.Lock()
+
+
+def dictionary(identifier):
+    """
+    Identifiers of a key table, positioned by key. Cached per database build.
+
+    Args:
+        identifier (str): Name from KEYS
+
+    Returns:
+        pd.Index: identifier strings; the key of an identifier is its position
+    """
+    table, key_column = KEYS[identifier]
+    fingerprint = get_pool().fingerprint()
+    with _dictionaries_lock:
+        cached = _dictionaries.get(identifier)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+    with connection() as conn:
+        rows = conn.execute(f"SELECT {identifier} FROM {table} ORDER BY {key_column}").fetchall()
+    index = pd.Index([row[0] for row in rows], name=identifier)
+
+    with _dictionaries_lock:
+        _dictionaries[identifier] = (fingerprint, index)
+    return index
+
+
+def encode(identifier, values):
+    """
+    Keys of identifier values; values without a key (not in the data) are dropped.
+
+    Returns:
+        list: int keys, in the order of values
+    """
+    positions = dictionary(identifier).get_indexer(list(values))
+    return [int(position) for position in positions if position >= 0]
+
+
+def decode(df, columns=None, remove_unused=True):
+    """
+    Replace key columns of a query result by Categoricals of their identifiers, in place.
+    Key columns are named after the identifier (e.g. `F.seller_key AS seller_id`); NULL
+    keys become NaN. Unused categories are dropped, so groupby and value_counts only see
+    the identifiers present.
+
+    Args:
+        df (pd.DataFrame): Query result
+        columns (list): Columns to decode (default: every column named in KEYS)
+        remove_unused (bool): Drop unused categories (default True); with False, every
+            frame decoded shares the same CategoricalDtype, e.g. the batches of a result
+
+    Returns:
+        pd.DataFrame: df
+    """
+    for column in columns if columns is not None else [name for name in df.columns if name in KEYS]:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            continue
+        codes = df[column].to_numpy(dtype='float64', na_value=np.nan)
+        codes = np.where(np.isnan(codes), -1, codes).astype(np.int64)
+        values = pd.Categorical.from_codes(codes, categories=dictionary(column))
+        df[column] = values.remove_unused_categories() if remove_unused else values
+    return df
+
+
+def decode_arrow(batch, columns=None):
+    """
+    Arrow counterpart of decode: key columns of a record batch become dictionary arrays
+    whose dictionary holds every identifier, shared by all the batches decoded
+    (to_pandas() turns them into Categoricals).
+
+    Returns:
+        pyarrow.RecordBatch: a new batch
+    """
+    import pyarrow as pa
+
+    arrays = []
+    for name, column in zip(batch.schema.names, batch.columns):
+        if name in (columns if columns is not None else KEYS) and not pa.types.is_dictionary(column.type):
+            column = pa.DictionaryArray.from_arrays(column.cast(pa.int32()), _arrow_dictionary(name))
+        arrays.append(column)
+    return pa.RecordBatch.from_arrays(arrays, names=batch.schema.names)
+
+
+def _arrow_dictionary(identifier):
+    index = dictionary(identifier)
+    with _dictionaries_lock:
+        cached = _arrow_dictionaries.get(identifier)
+        if cached is not None and cached[0] is index:
+            return cached[1]
+
+    import pyarrow as pa
+    values = pa.array(index, type=pa.string())
+
+    with _dictionaries_lock:
+        _arrow_dictionaries[identifier] = (index, values)
+    return values
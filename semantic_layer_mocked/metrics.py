@@ -0,0 +1,522 @@
+"""
+Metrics engine for the semantic layer
+
+Measures and dimensions are defined once, with their SQL on fct_order_items (F, joined to
+dim_customers C and dim_products P only when a dimension or filter needs them) and on
+the rollups (see rollups.py). query() compiles a request into a single SQLite statement:
+
+    query(['total_revenue', 'num_orders'], ['customer_state'],
+          filters={'start_date': '2018-01-01'}, order_by=['-total_revenue'], limit=5)
+
+When no single rollup can answer every measure exactly, each group of measures is read
+from its own rollup and the parts are joined on the dimensions, as long as every part
+comes from a rollup; otherwise the statement scans the fact table once. query_batch()
+merges requests with the same dimensions and filters into one statement.
+
+Identifiers are grouped, joined and counted on their integer keys (see keys.py); the
+product_id and seller_id dimensions come back decoded, as Categoricals.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+from .cache import cached
+from .backends import get_backend, read_sql
+from .connection import get_db_path
+from .filters import filter_conditions, filter_dimensions, normalize_filters, where_clause
+from .keys import decode
+from .rollups import FACT_TABLE, ROLLUPS, rollup_column, rollup_columns, rollup_grain, route, sketch_path
+from .sketches import register_functions
+
+# How fact rows are attributed to the customer's address at order time (SCD Type 2):
+# - 'surrogate_key': equi-join on customer_address_id, which the fact table already carries
+# - 'range': join on customer_key and the address validity range (effective_from/effective_to)
+CUSTOMER_JOINS = {
+    'surrogate_key': """
+        ON F.customer_address_id = C.customer_address_id""",
+    'range': """
+        ON F.customer_key = C.customer_key
+        AND F.order_purchase_timestamp >= C.effective_from
+        AND F.order_purchase_timestamp < C.effective_to"""
+}
+
+# Measure -> SQL on the fact table, SQL on a rollup and the rollup measures it reads
+# (see rollups.can_answer). Measures without 'rollup_sql' are always read from the fact table.
+# 'order_sql' is the expression of the result column that order_by sorts on (default: the
+# column itself).
+MEASURES = {
+    'total_revenue': {
+        'sql': "SUM(F.total_item_price + F.total_shipping_price)",
+        'rollup_sql': "SUM(total_revenue)",
+        'rollup_measures': ['total_revenue'],
+        # Float sums of the same prices differ in their last bits between backends (and
+        # between runs of DuckDB's parallel sums): whole cents make equal revenues tie, so
+        # the following order_by terms decide
+        'order_sql': "ROUND(total_revenue * 100)"
+    },
+    'total_quantity': {
+        'sql': "SUM(F.quantity)",
+        'rollup_sql': "SUM(total_quantity)",
+        'rollup_measures': ['total_quantity']
+    },
+    'num_order_items': {
+        'sql': "COUNT(*)",
+        'rollup_sql': "SUM(num_order_items)",
+        'rollup_measures': ['num_order_items']
+    },
+    'num_orders': {
+        'sql': "COUNT(DISTINCT F.order_key)",
+        'rollup_sql': "SUM(num_orders)",
+        'rollup_measures': ['num_orders']
+    },
+    'num_unique_products': {
+        'sql': "COUNT(DISTINCT F.product_key)",
+        'rollup_sql': "COUNT(DISTINCT product_key)",
+        'rollup_measures': ['num_products']
+    },
+    'avg_sale': {
+        'sql': "AVG(F.total_item_price + F.total_shipping_price)",
+        'rollup_sql': "SUM(total_revenue) / SUM(num_order_items)",
+        'rollup_measures': ['total_revenue', 'num_order_items']
+    },
+    'num_customers': {
+        'sql': "COUNT(DISTINCT F.customer_key)"
+    },
+    # HyperLogLog sketches (bytes) and their estimates, mergeable across any dimension
+    # (see sketches.py); read from the sketch rollups once they are built
+    'orders_sketch': {
+        'sql': "HLL_SKETCH(F.order_key)",
+        'rollup_sql': "HLL_MERGE(orders_sketch)",
+        'rollup_measures': ['orders_sketch']
+    },
+    'customers_sketch': {
+        'sql': "HLL_SKETCH(F.customer_key)",
+        'rollup_sql': "HLL_MERGE(customers_sketch)",
+        'rollup_measures': ['customers_sketch']
+    },
+    'approx_num_orders': {
+        'sql': "HLL_ESTIMATE(HLL_SKETCH(F.order_key))",
+        'rollup_sql': "HLL_ESTIMATE(HLL_MERGE(orders_sketch))",
+        'rollup_measures': ['orders_sketch']
+    },
+    'approx_num_customers': {
+        'sql': "HLL_ESTIMATE(HLL_SKETCH(F.customer_key))",
+        'rollup_sql': "HLL_ESTIMATE(HLL_MERGE(customers_sketch))",
+        'rollup_measures': ['customers_sketch']
+    }
+}
+
+# Rollup columns recomputed for the sketch rollups, besides the grain
+SKETCH_ROLLUP_MEASURES = ['total_revenue', 'total_quantity', 'num_order_items', 'num_orders', 'orders_sketch', 'customers_sketch']
+
+# Dimension -> SQL on the fact table, the dim table alias it needs ('join'), and on a
+# rollup: the rollup dimension it is derived from and its SQL (default: the column itself).
+# Dimensions that are functions of another requested dimension ('rollup_dimension') are
+# not added to GROUP BY.
+QUARTER_SQL = "'Q' || CAST((CAST(SUBSTR({column}, 6, 2) AS INTEGER) + 2) / 3 AS TEXT)"
+
+DIMENSIONS = {
+    # Integer keys, decoded to the id strings on output (see keys.py)
+    'product_id': {'sql': "F.product_key", 'rollup_sql': rollup_column('product_id')},
+    'seller_id': {'sql': "F.seller_key", 'rollup_sql': rollup_column('seller_id')},
+    'customer_state': {'sql': "C.customer_state", 'join': 'C'},
+    'product_category_name': {'sql': "P.product_category_name", 'join': 'P'},
+    # DATE(...) and SUBSTR(..., 1, 7) match the expression indexes on fct_order_items
+    'order_date': {'sql': "DATE(F.order_purchase_timestamp)"},
+    'order_month': {'sql': "SUBSTR(F.order_purchase_timestamp, 1, 7)"},
+    'order_year': {
+        'sql': "SUBSTR(F.order_purchase_timestamp, 1, 4)",
+        'rollup_dimension': 'order_month',
+        'rollup_sql': "SUBSTR(order_month, 1, 4)"
+    },
+    'order_quarter': {
+        'sql': QUARTER_SQL.format(column='F.order_purchase_timestamp'),
+        'rollup_dimension': 'order_month',
+        'rollup_sql': QUARTER_SQL.format(column='order_month')
+    },
+    'order_year_quarter': {
+        'sql': "SUBSTR(F.order_purchase_timestamp, 1, 4) || '-' || " + QUARTER_SQL.format(column='F.order_purchase_timestamp'),
+        'rollup_dimension': 'order_month',
+        'rollup_sql': "SUBSTR(order_month, 1, 4) || '-' || " + QUARTER_SQL.format(column='order_month')
+    }
+}
+
+# Filter dimensions on fct_order_items (F), dim_customers (C) and dim_products (P)
+FACT_FILTER_COLUMNS = {
+    'order_timestamp': 'F.order_purchase_timestamp',
+    'customer_state': 'C.customer_state',
+    'product_category_name': 'P.product_category_name',
+    'seller_id': 'F.seller_key'
+}
+
+
+def customer_join(join_strategy):
+    """
+    ON clause joining fct_order_items (F) to dim_customers (C) for a join strategy.
+    """
+    if join_strategy not in CUSTOMER_JOINS:
+        raise ValueError(f"Unknown join_strategy {join_strategy!r}, expected one of {list(CUSTOMER_JOINS)}")
+    return CUSTOMER_JOINS[join_strategy]
+
+
+def fact_joins(aliases, join_strategy='surrogate_key'):
+    """
+    JOIN clauses adding dim_customers (C) and/or dim_products (P) to fct_order_items (F).
+    """
+    joins = ''
+    if 'C' in aliases:
+        joins += f"""
+    INNER JOIN
+        dim_customers AS C{customer_join(join_strategy)}"""
+    if 'P' in aliases:
+        joins += """
+    INNER JOIN
+        dim_products AS P
+        ON F.product_key = P.product_key"""
+    return joins
+
+
+def filter_aliases(filters):
+    """
+    Dim table aliases the fact table needs to apply normalized filters.
+    """
+    aliases = set()
+    if 'customer_states' in filters:
+        aliases.add('C')
+    if 'categories' in filters:
+        aliases.add('P')
+    return aliases
+
+
+def source_filters(source, filters, join_strategy='surrogate_key', joined=()):
+    """
+    Apply normalized filters to a source table.
+
+    Args:
+        source (str): A rollup, or FACT_TABLE (queried as F)
+        filters (dict): Output of normalize_filters
+        join_strategy (str): How to join dim_customers for a customer_state filter
+        joined (tuple): Aliases ('C', 'P') the fact query already joins
+
+    Returns:
+        tuple: (extra JOIN clauses for the fact table, list of conditions, list of parameters)
+    """
+    if source != FACT_TABLE:
+        columns = {dimension: rollup_column(dimension) for dimension in rollup_columns(rollup_grain(source))}
+        return '', *filter_conditions(filters, columns)
+
+    joins = fact_joins(filter_aliases(filters) - set(joined), join_strategy)
+    return joins, *filter_conditions(filters, FACT_FILTER_COLUMNS)
+
+
+def choose_source(use_rollups, dimensions, measures, filters=None):
+    """
+    Table to answer a request from: the smallest suitable rollup, or the fact table.
+    A rollup must also carry every dimension the filters restrict.
+
+    Args:
+        dimensions (list): Rollup dimensions (see rollups.py)
+        measures (list): Rollup measures (see rollups.can_answer)
+    """
+    if not use_rollups:
+        return FACT_TABLE
+    pinned, filtered = filter_dimensions(filters or {})
+    return route(list(dimensions) + pinned, measures, filtered)
+
+
+def _sql_list(items, indent=8):
+    """
+    Comma-first list with one item per line, as in the hand-written queries.
+    """
+    return ('\n' + ' ' * indent + ', ').join(items)
+
+
+def _validate(measures, dimensions, order_by):
+    unknown = [name for name in measures if name not in MEASURES]
+    unknown += [name for name in dimensions if name not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown measures/dimensions {unknown}, expected any of {list(MEASURES) + list(DIMENSIONS)}")
+    if not measures:
+        raise ValueError("At least one measure is required")
+
+    for term in order_by or []:
+        if term.lstrip('-') not in list(measures) + list(dimensions):
+            raise ValueError(f"Cannot order by {term!r}: not a requested measure or dimension")
+
+
+def plan_sources(measures, dimensions, filters, use_rollups=True):
+    """
+    Decide which table answers which measures.
+
+    Returns:
+        list: (source table, list of measures) pairs; more than one pair only when every
+            part is read from a rollup
+    """
+    def source_for(names):
+        if any('rollup_sql' not in MEASURES[name] for name in names):
+            return FACT_TABLE
+        rollup_dimensions = [DIMENSIONS[name].get('rollup_dimension', name) for name in dimensions]
+        rollup_measures = [measure for name in names for measure in MEASURES[name]['rollup_measures']]
+        return choose_source(use_rollups, rollup_dimensions, rollup_measures, filters)
+
+    source = source_for(measures)
+    if source != FACT_TABLE or len(measures) == 1:
+        return [(source, list(measures))]
+
+    parts = {}
+    for name in measures:
+        parts.setdefault(source_for([name]), []).append(name)
+    if FACT_TABLE in parts:
+        return [(FACT_TABLE, list(measures))]
+    return list(parts.items())
+
+
+def _select(source, measures, dimensions, filters, join_strategy):
+    """
+    Aggregate query for measures by dimensions on a single source table.
+
+    Returns:
+        tuple: (SQL, list of parameters)
+    """
+    if source == FACT_TABLE:
+        dimension_sql = [DIMENSIONS[name]['sql'] for name in dimensions]
+        measure_sql = [MEASURES[name]['sql'] for name in measures]
+        aliases = {DIMENSIONS[name]['join'] for name in dimensions if 'join' in DIMENSIONS[name]}
+        from_clause = f"fct_order_items AS F{fact_joins(aliases | filter_aliases(filters), join_strategy)}"
+        conditions, params = filter_conditions(filters, FACT_FILTER_COLUMNS)
+    else:
+        dimension_sql = [DIMENSIONS[name].get('rollup_sql', name) for name in dimensions]
+        measure_sql = [MEASURES[name]['rollup_sql'] for name in measures]
+        from_clause = source
+        _, conditions, params = source_filters(source, filters)
+
+    # Derived dimensions (e.g. order_year next to order_month) need no grouping of their own.
+    # SQLite selects them as bare columns; DuckDB only accepts them inside an aggregate,
+    # and MIN() of a value that is constant per group is the value itself.
+    grouped = [
+        DIMENSIONS[name].get('rollup_dimension', name) == name
+        or DIMENSIONS[name]['rollup_dimension'] not in dimensions
+        for name in dimensions
+    ]
+    if get_backend() == 'duckdb':
+        dimension_sql = [sql if is_grouped else f"MIN({sql})" for sql, is_grouped in zip(dimension_sql, grouped)]
+
+    select_list = [
+        sql if sql == name else f"{sql} AS {name}"
+        for sql, name in zip(dimension_sql + measure_sql, list(dimensions) + list(measures))
+    ]
+
+    sql = f"""
+    SELECT
+        {_sql_list(select_list)}
+
+    FROM
+        {from_clause}"""
+
+    if conditions:
+        sql += f"""
+
+    {where_clause(conditions)}"""
+
+    group_by = [sql for sql, is_grouped in zip(dimension_sql, grouped) if is_grouped]
+    if group_by:
+        sql += f"""
+
+    GROUP BY
+        {_sql_list(group_by)}"""
+
+    return sql, params
+
+
+def compile_query(measures, dimensions=(), filters=None, order_by=None, limit=None,
+                  use_rollups=True, join_strategy='surrogate_key'):
+    """
+    Compile a metrics request into one SQLite statement.
+
+    Args:
+        measures (list): Names from MEASURES
+        dimensions (list): Names from DIMENSIONS to group by
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py)
+        order_by (list): Measure or dimension names; prefix with '-' for descending order
+        limit (int): Maximum number of rows
+        use_rollups (bool): Read from rollups when they can answer exactly (default True)
+        join_strategy (str): 'surrogate_key' (default) or 'range', see CUSTOMER_JOINS
+            (fact table only; rollups are attributed through the surrogate key)
+
+    Returns:
+        tuple: (SQL, list of bound parameters); the result columns are the dimensions
+            followed by the measures, named as requested
+    """
+    measures, dimensions = list(measures), list(dimensions)
+    _validate(measures, dimensions, order_by)
+    filters = normalize_filters(filters)
+
+    parts = plan_sources(measures, dimensions, filters, use_rollups)
+    if len(parts) == 1:
+        sql, params = _select(parts[0][0], parts[0][1], dimensions, filters, join_strategy)
+    else:
+        # Measures answered by different rollups: one CTE per rollup, joined on the dimensions
+        ctes, params = [], []
+        for i, (source, names) in enumerate(parts, start=1):
+            part_sql, part_params = _select(source, names, dimensions, filters, join_strategy)
+            ctes.append(f"part_{i} AS ({part_sql}\n    )")
+            params.extend(part_params)
+
+        select_list = [f"part_1.{name} AS {name}" for name in dimensions]
+        select_list += [f"part_{i}.{name} AS {name}" for i, (_, names) in enumerate(parts, start=1) for name in names]
+        joins = ''
+        for i in range(2, len(parts) + 1):
+            on = ' AND '.join(f"part_1.{name} IS part_{i}.{name}" for name in dimensions) or '1 = 1'
+            joins += f"""
+    INNER JOIN
+        part_{i}
+        ON {on}"""
+
+        sql = f"""
+    WITH {_sql_list(ctes, indent=4)}
+
+    SELECT
+        {_sql_list(select_list)}
+
+    FROM
+        part_1{joins}"""
+
+    if order_by:
+        expressions = [MEASURES.get(term.lstrip('-'), {}).get('order_sql', term.lstrip('-')) for term in order_by]
+        terms = [f"{expression} DESC" if term.startswith('-') else expression for term, expression in zip(order_by, expressions)]
+        if any(expression not in measures + dimensions for expression in expressions):
+            # Inside an expression, a source column of the same name (e.g. a rollup's
+            # total_revenue) would shadow the result column: sort the finished rows
+            sql = f"""
+    SELECT
+        *
+
+    FROM ({sql}
+    )"""
+        sql += f"""
+
+    ORDER BY
+        {_sql_list(terms)}"""
+
+    if limit is not None:
+        sql += """
+
+    LIMIT ?"""
+        params = params + [int(limit)]
+
+    return sql + "\n    ", params
+
+
+@cached
+def query(measures, dimensions=(), filters=None, order_by=None, limit=None,
+          use_rollups=True, join_strategy='surrogate_key'):
+    """
+    Run a metrics request (see compile_query for the arguments).
+
+    Returns:
+        pd.DataFrame: One column per dimension and measure; product_id and seller_id are
+            Categoricals of the id strings
+
+    Example:
+        query(['total_revenue'], ['order_year'], filters={'customer_states': ['SP']})
+    """
+    sql, params = compile_query(measures, dimensions, filters, order_by, limit, use_rollups, join_strategy)
+    return decode(read_sql(sql, params))
+
+
+_sketch_build_lock = threading.Lock()
+
+
+def build_sketch_rollups(force=False):
+    """
+    Build the sketch rollups for the current curated database (rollups.sketch_path):
+    every rollup recomputed from the fact table with orders_sketch and customers_sketch
+    added. Key dimensions are stored under their rollup column (rollups.ROLLUP_COLUMNS),
+    as in the curated rollups. Until they exist, sketch measures are computed from the
+    fact table. Files of older builds are deleted.
+
+    Returns:
+        Path: the sketch database
+    """
+    path = sketch_path()
+    with _sketch_build_lock:
+        if path.exists() and not force:
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.parent / f".{path.stem}.{uuid.uuid4().hex}.tmp"
+        conn = sqlite3.connect(tmp_path.resolve().as_uri(), uri=True)
+        register_functions(conn)
+        try:
+            # Unqualified table names resolve to the attached curated database
+            conn.execute("ATTACH DATABASE ? AS curated", (f"{get_db_path().resolve().as_uri()}?mode=ro",))
+            for table, grain in ROLLUPS.items():
+                dimensions = list(grain) + sorted(rollup_columns(grain) - set(grain))
+                sql, params = _select(FACT_TABLE, SKETCH_ROLLUP_MEASURES, dimensions, {}, 'surrogate_key')
+                conn.execute(f"CREATE TABLE {table} AS {sql}", params)
+                for dimension in dimensions:
+                    if rollup_column(dimension) != dimension:
+                        conn.execute(f"ALTER TABLE {table} RENAME COLUMN {dimension} TO {rollup_column(dimension)}")
+                grain_columns = ', '.join(rollup_column(dimension) for dimension in grain)
+                conn.execute(f"CREATE UNIQUE INDEX {table}__grain ON {table} ({grain_columns})")
+            conn.commit()
+            conn.execute("DETACH DATABASE curated")
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+
+        for old_path in path.parent.glob('*.db'):
+            if old_path != path:
+                old_path.unlink(missing_ok=True)
+    return path
+
+
+def query_batch(requests):
+    """
+    Run several metrics requests, merging those with the same dimensions, filters and
+    options into one statement over the union of their measures. Each request's own
+    order_by and limit are applied to its slice of the merged result.
+
+    Args:
+        requests (list): dicts of query() keyword arguments
+
+    Returns:
+        list: one pd.DataFrame per request, in order
+    """
+    groups = {}
+    for i, request in enumerate(requests):
+        request = {'dimensions': (), 'filters': None, 'use_rollups': True, 'join_strategy': 'surrogate_key', **request}
+        _validate(request['measures'], request['dimensions'], request.get('order_by'))
+        key = (
+            tuple(request['dimensions']),
+            json.dumps(normalize_filters(request['filters']), sort_keys=True),
+            request['use_rollups'],
+            request['join_strategy']
+        )
+        groups.setdefault(key, []).append((i, request))
+
+    results = [None] * len(requests)
+    for (dimensions, _, use_rollups, join_strategy), members in groups.items():
+        measures = list(dict.fromkeys(name for _, request in members for name in request['measures']))
+        sql, params = compile_query(measures, dimensions, members[0][1]['filters'],
+                                    use_rollups=use_rollups, join_strategy=join_strategy)
+        merged = decode(read_sql(sql, params))
+
+        for i, request in members:
+            df = merged[list(dimensions) + list(request['measures'])]
+            if request.get('order_by'):
+                df = df.sort_values(
+                    [term.lstrip('-') for term in request['order_by']],
+                    ascending=[not term.startswith('-') for term in request['order_by']],
+                    kind='stable'
+                )
+            if request.get('limit') is not None:
+                df = df.head(request['limit'])
+            results[i] = df.reset_index(drop=True)
+
+    return results
@@ -2,19 +2,53 @@
 Semantic Layer Query Functions
 
 This module contains all business logic for the 7 analytics tasks.
-Tasks 1-4 use SQL (as required), Tasks 5-7 use Python.
+Tasks 1-4 use SQL (as required), Tasks 5-7 use Python. Where a Python task is pushed down
+into SQL for speed, the original pandas implementation stays available as a reference
+(engine='pandas').
+
+The aggregations are compiled by the metrics engine (see metrics.py) from measures and
+dimensions defined once; the functions here only choose measures, dimensions and
+ordering, and add what is specific to a task (rankings, growth, cohorts).
+
+Results are cached on disk per database build (see cache.py); the uncached function is
+available as <function>.__wrapped__. With use_rollups=True (default), requests are answered
+from the smallest pre-aggregated rollup that can answer them exactly (see rollups.py).
+
+Every function accepts a `filters` dict (date range, customer states, categories, sellers;
+see filters.py), applied in SQL with bound parameters.
+
+Identifiers are grouped and joined on their integer keys (see keys.py); product_id and
+seller_id columns in the results are Categoricals of the id strings.
+
+Statements run on SQLite, or on DuckDB with SALLA_BACKEND=duckdb (see backends.py).
+The Python tasks (5-7) also have engine='polars', which reads the fact columns into Arrow
+and aggregates them with polars' lazy, multi-threaded engine; its results match the
+default engine.
+
+Each task function also has an iter_* variant (e.g. iter_monthly_growth_by_store) that
+takes the same arguments, plus batch_size and as_arrow, and yields the same rows in
+batches of pd.DataFrames or Arrow record batches, fetched from the open cursor as they
+are consumed. Exports and paginated views of large results (every product x state, every
+seller x month) then hold one batch at a time. The iter_* variants run the SQL path
+(engine='sql') and bypass the result cache.
 """
 
 import pandas as pd
 import numpy as np
-from .connection import get_connection
+from .cache import cached, cached_ranking
+from .backends import EXPORT_BATCH_ROWS, iter_batches, read_arrow, read_sql
+from .filters import normalize_filters, where_clause
+from .keys import decode, decode_arrow
+from .metrics import FACT_TABLE, compile_query, fact_joins, source_filters
+from .sketches import group_sketches
 
 
 # ============================================================================
 # TASK 1: Top Selling Products (General + By Region)
 # ============================================================================
 
-def get_top_products_by_region():
+@cached
+def get_top_products_by_region(join_strategy='surrogate_key', use_rollups=True, with_sketches=False, filters=None):
     """
     Task: What are the top selling products in general, and by region.
     
@@ -24,6 +58,14 @@ def get_top_products_by_region():
     - Streamlit dashboard handles filtering and aggregation for "overall" view
     - Region = customer_state from dim_customers (using SCD Type 2 join)
     
+    Args:
+        join_strategy (str): 'surrogate_key' (default) or 'range', see metrics.CUSTOMER_JOINS
+            (fact table only; rollups are attributed through the surrogate key)
+        use_rollups (bool): Answer from a rollup when possible (default True)
+        with_sketches (bool): Add orders_sketch, a HyperLogLog sketch of each row's orders,
+            so distinct orders can be totalled across products (see sketches.py)
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py)
+    
     Returns:
         pd.DataFrame: Product sales by region with columns:
             - product_id
@@ -31,45 +73,34 @@ def get_top_products_by_region():
             - total_revenue
             - total_quantity
             - num_orders
+            - orders_sketch (with_sketches=True only)
     """
-    conn = get_connection()
+    query, params = _top_products_by_region_query(join_strategy, use_rollups, with_sketches, filters)
     
-    query = """
-    SELECT
-        F.product_id
-        , C.customer_state
-        , SUM(F.total_item_price + F.total_shipping_price) AS total_revenue
-        , SUM(F.quantity) AS total_quantity
-        , COUNT(DISTINCT F.order_id) AS num_orders
-    
-    FROM
-        fct_order_items AS F
-    
-    INNER JOIN
-        dim_customers AS C
-        ON F.customer_id = C.customer_id
-        AND F.order_purchase_timestamp >= C.effective_from
-        AND F.order_purchase_timestamp < C.effective_to
-    
-    GROUP BY
-        F.product_id
-        , C.customer_state
-    
-    ORDER BY
-        total_revenue DESC
-    """
-    
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    df = decode(read_sql(query, params))
     
     return df
 
 
+def _top_products_by_region_query(join_strategy, use_rollups, with_sketches, filters):
+    return compile_query(
+        ['total_revenue', 'total_quantity', 'num_orders'] + (['orders_sketch'] if with_sketches else []),
+        ['product_id', 'customer_state'],
+        filters,
+        # Ties in revenue are frequent on filtered slices; break them so every backend
+        # returns the same row order
+        order_by=['-total_revenue', 'customer_state', 'product_id'],
+        use_rollups=use_rollups,
+        join_strategy=join_strategy
+    )
+
+
 # ============================================================================
 # TASK 2: Most Popular Categories
 # ============================================================================
 
-def get_popular_categories(top_n=10):
+@cached_ranking(lambda df, top_n: df.head(top_n))
+def get_popular_categories(top_n=10, use_rollups=True, with_sketches=False, filters=None):
     """
     Task: What are the most popular categories?
     
@@ -78,7 +109,11 @@ def get_popular_categories(top_n=10):
     - Joins fact table with product dimension to get category
     
     Args:
-        top_n (int): Number of top categories to return
+        top_n (int): Number of top categories to return (None = all categories)
+        use_rollups (bool): Answer from rollups when possible (default True)
+        with_sketches (bool): Add orders_sketch, a HyperLogLog sketch of each category's
+            orders, so distinct orders can be totalled across categories (see sketches.py)
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py)
     
     Returns:
         pd.DataFrame: Popular categories with columns:
@@ -87,45 +122,32 @@ def get_popular_categories(top_n=10):
             - total_quantity
             - num_orders
             - num_unique_products
+            - orders_sketch (with_sketches=True only)
     """
-    conn = get_connection()
+    query, params = _popular_categories_query(top_n, use_rollups, with_sketches, filters)
     
-    query = f"""
-    SELECT
-        P.product_category_name
-        , SUM(F.total_item_price + F.total_shipping_price) AS total_revenue
-        , SUM(F.quantity) AS total_quantity
-        , COUNT(DISTINCT F.order_id) AS num_orders
-        , COUNT(DISTINCT F.product_id) AS num_unique_products
-    
-    FROM
-        fct_order_items AS F
-    
-    INNER JOIN
-        dim_products AS P
-        ON F.product_id = P.product_id
-    
-    GROUP BY
-        P.product_category_name
-    
-    ORDER BY
-        total_revenue DESC
-        , num_orders DESC
-    
-    LIMIT {top_n}
-    """
-    
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    df = read_sql(query, params)
     
     return df
 
 
+def _popular_categories_query(top_n, use_rollups, with_sketches, filters):
+    return compile_query(
+        ['total_revenue', 'total_quantity', 'num_orders', 'num_unique_products'] + (['orders_sketch'] if with_sketches else []),
+        ['product_category_name'],
+        filters,
+        order_by=['-total_revenue', '-num_orders'],
+        limit=top_n,
+        use_rollups=use_rollups
+    )
+
+
 # ============================================================================
 # TASK 3: Time Series Sales (Monthly, Quarterly, Yearly)
 # ============================================================================
 
-def get_time_series_sales():
+@cached
+def get_time_series_sales(use_rollups=True, filters=None):
     """
     Task: Calculate monthly, quarterly and yearly sales. (All products combined).
     
@@ -134,6 +156,10 @@ def get_time_series_sales():
     - Returns monthly grain with year/quarter columns for aggregation in Streamlit
     - Calculates total revenue (item_revenue) across all products
     
+    Args:
+        use_rollups (bool): Answer from a rollup when possible (default True)
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py)
+    
     Returns:
         pd.DataFrame: Monthly sales data with columns:
             - year_month (YYYY-MM)
@@ -144,46 +170,49 @@ def get_time_series_sales():
             - total_quantity
             - num_orders
     """
-    conn = get_connection()
-    
-    query = """
-    SELECT
-        STRFTIME('%Y-%m', order_purchase_timestamp) AS year_month
-        , STRFTIME('%Y', order_purchase_timestamp) AS year
-        , 'Q' || CAST((CAST(STRFTIME('%m', order_purchase_timestamp) AS INTEGER) + 2) / 3 AS TEXT) AS quarter
-        , STRFTIME('%Y', order_purchase_timestamp) || '-Q' || 
-          CAST((CAST(STRFTIME('%m', order_purchase_timestamp) AS INTEGER) + 2) / 3 AS TEXT) AS year_quarter
-        , SUM(total_item_price + total_shipping_price) AS total_revenue
-        , SUM(quantity) AS total_quantity
-        , COUNT(DISTINCT order_id) AS num_orders
-    
-    FROM
-        fct_order_items
-    
-    GROUP BY
-        STRFTIME('%Y-%m', order_purchase_timestamp)
-    
-    ORDER BY
-        year_month
-    """
+    query, params = _time_series_sales_query(use_rollups, filters)
     
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    df = read_sql(query, params)
     
-    return df
+    return df.rename(columns=TIME_SERIES_COLUMNS)
+
+
+# Metrics dimension -> column name in get_time_series_sales
+TIME_SERIES_COLUMNS = {
+    'order_month': 'year_month',
+    'order_year': 'year',
+    'order_quarter': 'quarter',
+    'order_year_quarter': 'year_quarter'
+}
+
+
+def _time_series_sales_query(use_rollups, filters):
+    return compile_query(
+        ['total_revenue', 'total_quantity', 'num_orders'],
+        list(TIME_SERIES_COLUMNS),
+        filters,
+        order_by=['order_month'],
+        use_rollups=use_rollups
+    )
 
 
 # ============================================================================
 # TASK 4a: Average Sale by Product Category
 # ============================================================================
 
-def get_avg_sale_by_category():
+@cached
+def get_avg_sale_by_category(use_rollups=True, filters=None):
     """
     Task (Part 1): What is the average sale by product category?
     
     Business Logic:
     - Calculates average item_revenue per category across all sales
     - Groups by product_category_name only (overall average, not by location)
+    - From a rollup, the average is SUM(total_revenue) / SUM(num_order_items)
+    
+    Args:
+        use_rollups (bool): Answer from a rollup when possible (default True)
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py)
     
     Returns:
         pd.DataFrame: Average sale by category with columns:
@@ -193,41 +222,29 @@ def get_avg_sale_by_category():
             - total_quantity
             - num_orders
     """
-    conn = get_connection()
+    query, params = _avg_sale_by_category_query(use_rollups, filters)
     
-    query = """
-    SELECT
-        P.product_category_name
-        , AVG(F.total_item_price + F.total_shipping_price) AS avg_sale
-        , SUM(F.total_item_price + F.total_shipping_price) AS total_revenue
-        , SUM(F.quantity) AS total_quantity
-        , COUNT(DISTINCT F.order_id) AS num_orders
-    
-    FROM
-        fct_order_items AS F
-    
-    INNER JOIN
-        dim_products AS P
-        ON F.product_id = P.product_id
-    
-    GROUP BY
-        P.product_category_name
-    
-    ORDER BY
-        avg_sale DESC
-    """
-    
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    df = read_sql(query, params)
     
     return df
 
 
+def _avg_sale_by_category_query(use_rollups, filters):
+    return compile_query(
+        ['avg_sale', 'total_revenue', 'total_quantity', 'num_orders'],
+        ['product_category_name'],
+        filters,
+        order_by=['-avg_sale'],
+        use_rollups=use_rollups
+    )
+
+
 # ============================================================================
 # TASK 4b: Top Product Categories by Customer Location
 # ============================================================================
 
-def get_top_categories_by_location(top_n=10):
+@cached_ranking(lambda df, top_n: df[df['rank_in_state'] <= top_n].reset_index(drop=True))
+def get_top_categories_by_location(top_n=10, join_strategy='surrogate_key', use_rollups=True, filters=None):
     """
     Task (Part 2): What are the top product category based on customer location?
     
@@ -237,7 +254,11 @@ def get_top_categories_by_location(top_n=10):
     - Joins fact with product dimension (category) and customer dimension (location)
     
     Args:
-        top_n (int): Number of top categories per location
+        top_n (int): Number of top categories per location (None = all categories)
+        join_strategy (str): 'surrogate_key' (default) or 'range', see metrics.CUSTOMER_JOINS
+            (fact table only; rollups are attributed through the surrogate key)
+        use_rollups (bool): Answer from a rollup when possible (default True)
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py)
     
     Returns:
         pd.DataFrame: Top categories by location with columns:
@@ -248,35 +269,25 @@ def get_top_categories_by_location(top_n=10):
             - num_orders
             - rank_in_state (1 = top category for that state)
     """
-    conn = get_connection()
+    query, params = _top_categories_by_location_query(top_n, join_strategy, use_rollups, filters)
     
-    query = f"""
-    WITH category_by_state AS (
-        SELECT
-            C.customer_state
-            , P.product_category_name
-            , SUM(F.total_item_price + F.total_shipping_price) AS total_revenue
-            , SUM(F.quantity) AS total_quantity
-            , COUNT(DISTINCT F.order_id) AS num_orders
-        
-        FROM
-            fct_order_items AS F
-        
-        INNER JOIN
-            dim_products AS P
-            ON F.product_id = P.product_id
-        
-        INNER JOIN
-            dim_customers AS C
-            ON F.customer_id = C.customer_id
-            AND F.order_purchase_timestamp >= C.effective_from
-            AND F.order_purchase_timestamp < C.effective_to
-        
-        GROUP BY
-            C.customer_state
-            , P.product_category_name
+    df = read_sql(query, params)
+    
+    return df
+
+
+def _top_categories_by_location_query(top_n, join_strategy, use_rollups, filters):
+    category_by_state, params = compile_query(
+        ['total_revenue', 'total_quantity', 'num_orders'],
+        ['customer_state', 'product_category_name'],
+        filters,
+        use_rollups=use_rollups,
+        join_strategy=join_strategy
     )
     
+    query = f"""
+    WITH category_by_state AS ({category_by_state})
+    
     , ranked AS (
         SELECT
             customer_state
@@ -304,36 +315,47 @@ def get_top_categories_by_location(top_n=10):
     FROM
         ranked
     
-    WHERE
-        rank_in_state <= {top_n}
+    {"WHERE rank_in_state <= ?" if top_n is not None else ""}
     
     ORDER BY
         customer_state
         , rank_in_state
     """
+    if top_n is not None:
+        params = params + [top_n]
     
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    
-    return df
+    return query, params
 
 
 # ============================================================================
-# TASK 5: Top 10 Stores by Average Daily Sales (PYTHON)
+# TASK 5: Top 10 Stores by Average Daily Sales
 # ============================================================================
 
-def get_top_stores_by_daily_sales(top_n=10):
+@cached_ranking(lambda df, top_n: df.head(top_n))
+def get_top_stores_by_daily_sales(top_n=10, engine='sql', use_rollups=True, filters=None):
     """
     Task: Calculate the top 10 stores with the highest average daily sales.
     
-    Business Logic (Python):
+    Business Logic:
     - Store = seller_id
     - Calculate total revenue per seller per day
     - Average across all days the store had sales
     - Return top N stores
+    - Stores are ranked on total revenue rounded to whole cents, divided by days active;
+      ties keep seller_id order. Float sums of the same prices differ in the last bits
+      with the order they are added in (per engine, and per run with polars' threads),
+      which would let near-tied stores swap places; the rounded total is exact, so
+      every engine ranks alike
+    - engine='sql' aggregates and ranks inside SQLite, so only top_n rows are fetched;
+      engine='pandas' is the reference implementation that loads every fact row;
+      engine='polars' runs the same steps as 'pandas' on Arrow columns
     
     Args:
-        top_n (int): Number of top stores to return
+        top_n (int): Number of top stores to return (None = all stores, ranked)
+        engine (str): 'sql' (default), 'pandas' or 'polars'
+        use_rollups (bool): Read daily sales from a rollup when possible (default True,
+            engine='sql' only)
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py)
     
     Returns:
         pd.DataFrame: Top stores with columns:
@@ -343,18 +365,100 @@ def get_top_stores_by_daily_sales(top_n=10):
             - days_active
             - total_orders
     """
-    conn = get_connection()
+    filters = normalize_filters(filters)
+    if engine == 'pandas':
+        return _get_top_stores_by_daily_sales_pandas(top_n, filters)
+    if engine == 'polars':
+        return _get_top_stores_by_daily_sales_polars(top_n, filters)
+    if engine != 'sql':
+        raise ValueError(f"Unknown engine {engine!r}, expected 'sql', 'pandas' or 'polars'")
+    
+    query, params = _top_stores_by_daily_sales_query(top_n, use_rollups, filters)
+    
+    df = decode(read_sql(query, params))
+    
+    return df
+
+
+def _top_stores_by_daily_sales_query(top_n, use_rollups, filters):
+    daily_sales, params = compile_query(
+        ['total_revenue', 'num_orders'],
+        ['seller_id', 'order_date'],
+        filters,
+        use_rollups=use_rollups
+    )
+    
+    query = f"""
+    WITH daily_sales AS ({daily_sales})
+    
+    , store_metrics AS (
+        SELECT
+            seller_id
+            , AVG(total_revenue) AS avg_daily_sales
+            , SUM(total_revenue) AS total_revenue
+            , COUNT(*) AS days_active
+            , SUM(num_orders) AS total_orders
+        
+        FROM
+            daily_sales
+        
+        GROUP BY
+            seller_id
+    )
+    
+    , ranked AS (
+        SELECT
+            *
+            -- ranked on whole cents per day (see Business Logic); ties keep seller_id
+            -- order (seller keys are numbered in seller_id order)
+            , ROW_NUMBER() OVER (
+                ORDER BY ROUND(total_revenue * 100) / days_active DESC, seller_id
+            ) AS store_rank
+        
+        FROM
+            store_metrics
+    )
+    
+    SELECT
+        seller_id
+        , avg_daily_sales
+        , total_revenue
+        , days_active
+        , total_orders
+    
+    FROM
+        ranked
+    
+    {"WHERE store_rank <= ?" if top_n is not None else ""}
+    
+    ORDER BY
+        store_rank
+    """
+    if top_n is not None:
+        params = params + [top_n]
+    
+    return query, params
+
+
+def _get_top_stores_by_daily_sales_pandas(top_n, filters):
+    """
+    Reference implementation of get_top_stores_by_daily_sales in pandas.
+    """
+    joins, conditions, params = source_filters(FACT_TABLE, filters)
     
     # Load fact data
-    df = pd.read_sql_query("""
+    df = read_sql(f"""
         SELECT
-            seller_id,
-            DATE(order_purchase_timestamp) as order_date,
-            total_item_price + total_shipping_price as total_revenue,
-            order_id
-        FROM fct_order_items
-    """, conn)
-    conn.close()
+            F.seller_id,
+            DATE(F.order_purchase_timestamp) as order_date,
+            F.total_item_price + F.total_shipping_price as total_revenue,
+            F.order_id
+        FROM fct_order_items AS F{joins}
+        {where_clause(conditions)}
+    """, params)
+    
+    if df.empty:
+        return pd.DataFrame(columns=['seller_id', 'avg_daily_sales', 'total_revenue', 'days_active', 'total_orders'])
     
     # Calculate daily sales per store
     daily_sales = df.groupby(['seller_id', 'order_date']).agg({
@@ -364,6 +468,17 @@ def get_top_stores_by_daily_sales(top_n=10):
     
     daily_sales.columns = ['seller_id', 'order_date', 'daily_revenue', 'daily_orders']
     
+    return _rank_stores(daily_sales, top_n)
+
+
+def _rank_stores(daily_sales, top_n):
+    """
+    Store ranking of get_top_stores_by_daily_sales from daily sales per store (columns
+    seller_id, order_date, daily_revenue, daily_orders).
+    """
+    if daily_sales.empty:
+        return pd.DataFrame(columns=['seller_id', 'avg_daily_sales', 'total_revenue', 'days_active', 'total_orders'])
+    
     # Calculate average daily sales per store
     store_metrics = daily_sales.groupby('seller_id').agg({
         'daily_revenue': ['mean', 'sum'],
@@ -373,25 +488,105 @@ def get_top_stores_by_daily_sales(top_n=10):
     
     store_metrics.columns = ['seller_id', 'avg_daily_sales', 'total_revenue', 'days_active', 'total_orders']
     
-    # Get top N stores
-    top_stores = store_metrics.nlargest(top_n, 'avg_daily_sales')
+    # Get top N stores, ranked on whole cents per day (see get_top_stores_by_daily_sales)
+    store_metrics['rank_key'] = np.floor(store_metrics['total_revenue'] * 100 + 0.5) / store_metrics['days_active']
+    top_stores = store_metrics.sort_values(['rank_key', 'seller_id'], ascending=[False, True]).drop(columns='rank_key')
+    if top_n is not None:
+        top_stores = top_stores.head(top_n)
     
     return top_stores
 
 
+def _get_top_stores_by_daily_sales_polars(top_n, filters):
+    """
+    get_top_stores_by_daily_sales on polars: the pandas reference steps as one lazy query
+    over Arrow columns of integer keys. Returns the same rows and order as engine='sql'.
+    """
+    import polars as pl
+    
+    joins, conditions, params = source_filters(FACT_TABLE, filters)
+    
+    # Load fact data
+    table = read_arrow(f"""
+        SELECT
+            F.seller_key as seller_id,
+            DATE(F.order_purchase_timestamp) as order_date,
+            F.total_item_price + F.total_shipping_price as total_revenue,
+            F.order_key as order_id
+        FROM fct_order_items AS F{joins}
+        {where_clause(conditions)}
+    """, params)
+    
+    if table.num_rows == 0:
+        return pd.DataFrame(columns=['seller_id', 'avg_daily_sales', 'total_revenue', 'days_active', 'total_orders'])
+    
+    store_metrics = (
+        pl.from_arrow(table).lazy()
+        # Float sums are taken over lists in row (then date) order: a plain sum() in a
+        # multi-threaded group_by combines partial sums in a different order on every run
+        # Daily sales per store
+        .group_by('seller_id', 'order_date', maintain_order=True)
+        .agg(
+            daily_revenue=pl.col('total_revenue'),
+            daily_orders=pl.col('order_id').n_unique().cast(pl.Int64)
+        )
+        .with_columns(daily_revenue=pl.col('daily_revenue').list.sum())
+        .sort('seller_id', 'order_date')
+        # Average daily sales per store
+        .group_by('seller_id', maintain_order=True)
+        .agg(
+            daily_revenue=pl.col('daily_revenue'),
+            days_active=pl.len().cast(pl.Int64),
+            total_orders=pl.col('daily_orders').sum()
+        )
+        .select(
+            'seller_id',
+            avg_daily_sales=pl.col('daily_revenue').list.mean(),
+            total_revenue=pl.col('daily_revenue').list.sum(),
+            days_active='days_active',
+            total_orders='total_orders'
+        )
+        # Ranked on whole cents per day (see get_top_stores_by_daily_sales); ties keep seller_id order
+        .sort(
+            [((pl.col('total_revenue') * 100 + 0.5).floor() / pl.col('days_active')), 'seller_id'],
+            descending=[True, False]
+        )
+    )
+    if top_n is not None:
+        store_metrics = store_metrics.head(top_n)
+    
+    return decode(store_metrics.collect().to_pandas())
+
+
 # ============================================================================
-# TASK 6: Monthly Growth Rate by Store (PYTHON)
+# TASK 6: Monthly Growth Rate by Store
 # ============================================================================
 
-def get_monthly_growth_by_store():
+@cached
+def get_monthly_growth_by_store(seller_ids=None, start_month=None, end_month=None, engine='sql', use_rollups=True, filters=None):
     """
     Task: Calculate the percentage of monthly growth in sales for each store.
     
-    Business Logic (Python):
+    Business Logic:
     - Store = seller_id
     - Group sales by seller_id and month
-    - Calculate month-over-month growth percentage
+    - Each store gets every month between its first and last sale; months without sales
+      are zero-revenue rows, so growth is always compared with the calendar month before
     - Growth % = ((current_month - prev_month) / prev_month) * 100
+      (NaN when the previous month had no sales)
+    - engine='sql' computes revenue, the month spine and LAG inside SQLite;
+      engine='pandas' is a reference implementation of the same logic and
+      engine='polars' runs it on Arrow columns
+    
+    Args:
+        seller_ids (list): Only return these stores (default: all stores)
+        start_month (str): First month to include, 'YYYY-MM' (default: no lower bound)
+        end_month (str): Last month to include, 'YYYY-MM' (default: no upper bound)
+        engine (str): 'sql' (default), 'pandas' or 'polars'
+        use_rollups (bool): Read monthly sales from a rollup when possible (default True,
+            engine='sql' only)
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py);
+            combined with the arguments above
     
     Returns:
         pd.DataFrame: Monthly growth by store with columns:
@@ -401,17 +596,167 @@ def get_monthly_growth_by_store():
             - prev_month_revenue
             - growth_pct
     """
-    conn = get_connection()
+    filters = _monthly_growth_filters(filters, seller_ids, start_month, end_month)
+    if engine == 'pandas':
+        return _get_monthly_growth_by_store_pandas(filters)
+    if engine == 'polars':
+        return _get_monthly_growth_by_store_polars(filters)
+    if engine != 'sql':
+        raise ValueError(f"Unknown engine {engine!r}, expected 'sql', 'pandas' or 'polars'")
+    
+    query, params = _monthly_growth_by_store_query(use_rollups, filters)
+    
+    df = decode(read_sql(query, params))
+    
+    return df
+
+
+def _monthly_growth_by_store_query(use_rollups, filters):
+    seller_month_sales, params = compile_query(
+        ['total_revenue'],
+        ['seller_id', 'order_month'],
+        filters,
+        use_rollups=use_rollups
+    )
+    
+    query = f"""
+    WITH RECURSIVE seller_month_sales AS ({seller_month_sales})
+    
+    , monthly_sales AS (
+        SELECT
+            seller_id
+            , CAST(SUBSTR(order_month, 1, 4) AS INTEGER) * 12
+              + CAST(SUBSTR(order_month, 6, 2) AS INTEGER) - 1 AS month_index
+            , total_revenue AS monthly_revenue
+        FROM
+            seller_month_sales
+    )
+    
+    , month_spine AS (
+        SELECT
+            MIN(month_index) AS month_index
+            , MAX(month_index) AS last_month_index
+        FROM
+            monthly_sales
+        
+        UNION ALL
+        
+        SELECT
+            month_index + 1
+            , last_month_index
+        FROM
+            month_spine
+        WHERE
+            month_index < last_month_index
+    )
+    
+    , seller_months AS (
+        SELECT
+            S.seller_id
+            , M.month_index
+        
+        FROM (
+            SELECT
+                seller_id
+                , MIN(month_index) AS first_month_index
+                , MAX(month_index) AS last_month_index
+            FROM
+                monthly_sales
+            GROUP BY
+                seller_id
+        ) AS S
+        
+        INNER JOIN
+            month_spine AS M
+            ON M.month_index BETWEEN S.first_month_index AND S.last_month_index
+    )
+    
+    , with_previous AS (
+        SELECT
+            SM.seller_id
+            , SM.month_index
+            , COALESCE(MS.monthly_revenue, 0.0) AS monthly_revenue
+            , LAG(COALESCE(MS.monthly_revenue, 0.0)) OVER (
+                PARTITION BY SM.seller_id
+                ORDER BY SM.month_index
+            ) AS prev_month_revenue
+        
+        FROM
+            seller_months AS SM
+        
+        LEFT JOIN
+            monthly_sales AS MS
+            ON SM.seller_id = MS.seller_id
+            AND SM.month_index = MS.month_index
+    )
+    
+    SELECT
+        seller_id
+        , PRINTF('%04d-%02d', month_index / 12, month_index % 12 + 1) AS month
+        , monthly_revenue
+        , prev_month_revenue
+        -- division by a zero-revenue month yields NULL
+        , (monthly_revenue - prev_month_revenue) / prev_month_revenue * 100 AS growth_pct
+    
+    FROM
+        with_previous
+    
+    WHERE
+        -- first month of each store has no growth to calculate
+        prev_month_revenue IS NOT NULL
+    
+    ORDER BY
+        seller_id
+        , month_index
+    """
+    
+    return query, params
+
+
+def _monthly_growth_filters(filters, seller_ids, start_month, end_month):
+    """
+    Fold the seller_ids/start_month/end_month arguments into normalized filters; where a
+    dimension is restricted twice, both restrictions apply.
+    
+    Returns:
+        dict
+    """
+    filters = normalize_filters(filters)
+    
+    if seller_ids is not None:
+        seller_ids = set(seller_ids)
+        if 'seller_ids' in filters:
+            seller_ids &= set(filters['seller_ids'])
+        filters['seller_ids'] = sorted(seller_ids)
+    
+    if start_month is not None:
+        filters['start_date'] = max(filters.get('start_date', ''), f"{start_month}-01")
+    
+    if end_month is not None:
+        end = pd.Period(end_month, freq='M').end_time.strftime('%Y-%m-%d')
+        filters['end_date'] = min(filters.get('end_date', end), end)
+    
+    return filters
+
+
+def _get_monthly_growth_by_store_pandas(filters):
+    """
+    Reference implementation of get_monthly_growth_by_store in pandas.
+    """
+    joins, conditions, params = source_filters(FACT_TABLE, filters)
     
     # Load fact data
-    df = pd.read_sql_query("""
+    df = read_sql(f"""
         SELECT
-            seller_id,
-            STRFTIME('%Y-%m', order_purchase_timestamp) as month,
-            total_item_price + total_shipping_price as total_revenue
-        FROM fct_order_items
-    """, conn)
-    conn.close()
+            F.seller_id,
+            STRFTIME('%Y-%m', F.order_purchase_timestamp) as month,
+            F.total_item_price + F.total_shipping_price as total_revenue
+        FROM fct_order_items AS F{joins}
+        {where_clause(conditions)}
+    """, params)
+    
+    if df.empty:
+        return pd.DataFrame(columns=['seller_id', 'month', 'monthly_revenue', 'prev_month_revenue', 'growth_pct'])
     
     # Calculate monthly revenue per store
     monthly_sales = df.groupby(['seller_id', 'month']).agg({
@@ -420,60 +765,339 @@ def get_monthly_growth_by_store():
     
     monthly_sales.columns = ['seller_id', 'month', 'monthly_revenue']
     
+    return _monthly_growth(monthly_sales)
+
+
+def _monthly_growth(monthly_sales):
+    """
+    Growth rows of get_monthly_growth_by_store from monthly revenue per store (columns
+    seller_id, month, monthly_revenue; months without sales may be missing).
+    """
+    if monthly_sales.empty:
+        return pd.DataFrame(columns=['seller_id', 'month', 'monthly_revenue', 'prev_month_revenue', 'growth_pct'])
+    
+    # Fill the months between each store's first and last sale with zero revenue
+    month_index = monthly_sales['month'].str[:4].astype(int) * 12 + monthly_sales['month'].str[5:7].astype(int) - 1
+    month_range = month_index.groupby(monthly_sales['seller_id']).agg(['min', 'max'])
+    num_months = (month_range['max'] - month_range['min'] + 1).to_numpy()
+    starts = np.repeat(month_range['min'].to_numpy(), num_months)
+    offsets = np.arange(num_months.sum()) - np.repeat(np.cumsum(num_months) - num_months, num_months)
+    spine_index = starts + offsets
+    spine = pd.DataFrame({
+        'seller_id': np.repeat(month_range.index.to_numpy(), num_months),
+        'month': [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in spine_index]
+    })
+    
+    monthly_sales = spine.merge(monthly_sales, on=['seller_id', 'month'], how='left')
+    monthly_sales['monthly_revenue'] = monthly_sales['monthly_revenue'].fillna(0.0)
+    
     # Sort by seller and month
     monthly_sales = monthly_sales.sort_values(['seller_id', 'month'])
     
     # Calculate previous month's revenue
     monthly_sales['prev_month_revenue'] = monthly_sales.groupby('seller_id')['monthly_revenue'].shift(1)
     
-    # Calculate growth percentage
+    # Calculate growth percentage (NaN when the previous month had no sales)
     monthly_sales['growth_pct'] = (
         (monthly_sales['monthly_revenue'] - monthly_sales['prev_month_revenue']) / 
-        monthly_sales['prev_month_revenue'] * 100
+        monthly_sales['prev_month_revenue'].replace(0, np.nan) * 100
     )
     
     # Remove first month for each store (no growth to calculate)
     monthly_sales = monthly_sales[monthly_sales['prev_month_revenue'].notna()]
     
-    return monthly_sales
+    return monthly_sales.reset_index(drop=True)
+
+
+def _get_monthly_growth_by_store_polars(filters):
+    """
+    get_monthly_growth_by_store on polars: monthly revenue, month spine and shift as one
+    lazy query over Arrow columns.
+    """
+    import polars as pl
+    
+    joins, conditions, params = source_filters(FACT_TABLE, filters)
+    
+    # Load fact data
+    table = read_arrow(f"""
+        SELECT
+            F.seller_key as seller_id,
+            STRFTIME('%Y-%m', F.order_purchase_timestamp) as month,
+            F.total_item_price + F.total_shipping_price as total_revenue
+        FROM fct_order_items AS F{joins}
+        {where_clause(conditions)}
+    """, params)
+    
+    if table.num_rows == 0:
+        return pd.DataFrame(columns=['seller_id', 'month', 'monthly_revenue', 'prev_month_revenue', 'growth_pct'])
+    
+    # Monthly revenue per store, months as integer indices
+    monthly_sales = (
+        pl.from_arrow(table).lazy()
+        .group_by('seller_id', 'month')
+        .agg(monthly_revenue=pl.col('total_revenue').sum())
+        .select(
+            'seller_id',
+            (pl.col('month').str.slice(0, 4).cast(pl.Int64) * 12 + pl.col('month').str.slice(5, 2).cast(pl.Int64) - 1).alias('month_index'),
+            'monthly_revenue'
+        )
+    )
+    
+    # Every month between each store's first and last sale
+    spine = (
+        monthly_sales
+        .group_by('seller_id')
+        .agg(month_index=pl.int_ranges(pl.col('month_index').min(), pl.col('month_index').max() + 1))
+        .explode('month_index')
+    )
+    
+    prev_month_revenue = pl.col('monthly_revenue').shift(1).over('seller_id')
+    month_index = pl.col('month_index')
+    
+    return (
+        spine
+        .join(monthly_sales, on=['seller_id', 'month_index'], how='left')
+        .with_columns(pl.col('monthly_revenue').fill_null(0.0))
+        .sort('seller_id', 'month_index')
+        .with_columns(prev_month_revenue=prev_month_revenue)
+        # Remove first month for each store (no growth to calculate)
+        .filter(pl.col('prev_month_revenue').is_not_null())
+        .select(
+            'seller_id',
+            pl.format(
+                '{}-{}',
+                (month_index // 12).cast(pl.String).str.zfill(4),
+                (month_index % 12 + 1).cast(pl.String).str.zfill(2)
+            ).alias('month'),
+            'monthly_revenue',
+            'prev_month_revenue',
+            # null (NaN in pandas) when the previous month had no sales
+            pl.when(pl.col('prev_month_revenue') != 0)
+            .then((pl.col('monthly_revenue') - pl.col('prev_month_revenue')) / pl.col('prev_month_revenue') * 100)
+            .alias('growth_pct')
+        )
+        .collect()
+        .to_pandas()
+        .pipe(decode)
+    )
 
 
 # ============================================================================
 # TASK 7: Cohort Analysis (PYTHON)
 # ============================================================================
 
-def get_cohort_analysis():
+# Integer period index of order_purchase_timestamp per cohort grain, computed in SQLite
+# (weeks start on Monday; day 0 = 1970-01-01, a Thursday)
+COHORT_GRAINS = {
+    'week': "(CAST(JULIANDAY(SUBSTR(F.order_purchase_timestamp, 1, 10)) - 2440587.5 AS INTEGER) + 3) / 7",
+    'month': "CAST(SUBSTR(F.order_purchase_timestamp, 1, 4) AS INTEGER) * 12 + CAST(SUBSTR(F.order_purchase_timestamp, 6, 2) AS INTEGER) - 1",
+    'quarter': "CAST(SUBSTR(F.order_purchase_timestamp, 1, 4) AS INTEGER) * 4 + (CAST(SUBSTR(F.order_purchase_timestamp, 6, 2) AS INTEGER) - 1) / 3"
+}
+
+# Segment dimension -> (column, join from fct_order_items F)
+COHORT_SEGMENTS = {
+    'customer_state': ('C.customer_state', 'INNER JOIN dim_customers AS C ON F.customer_address_id = C.customer_address_id'),
+    'product_category_name': ('P.product_category_name', 'INNER JOIN dim_products AS P ON F.product_key = P.product_key')
+}
+
+
+@cached
+def get_cohort_analysis(grain='month', segment=None, engine='vectorized', filters=None):
     """
     Task: Conduct cohort analysis on customers' orders. Analyze the cohorts based on 
     the month in which the customer made their first purchase and analyze their behavior 
     over time.
     
     Business Logic (Python):
-    - Cohort = month of customer's first purchase (cohort_month)
-    - Track revenue behavior over subsequent months (cohort_age)
+    - Cohort = period (week, month or quarter) of customer's first purchase
+    - Track revenue behavior over subsequent periods (cohort_age)
+    - Periods are integer indices (e.g. year * 12 + month), so cohort age is a plain
+      subtraction; no Period objects and no per-row Python
+    - With a segment, each cohort is further split by the segment value of the order
+      line (customer_state at order time, or product category); the cohort itself is
+      still the customer's first purchase overall
+    - Filters restrict the order lines analyzed, so cohorts are formed from the first
+      purchase within the filtered slice (e.g. the selected date range)
     - Returns data suitable for heatmap visualization
+    - engine='pandas' is the original Period-based implementation (month grain only);
+      engine='polars' runs the vectorized steps on Arrow columns
+    
+    Args:
+        grain (str): 'week', 'month' (default) or 'quarter'
+        segment (str): None (default), 'customer_state' or 'product_category_name'
+        engine (str): 'vectorized' (default), 'pandas' or 'polars'
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py)
     
     Returns:
         pd.DataFrame: Cohort data with columns:
-            - cohort_month (YYYY-MM of first purchase)
-            - cohort_age (months since first purchase: 0, 1, 2, ...)
+            - segment column, if a segment is given
+            - cohort_<grain> (cohort_month 'YYYY-MM', cohort_week 'YYYY-MM-DD' of the
+              Monday, cohort_quarter 'YYYY-Qn')
+            - cohort_age (periods since first purchase: 0, 1, 2, ...)
             - num_customers (unique customers active in that cohort age)
             - num_orders
             - total_revenue
             - avg_revenue_per_customer
     """
-    conn = get_connection()
+    if grain not in COHORT_GRAINS:
+        raise ValueError(f"Unknown grain {grain!r}, expected one of {list(COHORT_GRAINS)}")
+    if segment is not None and segment not in COHORT_SEGMENTS:
+        raise ValueError(f"Unknown segment {segment!r}, expected one of {list(COHORT_SEGMENTS)}")
+    
+    filters = normalize_filters(filters)
+    if engine == 'pandas':
+        if grain != 'month' or segment is not None:
+            raise ValueError("engine='pandas' only supports grain='month' without a segment")
+        return _get_cohort_analysis_pandas(filters)
+    if engine == 'polars':
+        return _get_cohort_analysis_polars(grain, segment, filters)
+    if engine != 'vectorized':
+        raise ValueError(f"Unknown engine {engine!r}, expected 'vectorized', 'pandas' or 'polars'")
+    
+    # Load fact data with customer, order and period index
+    query, params = _cohort_source(grain, segment, filters)
+    df = read_sql(query, params)
+    
+    return _cohorts(df, grain, segment)
+
+
+def _cohorts(df, grain, segment):
+    """
+    Cohort table of get_cohort_analysis from fact rows (columns customer_id, order_id,
+    period_index, total_revenue and the segment, see _cohort_source).
+    """
+    # Cohort = first period of each customer, cohort age = periods since then
+    # DuckDB reads the period index as a 32-bit INTEGER, SQLite as 64-bit
+    df['period_index'] = df['period_index'].astype('int64')
+    df['cohort_index'] = df.groupby('customer_id')['period_index'].transform('min')
+    df['cohort_age'] = df['period_index'] - df['cohort_index']
+    
+    # Aggregate by (segment,) cohort and cohort age
+    group_columns = ([segment] if segment else []) + ['cohort_index', 'cohort_age']
+    cohort_data = df.groupby(group_columns, dropna=False).agg(
+        num_customers=('customer_id', 'nunique'),
+        num_orders=('order_id', 'nunique'),
+        total_revenue=('total_revenue', 'sum')
+    ).reset_index()
+    
+    # Calculate average revenue per customer
+    cohort_data['avg_revenue_per_customer'] = (
+        cohort_data['total_revenue'] / cohort_data['num_customers']
+    )
+    
+    # Label cohorts (only the few distinct indices are formatted)
+    labels, codes = _cohort_labels(grain, cohort_data['cohort_index'])
+    cohort_data.insert(len(group_columns) - 2, f'cohort_{grain}', labels[codes])
+    
+    return cohort_data.drop(columns='cohort_index')
+
+
+def _cohort_source(grain, segment, filters):
+    """
+    Fact rows for the cohort engines: customer, order, period index, revenue (and segment).
+    Customers and orders are read as their integer keys, which keeps the distinct counts
+    cheap.
+    
+    Returns:
+        tuple: (SQL, list of parameters)
+    """
+    segment_column, segment_join = COHORT_SEGMENTS.get(segment, (None, ''))
+    joins, conditions, params = source_filters(FACT_TABLE, filters, joined=(segment_column.split('.')[0],) if segment else ())
+    
+    return f"""
+        SELECT
+            F.customer_key AS customer_id,
+            F.order_key AS order_id,
+            {COHORT_GRAINS[grain]} AS period_index,
+            F.total_item_price + F.total_shipping_price AS total_revenue
+            {f', {segment_column} AS {segment}' if segment else ''}
+        FROM fct_order_items AS F
+        {segment_join}{joins}
+        {where_clause(conditions)}
+    """, params
+
+
+def _get_cohort_analysis_polars(grain, segment, filters):
+    """
+    get_cohort_analysis on polars: the vectorized steps as one lazy query over Arrow
+    columns.
+    """
+    import polars as pl
+    
+    query, params = _cohort_source(grain, segment, filters)
+    table = read_arrow(query, params)
+    
+    group_columns = ([segment] if segment else []) + ['cohort_index', 'cohort_age']
+    if table.num_rows == 0:
+        columns = group_columns[:-2] + [f'cohort_{grain}', 'cohort_age', 'num_customers', 'num_orders', 'total_revenue', 'avg_revenue_per_customer']
+        return pd.DataFrame(columns=columns)
+    
+    cohort_data = (
+        pl.from_arrow(table).lazy()
+        # DuckDB reads the period index as a 32-bit INTEGER, SQLite as 64-bit
+        .with_columns(pl.col('period_index').cast(pl.Int64))
+        # Cohort = first period of each customer, cohort age = periods since then
+        .with_columns(cohort_index=pl.col('period_index').min().over('customer_id'))
+        .with_columns(cohort_age=pl.col('period_index') - pl.col('cohort_index'))
+        # Aggregate by (segment,) cohort and cohort age
+        .group_by(group_columns)
+        .agg(
+            num_customers=pl.col('customer_id').n_unique().cast(pl.Int64),
+            num_orders=pl.col('order_id').n_unique().cast(pl.Int64),
+            total_revenue=pl.col('total_revenue').sum()
+        )
+        .with_columns(avg_revenue_per_customer=pl.col('total_revenue') / pl.col('num_customers'))
+        # Same row order as the pandas groupby (missing segment values last)
+        .sort(group_columns, nulls_last=True)
+        .collect()
+        .to_pandas()
+    )
+    
+    # Label cohorts (only the few distinct indices are formatted)
+    labels, codes = _cohort_labels(grain, cohort_data['cohort_index'])
+    cohort_data.insert(len(group_columns) - 2, f'cohort_{grain}', labels[codes])
+    
+    return cohort_data.drop(columns='cohort_index')
+
+
+def _cohort_labels(grain, cohort_index):
+    """
+    Returns:
+        tuple: (array of labels of the distinct indices, code of each row into that array)
+    """
+    codes, uniques = pd.factorize(cohort_index)
+    
+    if grain == 'week':
+        mondays = np.datetime64('1970-01-01') + (uniques.to_numpy() * 7 - 3).astype('timedelta64[D]')
+        labels = np.datetime_as_string(mondays, unit='D')
+    elif grain == 'quarter':
+        labels = np.array([f"{i // 4}-Q{i % 4 + 1}" for i in uniques])
+    else:
+        labels = np.array([f"{i // 12:04d}-{i % 12 + 1:02d}" for i in uniques])
+    
+    return labels, codes
+
+
+def _get_cohort_analysis_pandas(filters):
+    """
+    Reference implementation of get_cohort_analysis (month grain, no segment) on
+    pandas Periods.
+    """
+    joins, conditions, params = source_filters(FACT_TABLE, filters)
     
     # Load fact data with customer and order info
-    df = pd.read_sql_query("""
+    df = read_sql(f"""
         SELECT
-            customer_id,
-            order_id,
-            order_purchase_timestamp,
-            total_item_price + total_shipping_price as total_revenue
-        FROM fct_order_items
-    """, conn)
-    conn.close()
+            F.customer_id,
+            F.order_id,
+            F.order_purchase_timestamp,
+            F.total_item_price + F.total_shipping_price as total_revenue
+        FROM fct_order_items AS F{joins}
+        {where_clause(conditions)}
+    """, params)
+    
+    if df.empty:
+        return pd.DataFrame(columns=['cohort_month', 'cohort_age', 'num_customers', 'num_orders', 'total_revenue', 'avg_revenue_per_customer'])
     
     # Convert timestamp to datetime
     df['order_purchase_timestamp'] = pd.to_datetime(df['order_purchase_timestamp'])
@@ -508,3 +1132,271 @@ def get_cohort_analysis():
     
     return cohort_data
 
+
+
+# ============================================================================
+# ALL DASHBOARD DATASETS IN ONE PASS
+# ============================================================================
+
+def get_dashboard_bundle(top_n_categories=10, top_n_location=10, top_n_stores=10, with_sketches=False, filters=None):
+    """
+    Every dashboard dataset from a single read of the fact table.
+    
+    Business Logic:
+    - Reads fct_order_items joined to dim_customers and dim_products once, one row per
+      order item, and computes every grouping of the task functions (product x state,
+      category, month, state x category, seller x day, customer cohorts) from those
+      rows in pandas, instead of one statement per task
+    - Same rows as the task functions with use_rollups=False (engine defaults); rows
+      tied on the ranking measure may come in a different order
+    - Worth it when most tasks would scan the fact table anyway (e.g. with seller or
+      day-level filters, which the rollups cannot answer); unfiltered, the rollups
+      answer the SQL tasks faster
+    - The joins rely on every fact row having its product and customer address (the
+      relationships tests of fct_order_items)
+    
+    Args:
+        top_n_categories (int): top_n for the popular categories (None = all)
+        top_n_location (int): top_n per state for the top categories by location (None = all)
+        top_n_stores (int): top_n for the top stores (None = all, ranked)
+        with_sketches (bool): Add orders_sketch to the product and category datasets,
+            as the task functions do (see sketches.py)
+        filters (dict): Date range, customer_states, categories, seller_ids (see filters.py)
+    
+    Returns:
+        dict: dataset name (task function name without 'get_', as in
+            async_queries.gather_all) -> pd.DataFrame with that function's columns
+    """
+    filters = normalize_filters(filters)
+    joins, conditions, params = source_filters(FACT_TABLE, filters, joined=('C', 'P'))
+    
+    # Load fact data with every dimension the groupings need
+    df = read_sql(f"""
+        SELECT
+            F.product_key AS product_id,
+            F.seller_key AS seller_id,
+            F.customer_key AS customer_id,
+            F.order_key AS order_id,
+            C.customer_state,
+            P.product_category_name,
+            DATE(F.order_purchase_timestamp) AS order_date,
+            {COHORT_GRAINS['month']} AS period_index,
+            F.total_item_price + F.total_shipping_price AS total_revenue,
+            F.quantity
+        FROM fct_order_items AS F{fact_joins({'C', 'P'})}{joins}
+        {where_clause(conditions)}
+    """, params)
+    
+    sketched = []
+    
+    def aggregate(by, sketch=False, **extra):
+        # NULL dimension values form a group, as in SQL GROUP BY
+        grouped = df.groupby(by, dropna=False)
+        result = grouped.agg(
+            total_revenue=('total_revenue', 'sum'),
+            total_quantity=('quantity', 'sum'),
+            num_orders=('order_id', 'nunique'),
+            **extra
+        ).reset_index()
+        if sketch:
+            sketched.append((result, grouped.ngroup().to_numpy()))
+        return result
+    
+    product_state = aggregate(['product_id', 'customer_state'], sketch=with_sketches)
+    categories = aggregate(
+        ['product_category_name'],
+        sketch=with_sketches,
+        num_unique_products=('product_id', 'nunique'),
+        avg_sale=('total_revenue', 'mean')
+    )
+    
+    # Orders sketches of the product and category groups, hashing each order once
+    if sketched:
+        groupings = [(groups, len(result)) for result, groups in sketched]
+        for (result, _), sketches in zip(sketched, group_sketches(df['order_id'].to_numpy(), groupings)):
+            result['orders_sketch'] = sketches
+    sketch_columns = ['orders_sketch'] if with_sketches else []
+    
+    # Task 1: product x state, by revenue
+    top_products = (
+        product_state
+        .sort_values('total_revenue', ascending=False, kind='stable')
+        .reset_index(drop=True)
+        .pipe(decode)
+    )
+    
+    # Tasks 2 and 4a: categories, by revenue and by average sale
+    popular_categories = (
+        categories
+        .sort_values(['total_revenue', 'num_orders'], ascending=False, kind='stable')
+        [['product_category_name', 'total_revenue', 'total_quantity', 'num_orders', 'num_unique_products'] + sketch_columns]
+        .head(top_n_categories if top_n_categories is not None else len(categories))
+        .reset_index(drop=True)
+    )
+    avg_sale_by_category = (
+        categories
+        .sort_values('avg_sale', ascending=False, kind='stable')
+        [['product_category_name', 'avg_sale', 'total_revenue', 'total_quantity', 'num_orders']]
+        .reset_index(drop=True)
+    )
+    
+    # Task 3: months, with year and quarter labels
+    monthly = aggregate(['period_index'])
+    period_index = monthly.pop('period_index').to_numpy()
+    year = (period_index // 12).astype(str)
+    quarter = np.char.add('Q', (period_index % 12 // 3 + 1).astype(str))
+    time_series_sales = pd.concat([
+        pd.DataFrame({
+            'year_month': [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in period_index],
+            'year': year,
+            'quarter': quarter,
+            'year_quarter': np.char.add(np.char.add(year, '-'), quarter)
+        }),
+        monthly
+    ], axis=1)
+    
+    # Task 4b: state x category, ranked within each state
+    top_categories_by_location = (
+        aggregate(['customer_state', 'product_category_name'])
+        .sort_values(['customer_state', 'total_revenue'], ascending=[True, False], kind='stable')
+        .reset_index(drop=True)
+    )
+    top_categories_by_location['rank_in_state'] = top_categories_by_location.groupby('customer_state', dropna=False).cumcount() + 1
+    if top_n_location is not None:
+        top_categories_by_location = top_categories_by_location[top_categories_by_location['rank_in_state'] <= top_n_location].reset_index(drop=True)
+    
+    # Tasks 5 and 6: daily sales per store, ranked and rolled up to months
+    daily_sales = df.groupby(['seller_id', 'order_date']).agg(
+        daily_revenue=('total_revenue', 'sum'),
+        daily_orders=('order_id', 'nunique')
+    ).reset_index()
+    top_stores = decode(_rank_stores(daily_sales, top_n_stores).reset_index(drop=True))
+    
+    monthly_sales = df.groupby(['seller_id', 'period_index'])['total_revenue'].sum().reset_index(name='monthly_revenue')
+    labels, codes = _cohort_labels('month', monthly_sales.pop('period_index'))
+    monthly_sales.insert(1, 'month', labels[codes])
+    monthly_growth = decode(_monthly_growth(monthly_sales))
+    
+    # Task 7: monthly cohorts
+    cohort_analysis = _cohorts(df[['customer_id', 'order_id', 'period_index', 'total_revenue']].copy(), 'month', None)
+    
+    return {
+        'top_products_by_region': top_products,
+        'popular_categories': popular_categories,
+        'time_series_sales': time_series_sales,
+        'avg_sale_by_category': avg_sale_by_category,
+        'top_categories_by_location': top_categories_by_location,
+        'top_stores_by_daily_sales': top_stores,
+        'monthly_growth_by_store': monthly_growth,
+        'cohort_analysis': cohort_analysis
+    }
+
+
+# ============================================================================
+# STREAMING RESULTS
+# ============================================================================
+
+def _iter_result(query, params, batch_size, as_arrow, columns=None):
+    """
+    Yield a statement's result in batches of batch_size rows, fetched as they are
+    consumed (see backends.iter_batches): pd.DataFrames, or Arrow record batches with
+    as_arrow=True. Key columns are decoded against every identifier, so all batches of a
+    result have the same Categorical dtype (dictionary type in Arrow).
+    
+    Args:
+        columns (dict): Result column renames
+    """
+    for batch in iter_batches(query, params, batch_size):
+        if columns:
+            batch = batch.rename_columns([columns.get(name, name) for name in batch.schema.names])
+        if as_arrow:
+            yield decode_arrow(batch)
+        else:
+            yield decode(batch.to_pandas(), remove_unused=False)
+
+
+def iter_top_products_by_region(join_strategy='surrogate_key', use_rollups=True, with_sketches=False, filters=None,
+                                batch_size=EXPORT_BATCH_ROWS, as_arrow=False):
+    """
+    get_top_products_by_region in batches of batch_size rows (pd.DataFrame, or
+    pyarrow.RecordBatch with as_arrow=True), in the same order.
+    """
+    query, params = _top_products_by_region_query(join_strategy, use_rollups, with_sketches, filters)
+    yield from _iter_result(query, params, batch_size, as_arrow)
+
+
+def iter_popular_categories(top_n=10, use_rollups=True, with_sketches=False, filters=None,
+                            batch_size=EXPORT_BATCH_ROWS, as_arrow=False):
+    """
+    get_popular_categories in batches of batch_size rows (pd.DataFrame, or
+    pyarrow.RecordBatch with as_arrow=True), in the same order.
+    """
+    query, params = _popular_categories_query(top_n, use_rollups, with_sketches, filters)
+    yield from _iter_result(query, params, batch_size, as_arrow)
+
+
+def iter_time_series_sales(use_rollups=True, filters=None, batch_size=EXPORT_BATCH_ROWS, as_arrow=False):
+    """
+    get_time_series_sales in batches of batch_size rows (pd.DataFrame, or
+    pyarrow.RecordBatch with as_arrow=True), in the same order.
+    """
+    query, params = _time_series_sales_query(use_rollups, filters)
+    yield from _iter_result(query, params, batch_size, as_arrow, columns=TIME_SERIES_COLUMNS)
+
+
+def iter_avg_sale_by_category(use_rollups=True, filters=None, batch_size=EXPORT_BATCH_ROWS, as_arrow=False):
+    """
+    get_avg_sale_by_category in batches of batch_size rows (pd.DataFrame, or
+    pyarrow.RecordBatch with as_arrow=True), in the same order.
+    """
+    query, params = _avg_sale_by_category_query(use_rollups, filters)
+    yield from _iter_result(query, params, batch_size, as_arrow)
+
+
+def iter_top_categories_by_location(top_n=10, join_strategy='surrogate_key', use_rollups=True, filters=None,
+                                    batch_size=EXPORT_BATCH_ROWS, as_arrow=False):
+    """
+    get_top_categories_by_location in batches of batch_size rows (pd.DataFrame, or
+    pyarrow.RecordBatch with as_arrow=True), in the same order.
+    """
+    query, params = _top_categories_by_location_query(top_n, join_strategy, use_rollups, filters)
+    yield from _iter_result(query, params, batch_size, as_arrow)
+
+
+def iter_top_stores_by_daily_sales(top_n=10, use_rollups=True, filters=None, batch_size=EXPORT_BATCH_ROWS, as_arrow=False):
+    """
+    get_top_stores_by_daily_sales (engine='sql') in batches of batch_size rows
+    (pd.DataFrame, or pyarrow.RecordBatch with as_arrow=True), in the same order.
+    """
+    query, params = _top_stores_by_daily_sales_query(top_n, use_rollups, normalize_filters(filters))
+    yield from _iter_result(query, params, batch_size, as_arrow)
+
+
+def iter_monthly_growth_by_store(seller_ids=None, start_month=None, end_month=None, use_rollups=True, filters=None,
+                                 batch_size=EXPORT_BATCH_ROWS, as_arrow=False):
+    """
+    get_monthly_growth_by_store (engine='sql') in batches of batch_size rows
+    (pd.DataFrame, or pyarrow.RecordBatch with as_arrow=True), in the same order.
+    """
+    filters = _monthly_growth_filters(filters, seller_ids, start_month, end_month)
+    query, params = _monthly_growth_by_store_query(use_rollups, filters)
+    yield from _iter_result(query, params, batch_size, as_arrow)
+
+
+def iter_cohort_analysis(grain='month', segment=None, engine='vectorized', filters=None,
+                         batch_size=EXPORT_BATCH_ROWS, as_arrow=False):
+    """
+    get_cohort_analysis in batches of batch_size rows (pd.DataFrame, or
+    pyarrow.RecordBatch with as_arrow=True), in the same order.
+    
+    Cohorts are assigned from every fact row of a customer, so the table is computed
+    in full (through the result cache) before it is split; it has one row per cohort,
+    segment and age, and stays small whatever the number of orders.
+    """
+    df = get_cohort_analysis(grain=grain, segment=segment, engine=engine, filters=filters)
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size].reset_index(drop=True)
+        if as_arrow:
+            import pyarrow as pa
+            batch = pa.RecordBatch.from_pandas(batch, preserve_index=False)
+        yield batch
@@ -0,0 +1,213 @@
+"""
+Aggregate navigation for the semantic layer
+
+The curated layer contains rollups of fct_order_items at coarser grains
+(models/curated/rollups). route() picks the smallest rollup that can answer a request
+exactly, and falls back to the fact table when none can (or when the rollups have not
+been built), so interactive queries read thousands of pre-aggregated rows instead of
+every order item.
+
+Every rollup stores additive measures (total_revenue, total_quantity, num_order_items)
+plus num_orders, the distinct order count at its own grain. Distinct counts are not
+additive in general: summing num_orders over rows is only exact when the dimensions
+being rolled up are order-level attributes (an order has a single date, month and
+customer state, but can span several sellers, products and categories).
+
+Sketch rollups (scripts/build_sketches.py) copy every rollup into a side database,
+attached as the `sketches` schema, and add HyperLogLog sketches of the orders and
+customers of each row (see sketches.py). Sketches merge across any dimension, so
+requests for sketch measures are routed to them regardless of the grain.
+
+Rollups carry integer keys (see keys.py) instead of the seller_id and product_id strings;
+grains are listed by dimension and ROLLUP_COLUMNS names the column holding each one.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+from .cache import db_fingerprint
+from .connection import connection, get_pool
+from .sketches import PRECISION
+
+FACT_TABLE = 'fct_order_items'
+
+# Rollup table -> grain (the dimensions it is grouped by)
+ROLLUPS = {
+    'agg_daily_seller_sales': ('order_date', 'seller_id'),
+    'agg_monthly_seller_sales': ('order_month', 'seller_id'),
+    'agg_monthly_state_sales': ('order_month', 'customer_state'),
+    'agg_monthly_state_category_sales': ('order_month', 'customer_state', 'product_category_name'),
+    'agg_monthly_product_state_sales': ('order_month', 'product_id', 'customer_state')
+}
+
+# Dimension -> rollup column, for dimensions stored as integer keys
+ROLLUP_COLUMNS = {
+    'seller_id': 'seller_key',
+    'product_id': 'product_key'
+}
+
+# Columns a rollup carries because they are functions of a grain dimension
+IMPLIED_DIMENSIONS = {
+    'order_date': ('order_month',),
+    'product_id': ('product_category_name',)
+}
+
+# Dimensions with a single value per order; num_orders stays exact when summed across them
+ORDER_LEVEL_DIMENSIONS = {'order_date', 'order_month', 'customer_state'}
+
+# Measures every rollup can sum
+ADDITIVE_MEASURES = {'total_revenue', 'total_quantity', 'num_order_items'}
+
+# Measures only sketch rollups carry; mergeable across every dimension
+SKETCH_MEASURES = {'orders_sketch', 'customers_sketch'}
+
+SKETCH_SCHEMA = 'sketches'
+DEFAULT_SKETCH_DIR = Path(__file__).parent.parent / '.cache' / 'sketches'
+
+_table_sizes = {}
+_table_sizes_lock = threading.Lock()
+
+
+def rollup_columns(grain):
+    """
+    Dimensions available in a rollup with the given grain: the grain plus the dimensions
+    it implies.
+
+    Returns:
+        set
+    """
+    available = set(grain)
+    for dimension in grain:
+        available.update(IMPLIED_DIMENSIONS.get(dimension, ()))
+    return available
+
+
+def rollup_column(dimension):
+    """
+    Column of a rollup holding a dimension.
+    """
+    return ROLLUP_COLUMNS.get(dimension, dimension)
+
+
+def rollup_grain(source):
+    """
+    Grain of a rollup, or of a sketch rollup given as 'sketches.<rollup>'.
+    """
+    return ROLLUPS[source.rpartition('.')[2]]
+
+
+def get_sketch_dir():
+    return Path(os.environ.get('SALLA_SKETCH_DIR', DEFAULT_SKETCH_DIR))
+
+
+def sketch_path():
+    """
+    Side database holding the sketch rollups of the current curated database build.
+    """
+    payload = json.dumps([db_fingerprint(), PRECISION, sorted(ROLLUPS)])
+    return get_sketch_dir() / f"{hashlib.sha256(payload.encode()).hexdigest()}.db"
+
+
+def can_answer(grain, dimensions, measures, filtered=()):
+    """
+    Check whether a rollup with the given grain can answer a request exactly.
+
+    Args:
+        grain (tuple): Dimensions the rollup is grouped by
+        dimensions (list): Dimensions the request groups by (or pins to a single value)
+        measures (list): Requested measures; besides ADDITIVE_MEASURES, 'num_orders'
+            (distinct orders) and 'num_products' (distinct products)
+        filtered (list): Dimensions restricted to a range or a set of values; the rollup
+            must carry them, and their rows are summed together
+
+    Returns:
+        bool
+    """
+    if not set(dimensions) | set(filtered) <= rollup_columns(grain):
+        return False
+
+    for measure in measures:
+        if measure == 'num_orders':
+            # Every dimension summed over must be an order-level attribute
+            if not set(grain) - set(dimensions) <= ORDER_LEVEL_DIMENSIONS:
+                return False
+        elif measure == 'num_products':
+            # COUNT(DISTINCT product_key) needs product_id in the grain
+            if 'product_id' not in grain:
+                return False
+        elif measure not in ADDITIVE_MEASURES | SKETCH_MEASURES:
+            return False
+
+    return True
+
+
+def table_sizes():
+    """
+    Row counts of the rollups present in the curated database, from the ANALYZE
+    statistics (sqlite_stat1) when available, and of the sketch rollups when they have
+    been built for this database (which are then attached to the pooled connections).
+    Cached per database build.
+
+    Returns:
+        dict: table name ('sketches.<rollup>' for sketch rollups) -> number of rows
+    """
+    path = sketch_path()
+    if path.exists():
+        get_pool().attach(SKETCH_SCHEMA, path)
+
+    fingerprint = (get_pool().fingerprint(), path.exists())
+    with _table_sizes_lock:
+        if fingerprint in _table_sizes:
+            return _table_sizes[fingerprint]
+
+    with connection() as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        stats = {}
+        if 'sqlite_stat1' in tables:
+            for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+                stats[table] = int(stat.split()[0])
+
+        sizes = {}
+        for table in ROLLUPS:
+            if table in tables:
+                sizes[table] = stats.get(table) or conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    if path.exists():
+        with connection() as conn:
+            for table, stat in conn.execute(f"SELECT tbl, stat FROM {SKETCH_SCHEMA}.sqlite_stat1"):
+                sizes[f"{SKETCH_SCHEMA}.{table}"] = int(stat.split()[0])
+
+    with _table_sizes_lock:
+        _table_sizes.clear()
+        _table_sizes[fingerprint] = sizes
+    return sizes
+
+
+def route(dimensions, measures, filtered=()):
+    """
+    Pick the table to answer a request from.
+
+    Args:
+        dimensions (list): Dimensions the request groups by (see can_answer)
+        measures (list): Requested measures (see can_answer)
+        filtered (list): Dimensions the request filters on (see can_answer)
+
+    Returns:
+        str: Name of the smallest rollup able to answer the request exactly (a sketch
+            rollup when sketch measures are requested), or FACT_TABLE if there is none
+
+    Example:
+        route(['order_month'], ['total_revenue', 'num_orders']) -> 'agg_monthly_state_sales'
+    """
+    sizes = table_sizes()
+    prefix = f"{SKETCH_SCHEMA}." if SKETCH_MEASURES & set(measures) else ''
+    candidates = [
+        prefix + table for table, grain in ROLLUPS.items()
+        if prefix + table in sizes and can_answer(grain, dimensions, measures, filtered)
+    ]
+    if not candidates:
+        return FACT_TABLE
+    return min(candidates, key=sizes.get)
@@ -0,0 +1,193 @@
+"""
+Precomputed dashboard snapshot
+
+The dashboard's first paint needs every dataset of async_queries.gather_all. Computing
+them takes longer the more data there is, so a post-build step (scripts/build_snapshot.py,
+run after `dbt build`) computes them once, with the full top-N rankings, and writes them
+to one snapshot file next to the curated database. The dashboard loads the snapshot
+when its version stamp matches the current build: the file is memory-mapped and the
+Arrow columns are handed to pandas without copying where possible, so the cold start
+costs about the same whatever the size of the warehouse.
+
+File layout (all offsets in bytes, sections aligned to 64 bytes):
+    8 bytes       little-endian length of the header
+    header        JSON: format, version, build stamp, creation time and, per dataset,
+                  the offset, length and row count of its section
+    sections      one Arrow IPC file per dataset
+
+Sections are uncompressed by default, which is what makes the memory-mapped read
+zero-copy; compression='zstd' or 'lz4' gives a smaller file whose columns are
+decompressed on load. Categorical columns (decoded keys, see keys.py) are stored
+dictionary-encoded either way.
+
+Settings (environment variables):
+    SALLA_SNAPSHOT           snapshot path (default: dashboard_snapshot.arrow next to the
+                             curated database); 'off' disables loading it
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+import pyarrow as pa
+
+from .connection import get_db_path
+
+SNAPSHOT_FORMAT = 'salla-dashboard-snapshot'
+# Bump when a dataset's columns or meaning change; older snapshots are then ignored
+SNAPSHOT_VERSION = 3
+COMPRESSIONS = (None, 'lz4', 'zstd')
+
+_ALIGNMENT = 64
+_LENGTH_BYTES = 8
+
+
+def get_snapshot_path():
+    """
+    Snapshot path, or None when disabled (SALLA_SNAPSHOT=off).
+    """
+    value = os.environ.get('SALLA_SNAPSHOT')
+    if value is not None and value.lower() in ('off', '0', 'false'):
+        return None
+    return Path(value) if value else get_db_path().with_name('dashboard_snapshot.arrow')
+
+
+def build_stamp():
+    """
+    Identity of the current curated database build: size and modification time, which
+    survive copying the warehouse and its snapshot together (e.g. `cp -p`, `rsync -a`).
+    """
+    stat = os.stat(get_db_path())
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _padding(length):
+    return -length % _ALIGNMENT
+
+
+def write_snapshot(datasets, path=None, compression=None, build=None):
+    """
+    Write datasets to a snapshot file, atomically (temporary file + rename).
+
+    Args:
+        datasets (dict): dataset name -> pd.DataFrame
+        path (Path): Snapshot path (default: get_snapshot_path())
+        compression (str): None (default), 'lz4' or 'zstd'
+        build (dict): Build stamp the datasets were computed from (default: build_stamp())
+
+    Returns:
+        Path: the snapshot file
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression {compression!r}, expected one of {list(COMPRESSIONS)}")
+    path = Path(path) if path is not None else get_snapshot_path()
+    if path is None:
+        raise ValueError("The snapshot is disabled (SALLA_SNAPSHOT=off)")
+
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    sections = {}
+    for name, df in datasets.items():
+        sink = pa.BufferOutputStream()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        sections[name] = (sink.getvalue(), len(df))
+
+    header = {
+        'format': SNAPSHOT_FORMAT,
+        'version': SNAPSHOT_VERSION,
+        'build': build if build is not None else build_stamp(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'compression': compression,
+        'datasets': {}
+    }
+    # Offsets depend on the header length, which depends on the offsets: reserve room
+    # for the widest offsets first
+    header_room = len(json.dumps(header)) + len(sections) * 200
+    offset = _LENGTH_BYTES + header_room + _padding(_LENGTH_BYTES + header_room)
+    for name, (buffer, rows) in sections.items():
+        header['datasets'][name] = {'offset': offset, 'length': buffer.size, 'rows': rows}
+        offset += buffer.size + _padding(buffer.size)
+    encoded = json.dumps(header).encode().ljust(header_room)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.parent / f".{path.name}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(len(encoded).to_bytes(_LENGTH_BYTES, 'little'))
+        f.write(encoded)
+        for name, (buffer, _) in sections.items():
+            f.write(b'\0' * (header['datasets'][name]['offset'] - f.tell()))
+            f.write(buffer)
+    os.replace(tmp_path, path)
+    return path
+
+
+def build_snapshot(path=None, compression=None):
+    """
+    Compute every dataset of async_queries.gather_all, with the full top-N rankings
+    (the dashboard slices the top N it shows), and write them to the snapshot.
+
+    Returns:
+        Path: the snapshot file
+    """
+    from .async_queries import gather_all
+
+    # Stamp first: if the database is rebuilt meanwhile, the snapshot is stale on arrival
+    build = build_stamp()
+    datasets = asyncio.run(gather_all(top_n_categories=None, top_n_location=None, top_n_stores=None, with_sketches=True))
+    return write_snapshot(datasets, path=path, compression=compression, build=build)
+
+
+def read_header(path=None):
+    """
+    Returns:
+        dict: the snapshot header, or None if there is no readable snapshot
+    """
+    path = Path(path) if path is not None else get_snapshot_path()
+    try:
+        with open(path, 'rb') as f:
+            length = int.from_bytes(f.read(_LENGTH_BYTES), 'little')
+            header = json.loads(f.read(length))
+    except (OSError, TypeError, ValueError):
+        return None
+    return header if header.get('format') == SNAPSHOT_FORMAT else None
+
+
+def is_current(header):
+    """
+    Whether a snapshot header matches this code and the current curated database build.
+    """
+    return (
+        header is not None
+        and header.get('version') == SNAPSHOT_VERSION
+        and header.get('build') == build_stamp()
+    )
+
+
+def load_snapshot(path=None):
+    """
+    Load every dataset of the snapshot, if it matches the current build. Columns are
+    memory-mapped; numeric columns without missing values and string columns are
+    handed to pandas without a copy (sketch columns become Python bytes objects).
+
+    Returns:
+        dict: dataset name -> pd.DataFrame, or None when there is no current snapshot
+    """
+    path = Path(path) if path is not None else get_snapshot_path()
+    if path is None:
+        return None
+    header = read_header(path)
+    if not is_current(header):
+        return None
+
+    source = pa.memory_map(str(path), 'r')
+    mapped = source.read_buffer()
+    datasets = {}
+    for name, section in header['datasets'].items():
+        reader = pa.ipc.open_file(pa.BufferReader(mapped.slice(section['offset'], section['length'])))
+        # split_blocks keeps columns apart instead of copying them into 2D blocks
+        datasets[name] = reader.read_all().to_pandas(split_blocks=True)
+    return datasets
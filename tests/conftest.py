@@ -0,0 +1,21 @@
+"""
+Shared fixtures: the tests query the curated database built by `dbt build` and are
+skipped when it is missing.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from semantic_layer_mocked.connection import get_db_path
+
+
+@pytest.fixture(autouse=True)
+def curated_db(monkeypatch):
+    if not get_db_path().exists():
+        pytest.skip(f"No curated database at {get_db_path()} (run dbt build first)")
+    # Compare fresh results, not entries of the persistent result cache
+    monkeypatch.setenv('SALLA_CACHE', 'off')
+    return get_db_path()
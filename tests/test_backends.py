@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from semantic_layer_mocked import queries
+
+pytest.importorskip('duckdb')
+
+# Task function -> keyword arguments of the variants that read through the backend
+TASKS = {
+    'get_top_products_by_region': [{}, {'use_rollups': False}],
+    'get_popular_categories': [{}, {'use_rollups': False}],
+    'get_time_series_sales': [{}, {'use_rollups': False}],
+    'get_avg_sale_by_category': [{}, {'use_rollups': False}],
+    'get_top_categories_by_location': [{}, {'use_rollups': False}],
+    'get_top_stores_by_daily_sales': [{}, {'use_rollups': False}, {'engine': 'pandas'}, {'engine': 'polars'}],
+    'get_monthly_growth_by_store': [{}, {'use_rollups': False}, {'engine': 'pandas'}, {'engine': 'polars'}],
+    'get_cohort_analysis': [{}, {'engine': 'pandas'}, {'engine': 'polars'}]
+}
+
+FILTERS = [
+    None,
+    {'customer_states': ['SP'], 'start_date': '2017-06-01', 'end_date': '2018-03-31'}
+]
+
+
+def run(monkeypatch, backend, name, kwargs):
+    monkeypatch.setenv('SALLA_BACKEND', backend)
+    return getattr(queries, name)(**kwargs)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('name, kwargs', [(name, kwargs) for name, variants in TASKS.items() for kwargs in variants])
+def test_sqlite_and_duckdb_return_the_same_frame(monkeypatch, name, kwargs, filters):
+    if kwargs.get('engine') == 'polars':
+        pytest.importorskip('polars')
+    kwargs = {**kwargs, 'filters': filters}
+
+    sqlite = run(monkeypatch, 'sqlite', name, kwargs)
+    duckdb = run(monkeypatch, 'duckdb', name, kwargs)
+
+    assert len(sqlite) > 0
+    pd.testing.assert_frame_equal(duckdb, sqlite)
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from semantic_layer_mocked.cube_model import load_model
+
+
+@pytest.fixture(scope='module')
+def model():
+    return load_model()
+
+
+def category_sales(filters):
+    return {
+        'measures': ['sales.total_sales'],
+        'dimensions': ['products.product_category_name'],
+        'filters': filters
+    }
+
+
+@pytest.mark.parametrize('use_pre_aggregations', [True, False])
+@pytest.mark.parametrize('operator, value', [('gt', 100000), ('gte', 100000), ('lt', 5000.5), ('lte', 5000.5)])
+def test_measure_filter_values_sent_as_strings(model, use_pre_aggregations, operator, value):
+    # Cube's REST API sends filter values as strings
+    as_number = model.load(category_sales([{'member': 'sales.total_sales', 'operator': operator, 'values': [value]}]), use_pre_aggregations)
+    as_string = model.load(category_sales([{'member': 'sales.total_sales', 'operator': operator, 'values': [str(value)]}]), use_pre_aggregations)
+
+    assert len(as_number) > 0
+    pd.testing.assert_frame_equal(as_string, as_number)
+
+
+def test_number_dimension_filter_values_sent_as_strings(model):
+    query = {
+        'measures': ['sales.total_sales'],
+        'dimensions': ['products.product_photos_qty'],
+        'filters': [{'member': 'products.product_photos_qty', 'operator': 'equals', 'values': ['1', '2']}]
+    }
+    df = model.load(query)
+
+    assert sorted(df['products.product_photos_qty']) == [1, 2]
+
+
+def test_non_numeric_value_for_number_member(model):
+    with pytest.raises(ValueError, match='numeric'):
+        model.load(category_sales([{'member': 'sales.total_sales', 'operator': 'gt', 'values': ['many']}]))
@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from semantic_layer_mocked import queries
+
+FILTERS = [
+    None,
+    {'customer_states': ['SP', 'RJ']},
+    {'start_date': '2017-06-01', 'end_date': '2018-03-31', 'categories': ['beleza_saude', 'cama_mesa_banho']}
+]
+
+# The rollups carry customer_state, so only the fact-table path joins dim_customers
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_top_products_by_region(filters):
+    surrogate_key = queries.get_top_products_by_region(join_strategy='surrogate_key', use_rollups=False, filters=filters)
+    range_join = queries.get_top_products_by_region(join_strategy='range', use_rollups=False, filters=filters)
+
+    assert len(surrogate_key) > 0
+    pd.testing.assert_frame_equal(range_join, surrogate_key)
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('top_n', [5, None])
+def test_top_categories_by_location(filters, top_n):
+    surrogate_key = queries.get_top_categories_by_location(top_n, join_strategy='surrogate_key', use_rollups=False, filters=filters)
+    range_join = queries.get_top_categories_by_location(top_n, join_strategy='range', use_rollups=False, filters=filters)
+
+    assert len(surrogate_key) > 0
+    pd.testing.assert_frame_equal(range_join, surrogate_key)